@@ -0,0 +1,232 @@
+"""Admission control: per-class and per-endpoint concurrency limits with a short priority queue.
+
+Each endpoint belongs to a priority class (checkout/return above analytics above
+browsing). A request runs if its class and endpoint are under their limits (and the
+process under its total capacity); otherwise it waits in a bounded queue for at most
+wait_ms, and freed slots go to the highest-priority waiter first. A request that
+finds the queue full or times out gets an immediate 503 with Retry-After, before any
+database work, so a burst of dashboard or film-page requests can't occupy every
+worker thread while checkouts queue behind them. Limits are per worker process;
+endpoints without a class are never limited.
+
+A queued request still holds its worker thread, so limits are sized against the
+process's threads (server.threads): classes with a "reserve" keep that many threads
+for themselves, and requests of the other classes, running or queued, never occupy
+more than the rest. One that would is rejected at once ("no_thread") instead of
+queueing. The default limits and queues are cut down to fit, and a configuration that
+leaves no reserved thread, or no thread for the other classes, fails at startup.
+"""
+import threading
+import time
+from metrics import Counter, Gauge, Histogram
+
+DEFAULTS = {
+    "enabled": True,
+    "capacity": None,  # total admitted requests per process across all classes
+    "retry_after": 2,
+    # Highest priority first; limit None = unlimited; reserve = threads kept for the class
+    "classes": {
+        "critical": {"limit": None, "queue": 16, "wait_ms": 5000, "reserve": 1},
+        "analytics": {"limit": 2, "queue": 2, "wait_ms": 1000},
+        "browsing": {"limit": 8, "queue": 8, "wait_ms": 500},
+    },
+    # endpoint -> class, or {"class": ..., "limit": ...} for an endpoint's own limit
+    "endpoints": {
+        "rentals.new_rental": "critical",
+        "rentals.return_rental": "critical",
+        "rentals.check_inventory": "critical",
+        "dashboard.stats": "analytics",
+        "dashboard.revenue_trend": "analytics",
+        "dashboard.today_rentals": "analytics",
+        "dashboard.today_revenue": "analytics",
+        "dashboard.active_rentals": "analytics",
+        "dashboard.overdue_rentals": "analytics",
+        "payments.export": "analytics",
+        "films.index": "browsing",
+        "films.detail": {"class": "browsing", "limit": 4},
+        "customers.index": "browsing",
+        "customers.detail": "browsing",
+        "rentals.index": "browsing",
+        "payments.index": "browsing",
+    },
+}
+
+ADMITTED = Gauge("admission_in_flight", "Requests admitted and running, by priority class.", ("class",))
+QUEUED = Gauge("admission_queued", "Requests waiting for a slot, by priority class.", ("class",))
+DECISIONS = Counter("admission_decisions_total",
+                    "Admission outcomes (admitted, queue_full, no_thread, timeout) by priority class and endpoint.",
+                    ("class", "endpoint", "outcome"))
+WAIT = Histogram("admission_wait_seconds", "Time admitted requests spent queued.", ("class",))
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "klass", "endpoint")
+
+    def __init__(self, rank, seq, klass, endpoint):
+        self.rank, self.seq, self.klass, self.endpoint = rank, seq, klass, endpoint
+
+
+class Gate:
+    def __init__(self, classes, endpoint_limits, capacity=None, shared_threads=None):
+        self.classes = classes
+        self.ranks = {name: i for i, name in enumerate(classes)}
+        self.endpoint_limits = endpoint_limits
+        self.capacity = capacity
+        # Threads requests of unreserved classes may hold, running or queued
+        self.shared_threads = shared_threads
+        self.shared_in_use = 0
+        self.running = {name: 0 for name in classes}
+        self.running_endpoints = {}
+        self.queued = {name: 0 for name in classes}
+        self.waiters = []  # kept in (rank, seq) order
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def _fits(self, klass, endpoint):
+        limit = self.classes[klass]["limit"]
+        if limit is not None and self.running[klass] >= limit:
+            return False
+        limit = self.endpoint_limits.get(endpoint)
+        if limit is not None and self.running_endpoints.get(endpoint, 0) >= limit:
+            return False
+        return self.capacity is None or sum(self.running.values()) < self.capacity
+
+    def _next(self):
+        """The highest-priority waiter that could run now."""
+        for waiter in self.waiters:
+            if self._fits(waiter.klass, waiter.endpoint):
+                return waiter
+        return None
+
+    def _take(self, klass, endpoint):
+        self.running[klass] += 1
+        self.running_endpoints[endpoint] = self.running_endpoints.get(endpoint, 0) + 1
+        ADMITTED.inc(klass)
+
+    def _shared(self, klass):
+        return self.shared_threads is not None and not self.classes[klass].get("reserve")
+
+    def acquire(self, klass, endpoint):
+        """"admitted", "queue_full", "no_thread" or "timeout"; only "admitted" must be released."""
+        settings = self.classes[klass]
+        shared = self._shared(klass)
+        with self._cond:
+            if shared and self.shared_in_use >= self.shared_threads:
+                return "no_thread"
+            # Skip the queue unless a waiter of equal or higher priority could take the slot
+            first = self._next()
+            if self._fits(klass, endpoint) and (first is None or first.rank > self.ranks[klass]):
+                self._take(klass, endpoint)
+                if shared:
+                    self.shared_in_use += 1
+                return "admitted"
+            if self.queued[klass] >= settings["queue"]:
+                return "queue_full"
+            if shared:
+                self.shared_in_use += 1
+            admitted = False
+            self._seq += 1
+            waiter = _Waiter(self.ranks[klass], self._seq, klass, endpoint)
+            self.waiters.append(waiter)
+            self.waiters.sort(key=lambda w: (w.rank, w.seq))
+            self.queued[klass] += 1
+            QUEUED.inc(klass)
+            start = time.monotonic()
+            deadline = start + settings["wait_ms"] / 1000
+            try:
+                while self._next() is not waiter:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return "timeout"
+                    self._cond.wait(remaining)
+                self._take(klass, endpoint)
+                WAIT.observe(time.monotonic() - start, klass)
+                admitted = True
+                return "admitted"
+            finally:
+                if shared and not admitted:
+                    self.shared_in_use -= 1
+                self.waiters.remove(waiter)
+                self.queued[klass] -= 1
+                QUEUED.dec(klass)
+                # Whoever is now first in line may be able to run
+                self._cond.notify_all()
+
+    def release(self, klass, endpoint):
+        with self._cond:
+            self.running[klass] -= 1
+            self.running_endpoints[endpoint] -= 1
+            if self._shared(klass):
+                self.shared_in_use -= 1
+            ADMITTED.dec(klass)
+            self._cond.notify_all()
+
+
+def init_app(app, config=None, threads=None):
+    """threads: worker threads per process (server.threads); None leaves them unchecked."""
+    from flask import g, jsonify, request
+
+    config = config or {}
+    settings = {**DEFAULTS, **config}
+    if not settings["enabled"]:
+        return
+    # Config overrides individual classes and endpoints; new classes rank below the defaults
+    classes = {name: dict(values) for name, values in DEFAULTS["classes"].items()}
+    for name, values in config.get("classes", {}).items():
+        classes[name] = {**classes.get(name, {"limit": None, "queue": 0, "wait_ms": 0}), **values}
+    shared = None
+    if threads is not None:
+        reserve = sum(values.get("reserve", 0) for values in classes.values())
+        shared = threads - reserve
+        if reserve < 1 or shared < 1:
+            raise ValueError(
+                f"admission: {threads} thread(s) per worker can't reserve {reserve} for the critical class "
+                "and still serve the others; raise server.threads, change the classes' reserve "
+                'or set "admission": {"enabled": false}')
+        # Default limits and queues of unreserved classes are cut to the threads they share
+        for name, values in classes.items():
+            given = config.get("classes", {}).get(name, {})
+            if values.get("reserve"):
+                continue
+            if "limit" not in given:
+                values["limit"] = shared if values["limit"] is None else min(values["limit"], shared)
+            if "queue" not in given and values["limit"] is not None:
+                values["queue"] = max(0, min(values["queue"], shared - values["limit"]))
+    endpoint_class, endpoint_limits = {}, {}
+    for endpoint, spec in {**DEFAULTS["endpoints"], **config.get("endpoints", {})}.items():
+        if isinstance(spec, dict):
+            endpoint_class[endpoint] = spec["class"]
+            if spec.get("limit") is not None:
+                endpoint_limits[endpoint] = spec["limit"]
+        else:
+            endpoint_class[endpoint] = spec
+    unknown = set(endpoint_class.values()) - set(classes)
+    if unknown:
+        raise ValueError(f"admission: unknown class(es) {', '.join(sorted(unknown))}")
+    gate = Gate(classes, endpoint_limits, settings["capacity"], shared)
+    app.extensions["admission"] = gate
+
+    @app.before_request
+    def admit():
+        endpoint = request.endpoint
+        klass = endpoint_class.get(endpoint)
+        if klass is None:
+            return None
+        outcome = gate.acquire(klass, endpoint)
+        DECISIONS.inc(klass, endpoint, outcome)
+        if outcome == "admitted":
+            g.admission = (klass, endpoint)
+            return None
+        if request.path.startswith("/api/"):
+            response = jsonify({"error": "Server busy, please retry shortly."})
+        else:
+            response = app.response_class("Server busy, please retry shortly.", mimetype="text/plain")
+        response.status_code = 503
+        response.headers["Retry-After"] = str(settings["retry_after"])
+        return response
+
+    @app.teardown_request
+    def release(exc):
+        admitted = g.pop("admission", None)
+        if admitted:
+            gate.release(*admitted)
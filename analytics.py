@@ -0,0 +1,101 @@
+"""Dashboard aggregates computed with Arrow over the Parquet snapshot written by snapshot.py.
+
+Used instead of the GROUP BY queries in routes/dashboard.py when config.json has
+"dashboard_source": "snapshot", so reporting does not load the live database.
+Results reflect the last snapshot run and are cached until the next one.
+"""
+import os
+import threading
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from metrics import cache_event
+from snapshot import STATE_FILE, snapshot_dir
+
+_lock = threading.Lock()
+_cached = {"mtime": None, "stats": None}
+
+
+def available():
+    return os.path.exists(os.path.join(snapshot_dir(), STATE_FILE))
+
+
+def _fact(root, table, columns):
+    path = os.path.join(root, table)
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(path, format="parquet", partitioning="hive").to_table(columns=columns)
+
+
+def _top(table, key, count_col, n=None):
+    grouped = table.group_by(key).aggregate([(count_col, "count")])
+    grouped = grouped.sort_by([(f"{count_col}_count", "descending")])
+    return grouped.slice(0, n) if n else grouped
+
+
+def compute(root=None):
+    """All snapshot-backed dashboard aggregates, in the same shape as the SQL results."""
+    root = root or snapshot_dir()
+    inventory = pq.read_table(os.path.join(root, "inventory.parquet"))
+    film = pq.read_table(os.path.join(root, "film.parquet"))
+    film_category = pq.read_table(os.path.join(root, "film_category.parquet"))
+    category = pq.read_table(os.path.join(root, "category.parquet"))
+    rental = _fact(root, "rental", ["rental_id", "inventory_id"])
+    payment = _fact(root, "payment", ["payment_date", "amount"])
+    rental = rental if rental is not None else pa.table({"rental_id": pa.array([], pa.int64()),
+                                                          "inventory_id": pa.array([], pa.int64())})
+
+    rented = rental.join(inventory, "inventory_id")
+
+    top = _top(rented, "film_id", "rental_id", 10).join(film, "film_id")
+    top = top.sort_by([("rental_id_count", "descending")])
+    top_films = [{"title": t, "rentals": c}
+                 for t, c in zip(top["title"].to_pylist(), top["rental_id_count"].to_pylist())]
+
+    by_cat = _top(rented.join(film_category, "film_id"), "category_id", "rental_id").join(category, "category_id")
+    by_cat = by_cat.sort_by([("rental_id_count", "descending")])
+    by_category = [{"category": n, "rentals": c}
+                   for n, c in zip(by_cat["name"].to_pylist(), by_cat["rental_id_count"].to_pylist())]
+
+    stores = _top(rented, "store_id", "rental_id").sort_by("store_id")
+    by_store = [{"store_id": s, "rentals": c}
+                for s, c in zip(stores["store_id"].to_pylist(), stores["rental_id_count"].to_pylist())]
+
+    ratings = _top(inventory.join(film, "film_id"), "rating", "inventory_id")
+    by_rating = [{"rating": r, "count": c}
+                 for r, c in zip(ratings["rating"].to_pylist(), ratings["inventory_id_count"].to_pylist())]
+
+    revenue_trend, total_revenue = [], 0.0
+    if payment is not None and payment.num_rows:
+        payment = payment.set_column(1, "amount", pc.cast(payment["amount"], pa.float64()))
+        days = payment.append_column("day", pc.cast(payment["payment_date"], pa.date32()))
+        daily = days.group_by("day").aggregate([("amount", "sum")]).sort_by([("day", "descending")]).slice(0, 30)
+        revenue_trend = [{"day": str(d), "total": float(t)}
+                         for d, t in zip(daily["day"].to_pylist(), daily["amount_sum"].to_pylist())]
+        total_revenue = round(float(pc.sum(payment["amount"]).as_py() or 0), 2)
+
+    return {
+        "total_rentals": rental.num_rows,
+        "total_revenue": total_revenue,
+        "total_films": film.num_rows,
+        "total_inventory": inventory.num_rows,
+        "top_films": top_films,
+        "by_category": by_category,
+        "revenue_trend": revenue_trend,
+        "by_store": by_store,
+        "by_rating": by_rating,
+    }
+
+
+def dashboard_stats():
+    """compute() for the current snapshot, recomputed only when a new snapshot lands."""
+    mtime = os.path.getmtime(os.path.join(snapshot_dir(), STATE_FILE))
+    with _lock:
+        if _cached["mtime"] != mtime:
+            cache_event("analytics", "miss")
+            _cached["stats"] = compute()
+            _cached["mtime"] = mtime
+        else:
+            cache_event("analytics", "hit")
+        return _cached["stats"]
@@ -2,7 +2,7 @@ import json
 import re
 import sys
 import os
-from flask import Flask, request as flask_request
+from flask import Flask, request as flask_request, session, url_for
 from markupsafe import Markup
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -13,23 +13,39 @@ def create_app():
         cfg = json.load(f)
     app.secret_key = cfg.get("secret_key", "dev-secret-key")
 
-    # Create page_views table
-    from db import get_connection
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS page_views (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    view_count BIGINT NOT NULL DEFAULT 0
-                ) ENGINE=InnoDB
-            """)
-            cur.execute("SELECT id FROM page_views WHERE id = 1")
-            if not cur.fetchone():
-                cur.execute("INSERT INTO page_views (id, view_count) VALUES (1, 0)")
-            conn.commit()
-    finally:
-        conn.close()
+    # Behind a reverse proxy (e.g. nginx, see "static"), trust that many hops of its
+    # X-Forwarded-* headers so request.remote_addr is the client, as the per-IP login
+    # limit needs: "proxy": {"x_for": 1}
+    if cfg.get("proxy"):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, **cfg["proxy"])
+
+    # Schema changes are applied by `python migrate.py`; only check we're not behind
+    from migrate import check_version
+    check_version()
+
+    # Request, database, template and cache metrics at /metrics
+    import metrics
+    metrics.init_app(app, cfg.get("metrics", {}))
+
+    # Per-endpoint concurrency limits; excess requests get a fast 503 (registered early so
+    # a shed request does no database work); sized against the worker's threads as
+    # gunicorn.conf.py reads them
+    import admission
+    threads = int(os.environ.get("GUNICORN_THREADS", cfg.get("server", {}).get("threads", 4)))
+    admission.init_app(app, cfg.get("admission", {}), threads)
+
+    # Sampling profiler for a fraction of requests or chosen endpoints (/admin/profiles)
+    import profiler
+    profiler.init_app(app, cfg.get("profiler", {}))
+
+    # Content-hashed static URLs with immutable caching, once `python static_assets.py` has run
+    import static_assets
+    static_assets.init_app(app, cfg.get("static", {}))
+
+    # brotli/gzip for HTML, JSON and CSV responses (streamed exports chunk by chunk)
+    import compression
+    compression.init_app(app, cfg.get("compression", {}))
 
     # Store icon helper: converts store name to icon filename
     def store_icon_filename(store_name):
@@ -42,23 +58,48 @@ def create_app():
         name = name.strip('_')
         return f"store_icons/{name}.svg"
 
+    # Store icons come from one sprite sheet (static/sprites/store_icons.svg, built by
+    # static_assets.py from static/store_icons/), one <symbol> per icon file, so a page
+    # showing any number of stores makes a single icon request. The markup is built once
+    # per store and rebuilt after a static asset rebuild (new fingerprinted URL).
+    store_icons = {}  # asset version -> {store name: markup}
+
     @app.template_filter('store_icon')
     def store_icon_filter(store_name):
-        filename = store_icon_filename(store_name)
-        if not filename:
-            return ""
-        return Markup(
-            f'<img src="/static/{filename}" alt="" width="20" height="20" '
-            f'class="rounded me-1" style="vertical-align: text-bottom;">'
-        )
-
-    from routes.auth import auth_bp
+        version = static_assets.version()
+        icons = store_icons.get(version)
+        if icons is None:
+            store_icons.clear()
+            icons = store_icons[version] = {}
+        markup = icons.get(store_name)
+        if markup is None:
+            filename = store_icon_filename(store_name)
+            symbol = os.path.basename(filename)[:-len(".svg")] if filename else None
+            markup = Markup(
+                f'<svg width="20" height="20" class="rounded me-1" style="vertical-align: text-bottom;" '
+                f'aria-hidden="true"><use href="{url_for("static", filename="sprites/store_icons.svg")}#{symbol}"></use></svg>'
+            ) if symbol else Markup("")
+            icons[store_name] = markup
+        return markup
+
+    # {% cache %} blocks for repeated partials: list rows, the sidebar
+    import fragment_cache
+    fragment_cache.init_app(app, cfg.get("fragment_cache", {}))
+
+    # Responsive <picture> markup for generated avatars/thumbnails
+    from image_variants import picture
+    app.add_template_global(picture)
+
+    from routes.auth import auth_bp, configure_login
+    configure_login(cfg)
     from routes.dashboard import dashboard_bp
     from routes.films import films_bp
     from routes.customers import customers_bp
     from routes.rentals import rentals_bp
     from routes.staff import staff_bp
     from routes.payments import payments_bp
+    from routes.media import media_bp
+    from routes.admin import admin_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
@@ -67,11 +108,32 @@ def create_app():
     app.register_blueprint(rentals_bp)
     app.register_blueprint(staff_bp)
     app.register_blueprint(payments_bp)
+    app.register_blueprint(media_bp)
+    app.register_blueprint(admin_bp)
+
+    # Opt-in SQL tracing: per-request statement log, summarised for admins in a
+    # Server-Timing/X-SQL-Queries header and the page footer
+    import db
+    if db.trace_settings()["enabled"]:
+        @app.before_request
+        def start_sql_trace():
+            db.start_trace()
+
+        @app.after_request
+        def sql_trace_header(response):
+            summary = db.end_trace()
+            if summary and session.get("role") == "admin":
+                response.headers["Server-Timing"] = f'db;dur={summary["ms"]};desc="{summary["count"]} queries"'
+                response.headers["X-SQL-Queries"] = str(summary["count"])
+                if summary["n_plus_one"]:
+                    response.headers["X-SQL-N-Plus-One"] = "; ".join(
+                        f"{n}x {fp[:120]}" for fp, n in summary["n_plus_one"].items())
+            return response
 
     # Increment page view counter on each page request
     @app.before_request
     def track_page_views():
-        if flask_request.endpoint and not flask_request.path.startswith('/static'):
+        if flask_request.endpoint and not flask_request.path.startswith(('/static', '/media', '/metrics')):
             from db import execute
             execute("UPDATE page_views SET view_count = view_count + 1 WHERE id = 1")
 
@@ -82,7 +144,14 @@ def create_app():
         from db import query
         row = query("SELECT view_count FROM page_views WHERE id = 1", one=True)
         page_views = row["view_count"] if row else 0
-        return {"current_user": get_current_user(), "page_views": page_views}
+        sql_trace = db.current_trace() if session.get("role") == "admin" else None
+        return {"current_user": get_current_user(), "page_views": page_views, "sql_trace": sql_trace}
+
+    # Build every store's icon markup now rather than during the first requests
+    from setup_db import STORE_NAMES
+    with app.test_request_context():
+        for name in STORE_NAMES:
+            store_icon_filter(name)
 
     return app
 
@@ -0,0 +1,106 @@
+"""Latency of the fan-out views with their queries run one at a time vs. concurrently.
+
+Requests dashboard.stats, customers.detail and films.detail through the Flask test
+client (signed in as admin, against the database in config.json) with the per-request
+concurrency limit of db.aquery set to each --limits value; 1 is the old serial
+behaviour. For every run it prints the median request latency next to the median sum
+and max of the individual statement times, so you can see latency move from the sum
+towards the max as the limit grows:
+
+    python benchmarks/bench_async.py
+    python benchmarks/bench_async.py --limits 1 2 4 8 16 --iterations 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # config.json is read relative to the working directory
+
+import db
+from db import query
+
+
+class StatementTimes:
+    """Durations of the statements the async facade ran (on its pool threads) while active."""
+
+    def __init__(self):
+        self.times = []
+        self._lock = threading.Lock()
+        self.active = False
+
+    def __call__(self, operation, seconds):
+        if self.active and threading.current_thread().name.startswith("db"):
+            with self._lock:
+                self.times.append(seconds * 1000)
+
+
+def _paths():
+    # The busiest customer and film: the most rows behind each fanned-out query
+    customer = query(
+        "SELECT customer_id FROM rental GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1", one=True)
+    film = query(
+        """SELECT i.film_id FROM rental r JOIN inventory i ON r.inventory_id = i.inventory_id
+           GROUP BY i.film_id ORDER BY COUNT(*) DESC LIMIT 1""", one=True)
+    return [
+        ("dashboard.stats", "/api/dashboard/stats"),
+        ("customers.detail", f"/customers/{customer['customer_id']}"),
+        ("films.detail", f"/films/{film['film_id']}"),
+    ]
+
+
+def run(client, path, iterations, warmup, recorder):
+    latencies, sums, maxes = [], [], []
+    for i in range(warmup + iterations):
+        recorder.times = []
+        recorder.active = True
+        start = time.perf_counter()
+        response = client.get(path)
+        elapsed = (time.perf_counter() - start) * 1000
+        recorder.active = False
+        if response.status_code != 200:
+            raise SystemExit(f"{path} returned {response.status_code}")
+        if i >= warmup:
+            latencies.append(elapsed)
+            sums.append(sum(recorder.times))
+            maxes.append(max(recorder.times, default=0))
+    return statistics.median(latencies), statistics.median(sums), statistics.median(maxes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    app.testing = True
+    client = app.test_client()
+    admin = query("SELECT user_id AS id FROM app_users WHERE role = 'admin' ORDER BY user_id LIMIT 1", one=True)
+    with client.session_transaction() as sess:
+        sess["user_id"] = admin["id"]
+        sess["role"] = "admin"
+
+    recorder = StatementTimes()
+    db.statement_hooks.append(recorder)
+    settings = db.async_settings()
+    settings["workers"] = max(settings["workers"], max(args.limits))
+
+    print(f"{'view':<18} {'limit':>5} {'p50 ms':>8} {'sum ms':>8} {'max ms':>8}  speed-up")
+    for name, path in _paths():
+        serial = None
+        for limit in args.limits:
+            settings["per_request"] = limit
+            latency, total, slowest = run(client, path, args.iterations, args.warmup, recorder)
+            serial = serial or latency
+            print(f"{name:<18} {limit:>5} {latency:>8.1f} {total:>8.1f} {slowest:>8.1f}  {serial / latency:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Identity and login lookup latency: the v_users view vs. app_users read directly.
+
+Every authenticated request looks the signed-in user up by id (get_current_user) and
+every login looks one up by username. This times both lookups for a sample of real
+accounts against the database in config.json, once through the v_users view the app
+used to query and once through the app's current queries on app_users, and prints
+the EXPLAIN access type of each:
+
+    python benchmarks/bench_auth_lookup.py
+    python benchmarks/bench_auth_lookup.py --iterations 2000 --users 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # config.json is read relative to the working directory
+
+import pymysql
+from db import get_connection
+from routes.auth import USER_COLUMNS
+
+LOOKUPS = [
+    # name,               SQL,                                                                key
+    ("identity (view)",   "SELECT * FROM v_users WHERE id = %s",                              "id"),
+    ("identity (table)",  f"SELECT {USER_COLUMNS} FROM app_users WHERE user_id = %s",         "id"),
+    ("login (view)",      "SELECT * FROM v_users WHERE username = %s",                        "username"),
+    ("login (table)",     f"SELECT {USER_COLUMNS}, password_hash FROM app_users WHERE username = %s", "username"),
+]
+
+
+def measure(cur, sql, keys, iterations):
+    times = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        cur.execute(sql, (keys[i % len(keys)],))
+        cur.fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95) - 1]
+
+
+def access_type(cur, sql, key):
+    cur.execute("EXPLAIN " + sql, (key,))
+    return ", ".join(f"{r['table']}:{r['type']}" for r in cur.fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100, help="accounts to cycle through")
+    args = parser.parse_args()
+
+    # One connection for all runs so only the lookups themselves are timed
+    conn = get_connection()
+    with conn.cursor() as cur:
+        cur.execute("SELECT user_id AS id, username FROM app_users ORDER BY user_id LIMIT %s", (args.users,))
+        users = cur.fetchall()
+        if not users:
+            raise SystemExit("app_users is empty; run python migrate.py first.")
+        print(f"{len(users)} accounts, {args.iterations} lookups each")
+        print(f"{'lookup':<18} {'p50 ms':>8} {'p95 ms':>8}  plan")
+        for name, sql, key in LOOKUPS:
+            keys = [u[key] for u in users]
+            try:
+                p50, p95 = measure(cur, sql, keys, args.iterations)
+            except pymysql.err.ProgrammingError:
+                print(f"{name:<18} {'':>8} {'':>8}  (v_users not present)")
+                continue
+            print(f"{name:<18} {p50:>8.3f} {p95:>8.3f}  {access_type(cur, sql, keys[0])}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Compression CPU time vs. bytes saved for the app's largest responses, per encoding and level.
+
+Fetches the real pages through the Flask test client (uncompressed, signed in as the
+admin account, against the database in config.json) and compresses each body the way
+compression.py would, or reads saved response bodies with --files:
+
+    python benchmarks/bench_compression.py
+    python benchmarks/bench_compression.py --link-mbps 4 --iterations 50
+    python benchmarks/bench_compression.py --files films.html payments.html
+
+"total ms" is the compression time plus the transfer time of the result over a link
+of --link-mbps, i.e. what the level costs or saves a client on the store VPN.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # config.json is read relative to the working directory
+
+from compression import _Brotli, brotli, gzip_compressor
+
+PAGES = [
+    ("films.index", "/films"),
+    ("rentals.index", "/rentals"),
+    ("payments.index", "/payments"),
+    ("dashboard.stats", "/api/dashboard/stats"),
+]
+GZIP_LEVELS = [1, 6, 9]
+BROTLI_QUALITIES = [1, 4, 6, 9, 11]
+
+
+def _fetch_pages():
+    from app import create_app
+    from db import query
+
+    app = create_app()
+    app.testing = True
+    client = app.test_client()
+    admin = query("SELECT user_id AS id FROM app_users WHERE role = 'admin' ORDER BY user_id LIMIT 1", one=True)
+    with client.session_transaction() as sess:
+        sess["user_id"] = admin["id"]
+        sess["role"] = "admin"
+    bodies = {}
+    for name, path in PAGES:
+        response = client.get(path)
+        if response.status_code != 200:
+            raise SystemExit(f"{path} returned {response.status_code}")
+        bodies[name] = response.get_data()
+    return bodies
+
+
+def _read_files(paths):
+    bodies = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            bodies[os.path.basename(path)] = f.read()
+    return bodies
+
+
+def _codecs():
+    codecs = [(f"gzip-{level}", lambda level=level: gzip_compressor(level)) for level in GZIP_LEVELS]
+    if brotli:
+        codecs += [(f"br-{q}", lambda q=q: _Brotli(q)) for q in BROTLI_QUALITIES]
+    return codecs
+
+
+def measure(body, make_compressor, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        compressor = make_compressor()
+        packed = compressor.compress(body) + compressor.flush()
+        times.append((time.perf_counter() - start) * 1000)
+    return len(packed), statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--link-mbps", type=float, default=10.0, help="client bandwidth for the total column")
+    parser.add_argument("--files", nargs="+", help="compress these saved bodies instead of fetching pages")
+    args = parser.parse_args()
+
+    bodies = _read_files(args.files) if args.files else _fetch_pages()
+    bytes_per_ms = args.link_mbps * 1_000_000 / 8 / 1000
+    if not brotli:
+        print("brotli is not installed; gzip only.")
+
+    print(f"{'page':<18} {'codec':<8} {'bytes':>10} {'ratio':>7} {'cpu ms':>8} {'MB/s':>8} {'total ms':>9}")
+    for name, body in bodies.items():
+        raw_ms = len(body) / bytes_per_ms
+        print(f"{name:<18} {'identity':<8} {len(body):>10} {1:>7.2f} {0:>8.2f} {'':>8} {raw_ms:>9.1f}")
+        for codec, make in _codecs():
+            size, cpu_ms = measure(body, make, args.iterations)
+            rate = len(body) / 1_000_000 / (cpu_ms / 1000) if cpu_ms else float("inf")
+            total = cpu_ms + size / bytes_per_ms
+            print(f"{'':<18} {codec:<8} {size:>10} {len(body) / size:>7.2f} {cpu_ms:>8.2f} {rate:>8.0f} {total:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
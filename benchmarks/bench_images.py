@@ -0,0 +1,59 @@
+"""Benchmark avatar/thumbnail rendering throughput (images/sec), serial vs. process pool.
+
+Renders synthetic customers and films into a temporary directory, so no database is needed:
+
+    python benchmarks/bench_images.py --count 500 --workers 1 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_avatars import generate_avatar
+from generate_thumbnails import CATEGORY_COLORS, RATING_BADGE, generate_thumbnail
+from image_variants import available_formats, render_all
+
+
+def _avatar_jobs(count, formats, out_dir):
+    return [(i, f"First{i}", f"Last{i}", formats, out_dir) for i in range(1, count + 1)]
+
+
+def _thumbnail_jobs(count, formats, out_dir):
+    categories = list(CATEGORY_COLORS)
+    ratings = list(RATING_BADGE)
+    return [
+        (i, f"SYNTHETIC FILM NUMBER {i}", ratings[i % len(ratings)], 2006,
+         categories[i % len(categories)], formats, out_dir)
+        for i in range(1, count + 1)
+    ]
+
+
+def _run(label, func, jobs, workers):
+    start = time.perf_counter()
+    for _ in render_all(func, jobs, workers, label):
+        pass
+    elapsed = time.perf_counter() - start
+    rate = len(jobs) / elapsed if elapsed else float("inf")
+    print(f"{label:<11} workers={workers:<3} {len(jobs):>6} images  {elapsed:7.2f}s  {rate:8.1f} images/sec")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--variants", action="store_true", help="also encode WebP/AVIF variants")
+    args = parser.parse_args()
+    formats = available_formats() if args.variants else []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            _run("avatars", generate_avatar, _avatar_jobs(args.count, formats, tmp), workers)
+            _run("thumbnails", generate_thumbnail, _thumbnail_jobs(args.count, formats, tmp), workers)
+
+
+if __name__ == "__main__":
+    main()
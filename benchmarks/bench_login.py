@@ -0,0 +1,94 @@
+"""Login throughput: password verification on the request threads vs. the passwords pool.
+
+Runs --threads concurrent "request threads" that each verify passwords against
+synthetic bcrypt hashes (no database needed), first inline as the login view used
+to, then through passwords.verify. For each it prints logins per second, p50/p95
+latency and the CPU time each login cost the request thread itself:
+
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --threads 16 --pool-workers 4 --rounds 12
+
+Also times TokenBuckets.take, which every login attempt pays before verification.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bcrypt
+import passwords
+from ratelimit import TokenBuckets
+
+PASSWORD = "Secret@123"
+
+
+def _inline(password, stored):
+    return passwords._verify(password, stored, 0)
+
+
+def run(verify, stored, threads, logins):
+    latencies, cpu = [], []
+    lock = threading.Lock()
+    per_thread = logins // threads
+
+    def worker():
+        mine, mine_cpu = [], []
+        for _ in range(per_thread):
+            start, start_cpu = time.perf_counter(), time.thread_time()
+            ok, _rehash = verify(PASSWORD, stored)
+            mine_cpu.append((time.thread_time() - start_cpu) * 1000)
+            mine.append((time.perf_counter() - start) * 1000)
+            assert ok
+        with lock:
+            latencies.extend(mine)
+            cpu.extend(mine_cpu)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (len(latencies) / elapsed, statistics.median(latencies),
+            latencies[int(len(latencies) * 0.95) - 1], statistics.mean(cpu))
+
+
+def bench_buckets(iterations):
+    buckets = TokenBuckets(capacity=5, per_second=0.1)
+    keys = [f"user{i}" for i in range(1000)]
+    start = time.perf_counter()
+    for i in range(iterations):
+        buckets.take(keys[i % len(keys)])
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent request threads")
+    parser.add_argument("--pool-workers", type=int, default=passwords.DEFAULTS["pool_workers"])
+    parser.add_argument("--rounds", type=int, default=passwords.DEFAULTS["rounds"], help="bcrypt cost")
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+
+    passwords.configure({"pool_workers": args.pool_workers, "rounds": args.rounds,
+                         "max_pending": max(args.threads, passwords.DEFAULTS["max_pending"])})
+    stored = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(args.rounds)).decode()
+    passwords.warm()
+
+    print(f"bcrypt cost {args.rounds}, {args.threads} threads, {args.pool_workers} pool workers, {os.cpu_count()} CPUs")
+    print(f"{'mode':<8} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'thread cpu ms':>14}")
+    for mode, verify in [("inline", _inline), ("pool", passwords.verify)]:
+        rate, p50, p95, cpu = run(verify, stored, args.threads, args.logins)
+        print(f"{mode:<8} {rate:>9.1f} {p50:>8.1f} {p95:>8.1f} {cpu:>14.2f}")
+    print(f"\nTokenBuckets.take: {bench_buckets(200_000):.2f} µs per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Benchmark every blueprint route through the Flask test client, with query-count and latency budgets.
+
+Runs against the database in config.json (seed it first, e.g. `python seed_scale.py`),
+signed in as the admin account. Each route is requested --iterations times after a
+warm-up; p50/p95 latency, SQL statements per request and response bytes are recorded:
+
+    python benchmarks/bench_routes.py                          # writes benchmarks/results/routes-<commit>.json
+    python benchmarks/bench_routes.py --compare benchmarks/results/routes-abc1234.json
+    python benchmarks/bench_routes.py --only films.index films.detail --iterations 50
+
+Exits non-zero when a route returns an unexpected status or exceeds its budget. The
+rental routes create (and close again) real rentals and payments, so use a test database.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # config.json is read relative to the working directory
+
+import pymysql.cursors
+from db import execute, query
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Every request also issues the page-view UPDATE, the auth decorator's user lookup and,
+# when it renders a template, the context processor's two queries.
+ROUTES = [
+    # name,                   method, path,                                  max queries, p95 ms
+    ("dashboard.stats",         "GET",  "/api/dashboard/stats",                       18, 1500),
+    ("dashboard.revenue_trend", "GET",  "/api/dashboard/revenue_trend?period=1y",      4, 500),
+    ("films.index",             "GET",  "/films",                                      9, 300),
+    ("films.detail",            "GET",  "/films/{film_id}",                            9, 300),
+    ("customers.index",         "GET",  "/customers",                                  5, 300),
+    ("customers.detail",        "GET",  "/customers/{customer_id}",                   11, 300),
+    ("rentals.index",           "GET",  "/rentals",                                    6, 500),
+    ("rentals.new_rental",      "GET",  "/rentals/new",                                7, 300),
+    ("rentals.new_rental:post", "POST", "/rentals/new",                                7, 200),
+    ("rentals.return_rental",   "POST", "/rentals/{rental_id}/return",                 8, 200),
+    ("payments.index",          "GET",  "/payments",                                   6, 500),
+    ("rentals.check_inventory", "GET",  "/api/inventory/{film_id}/{store_id}",         4, 100),
+]
+EXPECTED_STATUS = {"GET": 200, "POST": 302}
+
+
+class QueryCounter:
+    """Counts statements sent through any pymysql cursor while active."""
+
+    def __init__(self):
+        self.count = 0
+        self._original = pymysql.cursors.Cursor.execute
+
+    def __enter__(self):
+        counter, original = self, self._original
+
+        def execute(cur, sql, args=None):
+            counter.count += 1
+            return original(cur, sql, args)
+
+        pymysql.cursors.Cursor.execute = execute
+        return self
+
+    def __exit__(self, *exc):
+        pymysql.cursors.Cursor.execute = self._original
+
+
+def _fixtures():
+    """Ids to request: a film with a free copy at some store and a customer with history."""
+    free = query(
+        """SELECT i.film_id, i.store_id
+           FROM inventory i
+           LEFT JOIN rental r ON i.inventory_id = r.inventory_id AND r.returned_date IS NULL
+           WHERE r.rental_id IS NULL
+           ORDER BY i.inventory_id LIMIT 1""",
+        one=True,
+    )
+    customer = query(
+        "SELECT customer_id FROM rental GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1", one=True)
+    admin = query("SELECT user_id AS id FROM app_users WHERE role = 'admin' ORDER BY user_id LIMIT 1", one=True)
+    if not (free and customer and admin):
+        raise SystemExit("Database needs a free inventory copy, a customer with rentals and an admin account.")
+    return {**free, "customer_id": customer["customer_id"], "admin_id": admin["id"]}
+
+
+def _open_rental(fx):
+    inv = query(
+        """SELECT i.inventory_id FROM inventory i
+           LEFT JOIN rental r ON i.inventory_id = r.inventory_id AND r.returned_date IS NULL
+           WHERE i.film_id = %s AND i.store_id = %s AND r.rental_id IS NULL LIMIT 1""",
+        (fx["film_id"], fx["store_id"]), one=True,
+    )
+    staff = query("SELECT staff_id FROM staff WHERE store_id = %s LIMIT 1", (fx["store_id"],), one=True)
+    return execute(
+        "INSERT INTO rental (rental_date, inventory_id, customer_id, staff_id) VALUES (NOW(), %s, %s, %s)",
+        (inv["inventory_id"], fx["customer_id"], staff["staff_id"] if staff else 1),
+    )
+
+
+def _close_new_rental(fx):
+    execute(
+        """UPDATE rental SET returned_date = NOW()
+           WHERE customer_id = %s AND returned_date IS NULL
+           ORDER BY rental_id DESC LIMIT 1""",
+        (fx["customer_id"],),
+    )
+
+
+def _request_args(name, method, path, fx):
+    """(path, form data, teardown) for one request; per-request setup runs outside the timing."""
+    if name == "rentals.return_rental":
+        return path.format(rental_id=_open_rental(fx)), None, None
+    if name == "rentals.new_rental:post":
+        data = {"customer_id": fx["customer_id"], "film_id": fx["film_id"], "store_id": fx["store_id"]}
+        return path, data, _close_new_rental
+    return path.format(**fx), None, None
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_route(client, route, fx, iterations, warmup):
+    name, method, path, max_queries, p95_budget = route
+    timings, queries, sizes, statuses = [], [], [], set()
+    for i in range(warmup + iterations):
+        req_path, data, teardown = _request_args(name, method, path, fx)
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            response = client.open(req_path, method=method, data=data)
+            body = response.get_data()
+            elapsed = (time.perf_counter() - start) * 1000
+        if teardown:
+            teardown(fx)
+        if i < warmup:
+            continue
+        timings.append(elapsed)
+        queries.append(counter.count)
+        sizes.append(len(body))
+        statuses.add(response.status_code)
+
+    result = {
+        "method": method,
+        "path": path,
+        "p50_ms": round(_percentile(timings, 50), 2),
+        "p95_ms": round(_percentile(timings, 95), 2),
+        "queries": max(queries),
+        "bytes": max(sizes),
+        "status": sorted(statuses),
+        "budget": {"queries": max_queries, "p95_ms": p95_budget},
+    }
+    failures = []
+    if statuses != {EXPECTED_STATUS[method]}:
+        failures.append(f"status {sorted(statuses)}")
+    if result["queries"] > max_queries:
+        failures.append(f"{result['queries']} queries > {max_queries}")
+    if result["p95_ms"] > p95_budget:
+        failures.append(f"p95 {result['p95_ms']}ms > {p95_budget}ms")
+    result["failures"] = failures
+    return result
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _report(results, baseline):
+    print(f"{'route':<26} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'bytes':>9}  budget")
+    for name, r in results.items():
+        line = (f"{name:<26} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['queries']:>8} {r['bytes']:>9}  "
+                + ("FAIL: " + "; ".join(r["failures"]) if r["failures"] else "ok"))
+        old = baseline.get(name)
+        if old:
+            line += (f"   (p95 {r['p95_ms'] - old['p95_ms']:+.1f}ms, queries {r['queries'] - old['queries']:+d}, "
+                     f"bytes {r['bytes'] - old['bytes']:+d})")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--only", nargs="+", metavar="ROUTE", help="route names to run")
+    parser.add_argument("--output", help="results file (default benchmarks/results/routes-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to print deltas against")
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    app.testing = True
+    fx = _fixtures()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = fx["admin_id"]
+
+    routes = [r for r in ROUTES if not args.only or r[0] in args.only]
+    results = {}
+    for route in routes:
+        results[route[0]] = run_route(client, route, fx, args.iterations, args.warmup)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+    _report(results, baseline)
+
+    commit = _commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"routes-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+            "routes": results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+    failed = [name for name, r in results.items() if r["failures"]]
+    if failed:
+        print(f"{len(failed)} route(s) over budget: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Memory of large result sets as DictCursor dicts vs. compact rows (db.query(compact=True)).
+
+Builds a --rows result shaped like the rentals list (ids, dates, titles, names), either
+synthetically from driver-style tuples (default, no database needed) or by running a
+query against the database in config.json with --db. Each representation is built in
+a fresh process so peak RSS isn't shared between them, and reports:
+
+    retained MB   memory still held by the result (tracemalloc)
+    blocks        live allocations behind the result
+    peak RSS MB   the process high-water mark, including the driver's raw tuples
+
+    python benchmarks/bench_rows.py
+    python benchmarks/bench_rows.py --rows 500 --db
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # config.json is read relative to the working directory
+
+COLUMNS = ("rental_id", "rental_date", "returned_date", "title", "film_id", "store_id",
+           "customer_name", "customer_id", "staff_name")
+SQL = """
+    SELECT r.rental_id, r.rental_date, r.returned_date,
+           f.title, f.film_id, i.store_id,
+           CONCAT(c.first_name, ' ', c.last_name) AS customer_name,
+           c.customer_id,
+           CONCAT(st.first_name, ' ', st.last_name) AS staff_name
+    FROM rental r
+    JOIN inventory i ON r.inventory_id = i.inventory_id
+    JOIN film f ON i.film_id = f.film_id
+    JOIN customer c ON r.customer_id = c.customer_id
+    JOIN staff st ON r.staff_id = st.staff_id
+    ORDER BY r.rental_id LIMIT %s
+"""
+
+
+def _synthetic(n):
+    """Tuples as the driver returns them: every value a separate object, as when decoded from the wire."""
+    start = datetime(2005, 5, 24)
+    return [
+        (i, start + timedelta(minutes=i), start + timedelta(minutes=i, days=3) if i % 7 else None,
+         f"FILM TITLE {i % 1000}", i % 1000 + 1, i % 2 + 1, f"Customer {i % 599} Name",
+         i % 599 + 1, f"Staff {i % 2} Name")
+        for i in range(n)
+    ]
+
+
+def child(mode, rows, use_db):
+    import db
+
+    if use_db:
+        tracemalloc.start()
+        result = db.query(SQL, (rows,), compact=(mode == "compact"))
+    else:
+        raw = _synthetic(rows)
+        description = [(name,) for name in COLUMNS]
+        tracemalloc.start()
+        if mode == "compact":
+            result = db._compact(description, raw)
+        else:
+            result = [dict(zip(COLUMNS, r)) for r in raw]  # what DictCursor does per row
+        del raw
+    snapshot = tracemalloc.take_snapshot()
+    retained = sum(s.size for s in snapshot.statistics("filename"))
+    blocks = sum(s.count for s in snapshot.statistics("filename"))
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    print(json.dumps({"rows": len(result), "retained": retained, "blocks": blocks, "peak_rss_kb": peak_rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--db", action="store_true", help="fetch the rows from the database instead")
+    parser.add_argument("--child", choices=["dict", "compact"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.rows, args.db)
+
+    results = {}
+    for mode in ("dict", "compact"):
+        cmd = [sys.executable, __file__, "--child", mode, "--rows", str(args.rows)] + (["--db"] if args.db else [])
+        results[mode] = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+
+    print(f"{results['dict']['rows']} rows, {len(COLUMNS)} columns ({'database' if args.db else 'synthetic'})")
+    print(f"{'rows as':<9} {'retained MB':>12} {'blocks':>10} {'peak RSS MB':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<9} {r['retained'] / 2**20:>12.1f} {r['blocks']:>10} {r['peak_rss_kb'] / 1024:>12.1f}")
+    d, c = results["dict"], results["compact"]
+    print(f"\ncompact: {d['retained'] / c['retained']:.1f}x less retained memory, "
+          f"{d['blocks'] - c['blocks']} fewer blocks, {(d['peak_rss_kb'] - c['peak_rss_kb']) / 1024:.1f} MB lower peak RSS")
+
+
+if __name__ == "__main__":
+    main()
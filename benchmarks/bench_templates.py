@@ -0,0 +1,101 @@
+"""Render time of the list templates with and without the fragment cache.
+
+Renders films.html, rentals.html, payments.html and customers.html (inside base.html)
+from synthetic compact rows of the same shape as the views' queries, so only template
+work is timed; the app itself is built from config.json as usual. Each template is
+rendered with the fragment cache off, cold (emptied before every render) and warm.
+customers.html has no cached fragments and serves as a baseline:
+
+    python benchmarks/bench_templates.py
+    python benchmarks/bench_templates.py --rows 500 --iterations 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # config.json is read relative to the working directory
+
+from db import row_type
+from setup_db import STORE_NAMES
+import fragment_cache
+
+
+def _rows(columns, n, make):
+    Row = row_type(columns)
+    return [Row(*make(i)) for i in range(n)]
+
+
+def _contexts(n):
+    start = datetime(2005, 5, 24)
+    films = _rows(("film_id", "title", "release_year", "rating", "rental_rate", "length", "category"), n,
+                  lambda i: (i + 1, f"FILM TITLE {i}", 2006, "PG-13", Decimal("2.99"), 90 + i % 60, "Drama"))
+    rentals = _rows(("rental_id", "rental_date", "returned_date", "title", "film_id", "store_id",
+                     "customer_name", "customer_id", "staff_name"), n,
+                    lambda i: (i + 1, start + timedelta(hours=i), None, f"FILM TITLE {i % 1000}", i % 1000 + 1,
+                               i % 2 + 1, f"Customer {i % 599}", i % 599 + 1, "Mike Hillyer"))
+    payments = _rows(("payment_id", "customer_id", "customer_name", "film_id", "title", "store_name",
+                      "amount", "payment_date"), n,
+                     lambda i: (i + 1, i % 599 + 1, f"Customer {i % 599}", i % 1000 + 1, f"FILM TITLE {i % 1000}",
+                                STORE_NAMES[i % len(STORE_NAMES)], Decimal("4.99"), start + timedelta(hours=i)))
+    customers = _rows(("customer_id", "first_name", "last_name", "email", "active", "created_date", "store_id"), n,
+                      lambda i: (i + 1, f"First{i}", f"Last{i}", f"user{i}@example.com", 1, start, i % 2 + 1))
+    return [
+        ("/films", "films.html", {"films": films, "categories": [], "ratings": [], "years": [], "search": "",
+                                  "sel_category": "", "sel_rating": "", "sel_year": ""}),
+        ("/rentals", "rentals.html", {"rentals": rentals, "search": ""}),
+        ("/payments", "payments.html", {"payments": payments, "search": "", "date_from": "", "date_to": "",
+                                        "total": 0.0, "match_count": n}),
+        ("/customers", "customers.html", {"customers": customers, "search": ""}),
+    ]
+
+
+def render(app, path, template, context, iterations, cold):
+    from flask import g, request, session
+
+    env = app.jinja_env
+    user = {"id": 1, "username": "admin", "role": "admin", "staff_id": None, "customer_id": None}
+    times = []
+    for _ in range(iterations):
+        if cold:
+            env.fragment_cache.clear()
+        with app.test_request_context(path):
+            # Table versions would come from the database; fixed here so only rendering is timed
+            g.table_versions = {("film", "film_category", "category"): (1, 1, 1)}
+            ctx = {"request": request, "session": session, "g": g, "current_user": user,
+                   "page_views": 0, "sql_trace": None, **context}
+            start = time.perf_counter()
+            env.get_template(template).render(ctx)
+            times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    cache = app.jinja_env.fragment_cache or fragment_cache.FragmentCache(fragment_cache.DEFAULTS["max_entries"])
+    cache.max_entries = max(cache.max_entries, args.rows * 2)
+
+    print(f"{args.rows} rows per list, median of {args.iterations} renders")
+    print(f"{'template':<16} {'off ms':>8} {'cold ms':>8} {'warm ms':>8}  speed-up")
+    for path, template, context in _contexts(args.rows):
+        app.jinja_env.fragment_cache = None
+        off = render(app, path, template, context, args.iterations, cold=False)
+        app.jinja_env.fragment_cache = cache
+        cold = render(app, path, template, context, args.iterations, cold=True)
+        warm = render(app, path, template, context, args.iterations, cold=False)
+        print(f"{template:<16} {off:>8.2f} {cold:>8.2f} {warm:>8.2f}  {off / warm:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Replay a Saturday-evening mix of checkouts, returns, browsing and dashboard refreshes against a running server.
+
+    python app.py                                                  # or any deployment, on a test database
+    python benchmarks/load_test.py --users 40 --duration 120
+    python benchmarks/load_test.py --url http://staging:8080 --users 100 --think 0.5 --mix checkout=5 dashboard=3
+
+Each virtual user is a thread with its own session, signed in as the admin, a staff
+account (created by the migrations, password Staff@1234) or a customer account (registered
+as loadtest<N> on first use). Users pick weighted actions for their role and pause an
+exponentially distributed think time between them.
+
+Every virtual user connects from the same address, and admin users share one account,
+so run the server with the login rate limit off ("login_rate_limit": {"enabled": false}
+in its config.json). Otherwise logins are answered 429; the users concerned retry after
+Retry-After, and the report counts the rate-limited logins and any users who never
+signed in.
+
+At the end it reports throughput, per-endpoint latency percentiles and error rates, then
+checks the database for lost updates made during the run: inventory rented twice at
+once and rentals charged more than once. Exits non-zero if any are found.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # config.json is read relative to the working directory
+
+from db import load_config, query
+
+CUSTOMER_PASSWORD = "Load@test1"
+STAFF_PASSWORD = "Staff@1234"
+# Share of virtual users per role
+ROLE_MIX = {"admin": 0.1, "staff": 0.5, "customer": 0.4}
+# action -> (roles allowed, default weight)
+ACTIONS = {
+    "browse": (("admin", "staff", "customer"), 6),
+    "film": (("admin", "staff", "customer"), 4),
+    "my_rentals": (("customer",), 2),
+    "checkout": (("admin", "staff"), 4),
+    "return": (("admin", "staff"), 3),
+    "customer": (("admin", "staff"), 2),
+    "payments": (("admin", "staff"), 1),
+    "dashboard": (("admin", "staff"), 2),
+}
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self.rate_limited = 0  # login attempts answered 429
+        self.not_signed_in = 0  # users that gave up before signing in
+
+    def record(self, endpoint, seconds, error=None):
+        with self.lock:
+            self.latency[endpoint].append(seconds)
+            if error:
+                self.errors[endpoint] += 1
+                self.error_samples.setdefault(endpoint, error)
+
+
+class Pools:
+    """Ids shared by all virtual users, loaded from the database outside the timed requests."""
+
+    def __init__(self, rng):
+        self.lock = threading.Lock()
+        self.films = [r["film_id"] for r in query("SELECT film_id FROM film")]
+        self.customers = [r["customer_id"] for r in query(
+            "SELECT customer_id FROM customer WHERE active = 1 ORDER BY customer_id LIMIT 20000")]
+        self.stocked = [(r["film_id"], r["store_id"]) for r in query(
+            "SELECT DISTINCT film_id, store_id FROM inventory ORDER BY film_id, store_id")]
+        # A few titles get most checkouts, as on a real new-release weekend
+        rng.shuffle(self.stocked)
+        self.open_rentals = []
+
+    def hot_stock(self, rng):
+        return self.stocked[min(len(self.stocked) - 1, int(rng.paretovariate(1.2)) - 1)]
+
+    def take_open_rental(self):
+        with self.lock:
+            if not self.open_rentals:
+                self.open_rentals = [r["rental_id"] for r in query(
+                    "SELECT rental_id FROM rental WHERE returned_date IS NULL ORDER BY RAND() LIMIT 1000")]
+            return self.open_rentals.pop() if self.open_rentals else None
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, index, role, username, password, args, stats, pools, stop):
+        super().__init__(daemon=True, name=f"vu-{index}")
+        self.role, self.username, self.password = role, username, password
+        self.args, self.stats, self.pools, self.stop = args, stats, pools, stop
+        self.rng = random.Random(args.seed * 1000 + index)
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+        weights = {name: args.mix.get(name, weight) for name, (roles, weight) in ACTIONS.items() if role in roles}
+        self.actions, self.weights = list(weights), list(weights.values())
+        self.start_delay = index * args.ramp / max(1, args.users)
+
+    def request(self, endpoint, path, data=None, ok=(200,)):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        start = time.perf_counter()
+        error = None
+        try:
+            with self.opener.open(self.args.url + path, body, timeout=self.args.timeout) as resp:
+                status, content, headers = resp.status, resp.read(), resp.headers
+        except urllib.error.HTTPError as e:
+            status, content, headers = e.code, e.read(), e.headers
+        except OSError as e:
+            status, content, headers = None, b"", {}
+            error = f"{type(e).__name__}: {e}"
+        location = headers.get("Location", "")
+        elapsed = time.perf_counter() - start
+        if error is None and status not in ok:
+            error = f"HTTP {status}" + (f" -> {location}" if location else "")
+        self.stats.record(endpoint, elapsed, error)
+        return status, content, headers
+
+    def login(self):
+        if self.role == "customer":
+            n = self.username[len("loadtest"):]
+            self.request("register", "/register", {
+                "username": self.username, "email": f"{self.username}@loadtest.example",
+                "password": CUSTOMER_PASSWORD, "confirm_password": CUSTOMER_PASSWORD,
+                "first_name": "Load", "last_name": f"Test{n}",
+            }, ok=(200, 302))
+        while not self.stop.is_set():
+            status, _, headers = self.request(
+                "login", "/login", {"username": self.username, "password": self.password}, ok=(302,))
+            if status != 429:
+                return status == 302
+            with self.stats.lock:
+                self.stats.rate_limited += 1
+            self.stop.wait(float(headers.get("Retry-After") or 1))
+        return False
+
+    def run(self):
+        if self.stop.wait(self.start_delay):
+            return
+        if not self.login():
+            with self.stats.lock:
+                self.stats.not_signed_in += 1
+            return
+        while not self.stop.is_set():
+            action = self.rng.choices(self.actions, self.weights)[0]
+            getattr(self, "do_" + action)()
+            self.stop.wait(self.rng.expovariate(1 / self.args.think) if self.args.think else 0)
+
+    def do_browse(self):
+        self.request("films.index", "/films")
+
+    def do_film(self):
+        film_id = self.rng.choice(self.pools.films)
+        self.request("films.detail", f"/films/{film_id}")
+
+    def do_my_rentals(self):
+        self.request("rentals.index", "/rentals")
+
+    def do_checkout(self):
+        film_id, store_id = self.pools.hot_stock(self.rng)
+        self.request("rentals.new_rental", "/rentals/new")
+        status, content, _ = self.request("inventory_api", f"/api/inventory/{film_id}/{store_id}")
+        if status == 200 and json.loads(content or b"{}").get("available"):
+            self.request("rentals.new_rental:post", "/rentals/new", {
+                "customer_id": self.rng.choice(self.pools.customers), "film_id": film_id, "store_id": store_id,
+            }, ok=(302,))
+
+    def do_return(self):
+        rental_id = self.pools.take_open_rental()
+        if rental_id:
+            self.request("rentals.return_rental", f"/rentals/{rental_id}/return", {}, ok=(302,))
+
+    def do_customer(self):
+        self.request("customers.detail", f"/customers/{self.rng.choice(self.pools.customers)}")
+
+    def do_payments(self):
+        self.request("payments.index", "/payments")
+
+    def do_dashboard(self):
+        self.request("dashboard.stats", "/api/dashboard/stats")
+        self.request("dashboard.revenue_trend", "/api/dashboard/revenue_trend?period=1m")
+
+
+def _accounts(n_users, rng):
+    cfg = load_config()
+    admin = (cfg.get("admin_username", "admin"), cfg.get("admin_password", "Admin@1234"))
+    staff = [r["username"] for r in query("SELECT username FROM app_users WHERE role = 'staff' ORDER BY user_id")]
+    accounts = []
+    for i in range(n_users):
+        role = rng.choices(list(ROLE_MIX), list(ROLE_MIX.values()))[0]
+        if role == "staff" and not staff:
+            role = "admin"
+        if role == "admin":
+            accounts.append(("admin", *admin))
+        elif role == "staff":
+            accounts.append(("staff", staff[i % len(staff)], STAFF_PASSWORD))
+        else:
+            accounts.append(("customer", f"loadtest{i}", CUSTOMER_PASSWORD))
+    return accounts
+
+
+def lost_updates(since):
+    """Inconsistencies written since `since` that only concurrent requests can produce."""
+    double_rented = query(
+        """SELECT r1.inventory_id, r1.rental_id AS first, r2.rental_id AS second
+           FROM rental r1
+           JOIN rental r2 ON r2.inventory_id = r1.inventory_id AND r2.rental_id > r1.rental_id
+           WHERE r2.rental_date >= %s
+             AND r2.rental_date < COALESCE(r1.returned_date, NOW() + INTERVAL 1 DAY)
+             AND r1.rental_date <= r2.rental_date""",
+        (since,),
+    )
+    double_charged = query(
+        """SELECT rental_id, COUNT(*) AS payments
+           FROM payment
+           WHERE payment_date >= %s AND rental_id IS NOT NULL
+           GROUP BY rental_id HAVING COUNT(*) > 1""",
+        (since,),
+    )
+    return {"double_rented": double_rented, "double_charged": double_charged}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(stats, elapsed):
+    total = sum(len(v) for v in stats.latency.values())
+    errors = sum(stats.errors.values())
+    print(f"\n{total} requests in {elapsed:.1f}s = {total / elapsed:.1f} req/s, "
+          f"{errors} errors ({errors / max(1, total):.2%})\n")
+    print(f"{'endpoint':<26} {'count':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    summary = {}
+    for endpoint in sorted(stats.latency):
+        lat = [s * 1000 for s in stats.latency[endpoint]]
+        row = {
+            "count": len(lat), "rps": round(len(lat) / elapsed, 2),
+            "p50_ms": round(_percentile(lat, 50), 1), "p95_ms": round(_percentile(lat, 95), 1),
+            "p99_ms": round(_percentile(lat, 99), 1), "errors": stats.errors[endpoint],
+        }
+        summary[endpoint] = row
+        print(f"{endpoint:<26} {row['count']:>7} {row['rps']:>7.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['errors']:>7}")
+    for endpoint, sample in stats.error_samples.items():
+        print(f"  first error on {endpoint}: {sample}")
+    if stats.rate_limited or stats.not_signed_in:
+        print(f"\n{stats.rate_limited} logins rate-limited (429), {stats.not_signed_in} users never signed in; "
+              f'set "login_rate_limit": {{"enabled": false}} in the server\'s config.json for load tests')
+    return {"requests": total, "errors": errors, "seconds": round(elapsed, 1), "endpoints": summary,
+            "rate_limited_logins": stats.rate_limited, "users_not_signed_in": stats.not_signed_in}
+
+
+def _parse_mix(values):
+    mix = {}
+    for item in values or []:
+        name, _, weight = item.partition("=")
+        if name not in ACTIONS:
+            raise SystemExit(f"Unknown action {name!r}; choose from {', '.join(ACTIONS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users (threads)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which users start")
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time between actions (0 for none)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--mix", nargs="+", metavar="ACTION=WEIGHT", help=f"override weights: {', '.join(ACTIONS)}")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+    args.url = args.url.rstrip("/")
+    args.mix = _parse_mix(args.mix)
+
+    rng = random.Random(args.seed)
+    pools = Pools(rng)
+    stats = Stats()
+    stop = threading.Event()
+    since = query("SELECT NOW() AS now", one=True)["now"]
+    users = [VirtualUser(i, role, name, password, args, stats, pools, stop)
+             for i, (role, name, password) in enumerate(_accounts(args.users, rng))]
+    print(f"{len(users)} users ({', '.join(f'{r}: {sum(u.role == r for u in users)}' for r in ROLE_MIX)}) "
+          f"against {args.url} for {args.duration:.0f}s")
+
+    start = time.perf_counter()
+    for user in users:
+        user.start()
+    try:
+        stop.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for user in users:
+        user.join(args.timeout)
+    result = report(stats, time.perf_counter() - start)
+
+    anomalies = lost_updates(since)
+    print(f"\nLost updates since {since}: {len(anomalies['double_rented'])} double-rented copies, "
+          f"{len(anomalies['double_charged'])} rentals charged more than once")
+    for row in anomalies["double_rented"][:10]:
+        print(f"  inventory {row['inventory_id']}: rentals {row['first']} and {row['second']} overlap")
+    for row in anomalies["double_charged"][:10]:
+        print(f"  rental {row['rental_id']}: {row['payments']} payments")
+
+    if args.output:
+        result.update(started=since.isoformat(), finished=datetime.now().isoformat(timespec="seconds"),
+                      users=args.users, think=args.think,
+                      lost_updates={k: len(v) for k, v in anomalies.items()})
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if any(anomalies.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
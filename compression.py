@@ -0,0 +1,147 @@
+"""WSGI middleware that compresses HTML, JSON, CSV and other text responses with brotli or gzip.
+
+The encoding is negotiated from Accept-Encoding (brotli preferred when the brotli
+package is installed). Buffered responses are compressed in one go and keep a
+Content-Length; bodies under min_size are sent as they are. Streamed responses
+(no Content-Length, e.g. the CSV exports) are compressed chunk by chunk, flushing
+after each chunk so the client keeps receiving data as it is produced. Responses
+that are already encoded (precompressed static files), partial, offloaded to the
+front-end server, or not text are passed through untouched. A strong ETag on a
+response that gets compressed is made weak, since the encoded bytes differ from the
+identity ones it was computed for; If-None-Match still matches it.
+"""
+import zlib
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+DEFAULTS = {"enabled": True, "gzip_level": 6, "brotli_quality": 4, "min_size": 1024}
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def gzip_compressor(level):
+    return zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+
+class _Brotli:
+    """brotli.Compressor with the zlib compressobj interface."""
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self, mode=zlib.Z_FINISH):
+        return self._compressor.finish() if mode == zlib.Z_FINISH else self._compressor.flush()
+
+
+def negotiate(accept_encoding):
+    """"br", "gzip" or None for an Accept-Encoding header value."""
+    accepted = parse_accept_header(accept_encoding or "")
+    if brotli and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, gzip_level=6, brotli_quality=4, min_size=1024):
+        self.app = app
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.min_size = min_size
+
+    def compressor(self, encoding):
+        return _Brotli(self.brotli_quality) if encoding == "br" else gzip_compressor(self.gzip_level)
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get("HTTP_ACCEPT_ENCODING"))
+        if not encoding or environ.get("REQUEST_METHOD") == "HEAD":
+            return self.app(environ, start_response)
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None  # the legacy write() callable; Flask never uses it
+
+        app_iter = self.app(environ, capture)  # Flask calls start_response before returning
+        status, headers, exc_info = captured
+        compressible, length = _inspect(status, headers)
+        if not compressible:
+            start_response(status, headers, exc_info)
+            return app_iter
+        headers = [(k, v) for k, v in headers if k.lower() != "vary"] + [("Vary", _vary(headers))]
+
+        if length is None:
+            start_response(status, [(k, v) for k, v in _weaken_etag(headers) if k.lower() != "content-length"]
+                           + [("Content-Encoding", encoding)], exc_info)
+            return self._stream(app_iter, self.compressor(encoding))
+
+        try:
+            body = b"".join(app_iter)
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+        if len(body) < self.min_size:
+            start_response(status, headers, exc_info)
+            return [body]
+        compressor = self.compressor(encoding)
+        body = compressor.compress(body) + compressor.flush()
+        headers = [(k, v) for k, v in _weaken_etag(headers) if k.lower() != "content-length"]
+        start_response(status, headers + [("Content-Encoding", encoding), ("Content-Length", str(len(body)))],
+                       exc_info)
+        return [body]
+
+    @staticmethod
+    def _stream(app_iter, compressor):
+        try:
+            for chunk in app_iter:
+                if chunk:
+                    data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                    if data:
+                        yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+
+
+def _inspect(status, headers):
+    """(worth compressing, Content-Length or None) for a response."""
+    if not status.startswith("200"):
+        return False, None
+    values = {k.lower(): v for k, v in headers}
+    if "content-encoding" in values or "x-accel-redirect" in values or "x-sendfile" in values:
+        return False, None
+    if "no-transform" in values.get("cache-control", ""):
+        return False, None
+    if not values.get("content-type", "").startswith(COMPRESSIBLE):
+        return False, None
+    length = values.get("content-length")
+    return True, int(length) if length is not None else None
+
+
+def _weaken_etag(headers):
+    return [(k, "W/" + v if k.lower() == "etag" and not v.startswith("W/") else v) for k, v in headers]
+
+
+def _vary(headers):
+    existing = [v for k, v in headers if k.lower() == "vary"]
+    fields = [f.strip() for value in existing for f in value.split(",") if f.strip()]
+    if "accept-encoding" not in (f.lower() for f in fields):
+        fields.append("Accept-Encoding")
+    return ", ".join(fields)
+
+
+def init_app(app, config=None):
+    """Wrap app.wsgi_app; config: {"enabled", "gzip_level", "brotli_quality", "min_size"}."""
+    settings = {**DEFAULTS, **(config or {})}
+    if settings["enabled"]:
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app, int(settings["gzip_level"]),
+                                             int(settings["brotli_quality"]), int(settings["min_size"]))
@@ -0,0 +1,86 @@
+"""Conditional GET for views whose output depends only on a few tables.
+
+    @films_bp.route("/films")
+    @login_required
+    @conditional("film", "film_category", "category")
+    def index(): ...
+
+The ETag combines the tables' data versions (see db.table_versions), the signed-in
+user, the URL and the code and static asset builds, so an If-None-Match hit costs
+one primary-key lookup and returns 304 before the view runs. Views that also depend on the clock
+pass ttl=seconds so their tag changes at least that often. Responses are marked
+private and must be revalidated, since pages embed the signed-in user.
+"""
+import hashlib
+import os
+import time
+from functools import wraps
+import pymysql
+from flask import current_app, g, has_app_context, make_response, request, session
+from db import table_versions
+import static_assets
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _code_version():
+    """Newest mtime of the templates and Python sources, so a deploy invalidates every tag."""
+    newest = 0.0
+    for folder in ("templates", "routes", "."):
+        path = os.path.join(_ROOT, folder)
+        for name in os.listdir(path):
+            if name.endswith((".html", ".py")):
+                newest = max(newest, os.path.getmtime(os.path.join(path, name)))
+    return str(newest)
+
+
+CODE_VERSION = _code_version()
+
+
+def request_versions(tables):
+    """db.table_versions(tables), looked up once per request and shared with the templates."""
+    memo = g.setdefault("table_versions", {}) if has_app_context() else {}
+    tables = tuple(tables)
+    if tables not in memo:
+        memo[tables] = tuple(table_versions(tables))
+    return memo[tables]
+
+
+def _etag(tables, ttl):
+    try:
+        versions = request_versions(tables)
+    except pymysql.MySQLError:  # data_versions not migrated yet
+        return None
+    parts = [CODE_VERSION, static_assets.version(), request.full_path, str(session.get("user_id")),
+             ",".join(map(str, versions))]
+    if ttl:
+        parts.append(str(int(time.time() // ttl)))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def _cache_headers(response, etag):
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def conditional(*tables, ttl=None):
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            # Pending flash messages are part of the page, but not of its data
+            if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+                return current_app.ensure_sync(f)(*args, **kwargs)
+            etag = _etag(tables, ttl)
+            if etag is None:
+                return current_app.ensure_sync(f)(*args, **kwargs)
+            if request.if_none_match.contains_weak(etag):
+                return _cache_headers(make_response("", 304), etag)
+            response = make_response(current_app.ensure_sync(f)(*args, **kwargs))
+            if response.status_code == 200:
+                _cache_headers(response, etag)
+            return response
+        return wrapped
+    return decorator
@@ -1,6 +1,28 @@
+import asyncio
+import contextvars
+import functools
 import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
 import pymysql
 import pymysql.cursors
+from metrics import cache_event
+
+log = logging.getLogger(__name__)
+
+# Called for every connection opened and every statement run (metrics.py registers here)
+connection_hooks = []
+statement_hooks = []
+# Context managers entered around every call run_sync() makes on a pool thread (profiler.py)
+pool_hooks = []
 
 def load_config():
     with open("config.json") as f:
@@ -8,6 +30,8 @@ def load_config():
 
 def get_connection():
     cfg = load_config()["db"]
+    for hook in connection_hooks:
+        hook()
     return pymysql.connect(
         host=cfg["host"],
         port=cfg["port"],
@@ -18,22 +42,456 @@ def get_connection():
         autocommit=True,
     )
 
-def query(sql, args=None, one=False):
+def query(sql, args=None, one=False, cache=False, compact=False):
+    """Rows as dicts (or the first row with one=True).
+
+    cache=True serves repeated reads of near-static tables from the result cache
+    below; execute() invalidates it by table, so callers never have to.
+    compact=True returns rows as named tuples (see row_type) for large lists.
+    """
+    if cache and cache_settings()["enabled"]:
+        return _cached_query(sql, args, one, compact)
     conn = get_connection()
     try:
-        with conn.cursor() as cur:
+        with conn.cursor(pymysql.cursors.Cursor if compact else None) as cur:
+            start = time.perf_counter()
             cur.execute(sql, args or ())
             rows = cur.fetchall()
+            _record(sql, start, len(rows), "query")
+            if compact:
+                rows = _compact(cur.description, rows)
             return rows[0] if one and rows else rows if not one else None
     finally:
         conn.close()
 
+@lru_cache(maxsize=512)
+def row_type(columns):
+    """Named-tuple class for a tuple of column names, shared by every query that returns them.
+
+    A row is a bare tuple plus attribute access: no per-row hash table or key
+    references, about half the memory of a dict row.
+    Templates read fields the same way (row.title, row["title"]); Python code
+    uses row.title or row._asdict().
+    """
+    return namedtuple("Row", columns, rename=True)
+
+def _compact(description, rows):
+    make = row_type(tuple(d[0] for d in description))._make
+    return [make(r) for r in rows]
+
 def execute(sql, args=None):
     conn = get_connection()
     try:
+        # Explicit transaction (the connection autocommits) so the write and its
+        # version bump commit together
+        conn.begin()
         with conn.cursor() as cur:
+            start = time.perf_counter()
+            try:
+                cur.execute(sql, args or ())
+                rowcount, lastrowid = cur.rowcount, cur.lastrowid
+                table = written_table(sql)
+                if table and table not in UNVERSIONED:
+                    bump_versions(cur, [table])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            if table:
+                _result_cache.invalidate([table])
+            _record(sql, start, rowcount, "execute")
+            return lastrowid
+    finally:
+        conn.close()
+
+def stream(sql, args=None, chunk_size=1000):
+    """Yield lists of up to chunk_size rows from an unbuffered server-side cursor.
+
+    Rows are fetched as they are consumed, so memory stays constant however large
+    the result is. The connection is held until the generator is exhausted or closed.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cur:
+            start = time.perf_counter()
             cur.execute(sql, args or ())
-            conn.commit()
-            return cur.lastrowid
+            # Recorded once the statement starts returning rows; the transfer time isn't included
+            _record(sql, start, None, "stream")
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    finally:
+        conn.close()
+
+class Transaction:
+    """Statements on one connection, committed together; see transaction()."""
+
+    def __init__(self, cur):
+        self._cur = cur
+        self.tables = set()
+
+    def query(self, sql, args=None, one=False):
+        start = time.perf_counter()
+        self._cur.execute(sql, args or ())
+        rows = self._cur.fetchall()
+        _record(sql, start, len(rows), "query")
+        return rows[0] if one and rows else rows if not one else None
+
+    def execute(self, sql, args=None):
+        """Like db.execute(): returns lastrowid."""
+        start = time.perf_counter()
+        self._cur.execute(sql, args or ())
+        table = written_table(sql)
+        if table:
+            self.tables.add(table)
+        _record(sql, start, self._cur.rowcount, "execute")
+        return self._cur.lastrowid
+
+@contextmanager
+def transaction():
+    """with transaction() as tx: tx.execute(...) -- committed on exit, rolled back on an exception.
+
+    Data versions of the tables written are bumped in the same transaction and the
+    result cache is invalidated after the commit, as execute() does per statement.
+    """
+    conn = get_connection()
+    try:
+        conn.begin()
+        with conn.cursor() as cur:
+            tx = Transaction(cur)
+            try:
+                yield tx
+                bump_versions(cur, sorted(tx.tables - UNVERSIONED))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        if tx.tables:
+            _result_cache.invalidate(tx.tables)
     finally:
         conn.close()
+
+
+# --- Async facade for views that fan out independent queries --------------------------
+#
+#     film, actors = await asyncio.gather(aquery(...), aquery(...))
+#
+# Each call runs the blocking helper above on a shared thread pool ("async_db":
+# {"workers"} in config.json), so the queries overlap and a view's latency tends to
+# the slowest one instead of the sum. At most "per_request" of them are in flight for
+# one request (one event loop: Flask runs each async view in its own).
+
+ASYNC_DEFAULTS = {"workers": 16, "per_request": 4}
+
+_executor = None
+_executor_pid = None
+_limits = weakref.WeakKeyDictionary()
+_async_settings = None
+
+
+def async_settings():
+    global _async_settings
+    if _async_settings is None:
+        _async_settings = {**ASYNC_DEFAULTS, **load_config().get("async_db", {})}
+    return _async_settings
+
+
+def _pool():
+    global _executor, _executor_pid
+    # Pool threads don't survive a fork, so each worker process starts its own
+    if _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=async_settings()["workers"], thread_name_prefix="db")
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def _limit():
+    loop = asyncio.get_running_loop()
+    semaphore = _limits.get(loop)
+    if semaphore is None:
+        semaphore = _limits[loop] = asyncio.Semaphore(async_settings()["per_request"])
+    return semaphore
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run a blocking call on the pool, counted against the request's concurrency limit."""
+    async with _limit():
+        # Copy the context so SQL tracing still sees the request's statement list
+        call = functools.partial(contextvars.copy_context().run, _pool_call, func, args, kwargs)
+        return await asyncio.get_running_loop().run_in_executor(_pool(), call)
+
+
+def _pool_call(func, args, kwargs):
+    if not pool_hooks:
+        return func(*args, **kwargs)
+    with ExitStack() as stack:
+        for hook in pool_hooks:
+            stack.enter_context(hook())
+        return func(*args, **kwargs)
+
+
+async def aquery(sql, args=None, one=False, cache=False, compact=False):
+    return await run_sync(query, sql, args, one, cache, compact)
+
+
+async def aexecute(sql, args=None):
+    return await run_sync(execute, sql, args)
+
+
+# --- Data versions for conditional GET (conditional.py) ----------------------------
+
+WRITE_RE = re.compile(r"^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+`?(\w+)", re.I)
+# Written on every request or by the migration runner; never part of a page's data
+UNVERSIONED = {"page_views", "data_versions", "schema_version"}
+
+
+def written_table(sql):
+    """Table an INSERT/REPLACE/UPDATE/DELETE writes to (the first one named), or None."""
+    m = WRITE_RE.match(sql)
+    return m.group(1).lower() if m else None
+
+
+def bump_versions(cur, tables):
+    """Advance the data version of tables, in the caller's transaction.
+
+    Scripts that write with their own connections call this too, so pages cached
+    by browsers (conditional.py) see the change.
+    """
+    try:
+        for table in tables:
+            cur.execute(
+                "INSERT INTO data_versions (table_name, version) VALUES (%s, 1) "
+                "ON DUPLICATE KEY UPDATE version = version + 1",
+                (table,),
+            )
+    except pymysql.err.ProgrammingError:  # data_versions not migrated yet
+        pass
+
+
+def table_versions(tables):
+    """Current version of each table (0 if never written through execute())."""
+    rows = query(
+        f"SELECT table_name, version FROM data_versions WHERE table_name IN ({', '.join(['%s'] * len(tables))})",
+        list(tables),
+    )
+    versions = {r["table_name"]: r["version"] for r in rows}
+    return [versions.get(t, 0) for t in tables]
+
+
+# --- Query result cache ("query_cache" in config.json) --------------------------------
+#
+# Entries are keyed by whitespace-normalised SQL plus args and tagged with the tables
+# named in FROM/JOIN (so don't cache reads of views such as v_users). execute() drops
+# this process's entries for the table it wrote; writes made by other worker
+# processes are picked up from data_versions, checked at most every sync_seconds.
+
+CACHE_DEFAULTS = {"enabled": True, "max_entries": 2000, "ttl_seconds": 300, "sync_seconds": 1.0}
+READ_RE = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)", re.I)
+
+_cache_settings = None
+
+
+def cache_settings():
+    global _cache_settings
+    if _cache_settings is None:
+        _cache_settings = {**CACHE_DEFAULTS, **load_config().get("query_cache", {})}
+    return _cache_settings
+
+
+@lru_cache(maxsize=1024)
+def read_tables(sql):
+    return tuple(sorted({t.lower() for t in READ_RE.findall(sql)}))
+
+
+class ResultCache:
+    """Size-bounded LRU of query results with a TTL, invalidated by table."""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (expires, tables, rows)
+        self._by_table = {}
+        self._generations = {}  # table -> invalidation count, so a read racing a write isn't stored
+        self._lock = threading.Lock()
+        self._versions = None
+        self._synced = 0.0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def generation(self, tables):
+        with self._lock:
+            return tuple(self._generations.get(t, 0) for t in tables)
+
+    def put(self, key, tables, rows, generation, settings):
+        evicted = 0
+        with self._lock:
+            if generation != tuple(self._generations.get(t, 0) for t in tables):
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + settings["ttl_seconds"], tables, rows)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > settings["max_entries"]:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        if evicted:
+            cache_event("query", "eviction", evicted)
+
+    def invalidate(self, tables):
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._by_table.pop(table, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def sync(self, interval):
+        """Invalidate tables whose data_versions changed (i.e. written by another process)."""
+        now = time.monotonic()
+        if now - self._synced < interval:
+            return
+        self._synced = now
+        try:
+            versions = {r["table_name"]: r["version"] for r in query("SELECT table_name, version FROM data_versions")}
+        except pymysql.MySQLError:  # data_versions not migrated yet: rely on the TTL
+            return
+        if self._versions is not None:
+            changed = [t for t in set(versions) | set(self._versions) if versions.get(t) != self._versions.get(t)]
+            if changed:
+                self.invalidate(changed)
+        self._versions = versions
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for table in entry[1]:
+                keys = self._by_table.get(table)
+                if keys is not None:
+                    keys.discard(key)
+
+
+_result_cache = ResultCache()
+
+
+def _cached_query(sql, args, one, compact=False):
+    settings = cache_settings()
+    _result_cache.sync(settings["sync_seconds"])
+    key = (" ".join(sql.split()), tuple(args) if isinstance(args, (list, tuple)) else args, one, compact)
+    rows = _result_cache.get(key)
+    if rows is not None:
+        cache_event("query", "hit")
+    else:
+        cache_event("query", "miss")
+        tables = read_tables(sql)
+        generation = _result_cache.generation(tables)
+        rows = query(sql, args, one, compact=compact)
+        _result_cache.put(key, tables, rows, generation, settings)
+    if compact:
+        return rows  # named tuples are immutable, so entries can be shared
+    # Callers may modify the dicts they get back
+    if one:
+        return dict(rows) if rows else rows
+    return [dict(r) for r in rows]
+
+
+# --- Opt-in SQL tracing ("sql_trace" in config.json) ---------------------------
+
+TRACE_DEFAULTS = {"enabled": False, "slow_ms": 200, "n_plus_one": 5}
+
+_trace = contextvars.ContextVar("sql_trace", default=None)
+_stats = {}
+_stats_lock = threading.Lock()
+_settings = None
+
+
+def trace_settings():
+    global _settings
+    if _settings is None:
+        _settings = {**TRACE_DEFAULTS, **load_config().get("sql_trace", {})}
+    return _settings
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """SQL with literals and placeholders replaced by ?, so the same statement groups together."""
+    sql = re.sub(r"--[^\n]*|/\*.*?\*/", " ", sql, flags=re.S)
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", "?", sql)
+    sql = re.sub(r"%s|\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?+)", sql)
+    return " ".join(sql.split())
+
+
+def start_trace():
+    """Collect this request's statements (a list of dicts) until end_trace()."""
+    statements = []
+    _trace.set(statements)
+    return statements
+
+
+def current_trace():
+    """Statements recorded so far in this request, or None when not tracing."""
+    return _trace.get()
+
+
+def end_trace():
+    """Stop collecting and summarise: statement count, total ms and N+1 suspects."""
+    statements = _trace.get()
+    _trace.set(None)
+    if statements is None:
+        return None
+    repeats = Counter(s["fingerprint"] for s in statements)
+    threshold = trace_settings()["n_plus_one"]
+    n_plus_one = {fp: n for fp, n in repeats.items() if n >= threshold}
+    for fp, n in n_plus_one.items():
+        log.warning("Possible N+1: %d x %s", n, fp)
+    return {
+        "count": len(statements),
+        "ms": round(sum(s["ms"] for s in statements), 1),
+        "n_plus_one": n_plus_one,
+        "statements": statements,
+    }
+
+
+def query_stats():
+    """Aggregate timings per fingerprint since startup, slowest total first."""
+    with _stats_lock:
+        rows = [{"fingerprint": fp, **st} for fp, st in _stats.items()]
+    for row in rows:
+        row["avg_ms"] = round(row["total_ms"] / row["count"], 2)
+        row["total_ms"], row["max_ms"] = round(row["total_ms"], 1), round(row["max_ms"], 2)
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+def _record(sql, start, rows, operation):
+    seconds = time.perf_counter() - start
+    for hook in statement_hooks:
+        hook(operation, seconds)
+    settings = trace_settings()
+    if not settings["enabled"]:
+        return
+    ms = seconds * 1000
+    fp = fingerprint(sql)
+    with _stats_lock:
+        st = _stats.setdefault(fp, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0})
+        st["count"] += 1
+        st["total_ms"] += ms
+        st["max_ms"] = max(st["max_ms"], ms)
+        st["rows"] += rows or 0
+    if ms >= settings["slow_ms"]:
+        log.warning("Slow query (%.0f ms, %s rows): %s", ms, rows, fp)
+    statements = _trace.get()
+    if statements is not None:
+        statements.append({"fingerprint": fp, "ms": round(ms, 2), "rows": rows})
@@ -0,0 +1,121 @@
+"""Jinja fragment cache: {% cache %} blocks rendered once and reused across requests.
+
+    {% cache "film-row", f.film_id, f.category, tables=("film", "film_category", "category") %}
+        <tr>...</tr>
+    {% endcache %}
+
+A block is keyed on its position in the template, the values given, the static asset
+build and the current data versions of the named tables (read once per request,
+shared with conditional.py), so a write through db.execute() retires every fragment
+built from the old data. Compact rows (db.query(compact=True)) are hashable and can be
+the key themselves, in which case no tables are needed. Everything the block prints
+must follow from its key.
+
+Entries live in a bounded LRU in each process ("fragment_cache" in config.json);
+hits, misses and evictions are reported as cache_events_total{cache="fragment"}.
+"""
+import itertools
+import threading
+from collections import OrderedDict
+import pymysql
+from jinja2 import nodes
+from jinja2.ext import Extension
+from conditional import request_versions
+from metrics import cache_event
+import static_assets
+
+DEFAULTS = {"enabled": True, "max_entries": 5000}
+
+# Each compilation of a template gets new locations, so an auto-reloaded template
+# never serves fragments rendered by its previous version
+_compilations = itertools.count()
+
+
+class FragmentCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        cache_event("fragment", "hit" if value is not None else "miss")
+        return value
+
+    def put(self, key, value):
+        evicted = 0
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            cache_event("fragment", "eviction", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _versions(tables):
+    """Data versions of tables for this request, or None if they can't be read."""
+    try:
+        return request_versions(tables)
+    except pymysql.MySQLError:  # data_versions not migrated yet
+        return None
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        location = f"{parser.name}:{lineno}:{next(_compilations)}"
+        parts, tables = [], nodes.Tuple([], "load")
+        first = True
+        while parser.stream.current.type != "block_end":
+            if not first:
+                parser.stream.expect("comma")
+            first = False
+            if parser.stream.current.test("name:tables") and parser.stream.look().test("assign"):
+                next(parser.stream)
+                next(parser.stream)
+                tables = parser.parse_expression()
+            else:
+                parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render", [nodes.Const(location), nodes.List(parts), tables])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, location, parts, tables, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        versions = _versions(tuple(tables)) if tables else ()
+        if versions is None:
+            return caller()
+        # Fragments embed fingerprinted static URLs, so an asset rebuild retires them too
+        key = (location, tuple(parts), versions, static_assets.version())
+        try:
+            html = cache.get(key)
+        except TypeError:  # unhashable key value, e.g. a dict row
+            return caller()
+        if html is None:
+            html = caller()
+            cache.put(key, html)
+        return html
+
+
+def init_app(app, config=None):
+    settings = {**DEFAULTS, **(config or {})}
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if settings["enabled"]:
+        app.jinja_env.fragment_cache = FragmentCache(settings["max_entries"])
@@ -1,16 +1,25 @@
 """Generate PNG profile picture avatars for every customer in the database."""
+import argparse
 import json
 import os
 import hashlib
-import math
 import random
+from functools import lru_cache
+import numpy as np
 import pymysql
 import pymysql.cursors
 from PIL import Image, ImageDraw, ImageFont
+from image_variants import (
+    AVATAR_WIDTHS, available_formats, inputs_hash, is_current, read_manifest,
+    render_all, save_variants, write_manifest,
+)
 
 AVATAR_DIR = os.path.join(os.path.dirname(__file__), "static", "avatars")
 SIZE = 200
 
+# Bump when the drawing code changes so every avatar is re-rendered
+RENDER_VERSION = 1
+
 # Pleasing background colour palettes (pairs for gradient)
 PALETTE = [
     ((99, 102, 241),  (129, 140, 248)),   # indigo
@@ -31,7 +40,9 @@ def _seed_from_name(first, last):
     return int(hashlib.md5(f"{first}{last}".encode()).hexdigest(), 16)
 
 
+@lru_cache(maxsize=None)
 def _try_load_font(size):
+    """Load (once per process and size) a nice font, falling back to the default."""
     candidates = [
         "/System/Library/Fonts/Helvetica.ttc",
         "/System/Library/Fonts/SFNSDisplay.ttf",
@@ -47,22 +58,24 @@ def _try_load_font(size):
     return ImageFont.load_default()
 
 
-def _draw_gradient_circle(img, color1, color2, size):
-    """Draw a circular gradient background."""
-    draw = ImageDraw.Draw(img)
-    for y in range(size):
-        ratio = y / size
-        r = int(color1[0] + (color2[0] - color1[0]) * ratio)
-        g = int(color1[1] + (color2[1] - color1[1]) * ratio)
-        b = int(color1[2] + (color2[2] - color1[2]) * ratio)
-        draw.line([(0, y), (size, y)], fill=(r, g, b))
-
-    # Apply circular mask
+@lru_cache(maxsize=None)
+def _circle_mask(size):
     mask = Image.new("L", (size, size), 0)
     mask_draw = ImageDraw.Draw(mask)
     mask_draw.ellipse([0, 0, size - 1, size - 1], fill=255)
-    img.putalpha(mask)
-    return draw
+    return mask
+
+
+def _gradient_circle(color1, color2, size):
+    """Vertical gradient built as a NumPy array, cut to a circle."""
+    ratio = np.arange(size, dtype=np.float64)[:, None] / size
+    c1 = np.array(color1, dtype=np.float64)
+    c2 = np.array(color2, dtype=np.float64)
+    rows = (c1 + (c2 - c1) * ratio).astype(np.uint8)
+    pixels = np.ascontiguousarray(np.broadcast_to(rows[:, None, :], (size, size, 3)))
+    img = Image.fromarray(pixels, "RGB").convert("RGBA")
+    img.putalpha(_circle_mask(size))
+    return img
 
 
 def _draw_pattern(draw, seed, color1, size):
@@ -86,15 +99,13 @@ def _draw_pattern(draw, seed, color1, size):
         )
 
 
-def generate_avatar(customer_id, first_name, last_name):
+def generate_avatar(customer_id, first_name, last_name, formats=(), out_dir=AVATAR_DIR):
+    """Render one avatar as PNG plus resized `formats` variants; returns its manifest entry."""
     seed = _seed_from_name(first_name, last_name)
-    rng = random.Random(seed)
     color1, color2 = PALETTE[seed % len(PALETTE)]
 
-    img = Image.new("RGBA", (SIZE, SIZE), (0, 0, 0, 0))
-
     # Gradient background circle
-    _draw_gradient_circle(img, color1, color2, SIZE)
+    img = _gradient_circle(color1, color2, SIZE)
 
     # Overlay for pattern
     overlay = Image.new("RGBA", (SIZE, SIZE), (0, 0, 0, 0))
@@ -103,10 +114,7 @@ def generate_avatar(customer_id, first_name, last_name):
     img = Image.alpha_composite(img, overlay)
 
     # Re-apply circular mask after compositing
-    mask = Image.new("L", (SIZE, SIZE), 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse([0, 0, SIZE - 1, SIZE - 1], fill=255)
-    img.putalpha(mask)
+    img.putalpha(_circle_mask(SIZE))
 
     # Draw initials
     draw = ImageDraw.Draw(img)
@@ -121,12 +129,26 @@ def generate_avatar(customer_id, first_name, last_name):
         anchor="mm",
     )
 
-    out_path = os.path.join(AVATAR_DIR, f"{customer_id}.png")
+    out_path = os.path.join(out_dir, f"{customer_id}.png")
     img.save(out_path, "PNG", optimize=True)
-    return out_path
+    return save_variants(img, out_dir, str(customer_id), AVATAR_WIDTHS, formats)
+
+
+def avatar_hash(first_name, last_name, formats):
+    """Hash of the inputs that determine an avatar's pixels and files."""
+    return inputs_hash(RENDER_VERSION, first_name, last_name, sorted(formats))
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--no-avif", action="store_true", help="only emit WebP variants")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="render processes (1 = serial)")
+    parser.add_argument("--force", action="store_true",
+                        help="re-render even if the inputs have not changed")
+    args = parser.parse_args()
+    formats = available_formats(avif=not args.no_avif)
+
     os.makedirs(AVATAR_DIR, exist_ok=True)
 
     with open(os.path.join(os.path.dirname(__file__), "config.json")) as f:
@@ -148,13 +170,26 @@ def main():
     finally:
         conn.close()
 
-    print(f"Generating {len(customers)} avatars...")
-    for i, c in enumerate(customers, 1):
-        generate_avatar(c["customer_id"], c["first_name"], c["last_name"])
-        if i % 100 == 0:
-            print(f"  {i}/{len(customers)} done")
-
-    print(f"Done! {len(customers)} avatars saved to {AVATAR_DIR}")
+    previous = {} if args.force else read_manifest(AVATAR_DIR)
+    manifest = {}
+    jobs = []
+    for c in customers:
+        key = str(c["customer_id"])
+        digest = avatar_hash(c["first_name"], c["last_name"], formats)
+        if is_current(previous.get(key), digest, AVATAR_DIR):
+            manifest[key] = previous[key]
+        else:
+            jobs.append((c["customer_id"], c["first_name"], c["last_name"], formats))
+
+    print(f"Generating {len(jobs)} of {len(customers)} avatars "
+          f"(PNG + {', '.join(formats) or 'no variants'}, {args.workers} workers)...")
+    for job, entry in render_all(generate_avatar, jobs, args.workers, "avatars"):
+        customer_id, first_name, last_name, _ = job
+        entry["hash"] = avatar_hash(first_name, last_name, formats)
+        manifest[str(customer_id)] = entry
+    write_manifest(AVATAR_DIR, manifest)
+
+    print(f"Done! {len(jobs)} avatars rendered, {len(customers) - len(jobs)} unchanged, in {AVATAR_DIR}")
 
 
 if __name__ == "__main__":
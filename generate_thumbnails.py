@@ -1,14 +1,24 @@
 """Generate PNG thumbnail posters for every film in the database."""
+import argparse
 import json
 import os
 import hashlib
+from functools import lru_cache
+import numpy as np
 import pymysql
 import pymysql.cursors
 from PIL import Image, ImageDraw, ImageFont
+from image_variants import (
+    THUMBNAIL_WIDTHS, available_formats, inputs_hash, is_current, read_manifest,
+    render_all, save_variants, write_manifest,
+)
 
 THUMB_DIR = os.path.join(os.path.dirname(__file__), "static", "thumbnails")
 WIDTH, HEIGHT = 200, 300
 
+# Bump when the drawing code changes so every thumbnail is re-rendered
+RENDER_VERSION = 1
+
 # Category -> colour palette (gradient top, gradient bottom)
 CATEGORY_COLORS = {
     "Action":           ((180, 30, 30),   (80, 10, 10)),
@@ -48,13 +58,14 @@ def _seed_from_title(title):
     return int(hashlib.md5(title.encode()).hexdigest(), 16)
 
 
-def _draw_gradient(draw, top_color, bot_color, width, height):
-    for y in range(height):
-        ratio = y / height
-        r = int(top_color[0] + (bot_color[0] - top_color[0]) * ratio)
-        g = int(top_color[1] + (bot_color[1] - top_color[1]) * ratio)
-        b = int(top_color[2] + (bot_color[2] - top_color[2]) * ratio)
-        draw.line([(0, y), (width, y)], fill=(r, g, b))
+def _gradient(top_color, bot_color, width, height):
+    """Vertical gradient built as a NumPy array rather than one draw.line per row."""
+    ratio = np.arange(height, dtype=np.float64)[:, None] / height
+    top = np.array(top_color, dtype=np.float64)
+    bot = np.array(bot_color, dtype=np.float64)
+    rows = (top + (bot - top) * ratio).astype(np.uint8)
+    pixels = np.ascontiguousarray(np.broadcast_to(rows[:, None, :], (height, width, 3)))
+    return Image.fromarray(pixels, "RGB").convert("RGBA")
 
 
 def _draw_decorative_shapes(draw, seed, top_color, width, height):
@@ -88,8 +99,9 @@ def _draw_decorative_shapes(draw, seed, top_color, width, height):
         draw.line([(x1, y1), (x2, y2)], fill=color, width=lw)
 
 
+@lru_cache(maxsize=None)
 def _try_load_font(size):
-    """Try to load a nice font, fall back to default."""
+    """Try to load a nice font (once per process and size), fall back to default."""
     candidates = [
         "/System/Library/Fonts/Helvetica.ttc",
         "/System/Library/Fonts/SFNSDisplay.ttf",
@@ -105,15 +117,13 @@ def _try_load_font(size):
     return ImageFont.load_default()
 
 
-def generate_thumbnail(film_id, title, rating, release_year, category):
+def generate_thumbnail(film_id, title, rating, release_year, category, formats=(), out_dir=THUMB_DIR):
+    """Render one poster as PNG plus resized `formats` variants; returns its manifest entry."""
     top_c, bot_c = CATEGORY_COLORS.get(category, DEFAULT_COLORS)
     seed = _seed_from_title(title)
 
-    img = Image.new("RGBA", (WIDTH, HEIGHT), (0, 0, 0, 255))
-    draw = ImageDraw.Draw(img)
-
     # Background gradient
-    _draw_gradient(draw, top_c, bot_c, WIDTH, HEIGHT)
+    img = _gradient(top_c, bot_c, WIDTH, HEIGHT)
 
     # Decorative shapes
     overlay = Image.new("RGBA", (WIDTH, HEIGHT), (0, 0, 0, 0))
@@ -173,12 +183,26 @@ def generate_thumbnail(film_id, title, rating, release_year, category):
 
     # Save as RGB PNG
     final = img.convert("RGB")
-    out_path = os.path.join(THUMB_DIR, f"{film_id}.png")
+    out_path = os.path.join(out_dir, f"{film_id}.png")
     final.save(out_path, "PNG", optimize=True)
-    return out_path
+    return save_variants(final, out_dir, str(film_id), THUMBNAIL_WIDTHS, formats)
+
+
+def thumbnail_hash(title, rating, release_year, category, formats):
+    """Hash of the inputs that determine a thumbnail's pixels and files."""
+    return inputs_hash(RENDER_VERSION, title, rating, release_year, category, sorted(formats))
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--no-avif", action="store_true", help="only emit WebP variants")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="render processes (1 = serial)")
+    parser.add_argument("--force", action="store_true",
+                        help="re-render even if the inputs have not changed")
+    args = parser.parse_args()
+    formats = available_formats(avif=not args.no_avif)
+
     os.makedirs(THUMB_DIR, exist_ok=True)
 
     with open(os.path.join(os.path.dirname(__file__), "config.json")) as f:
@@ -202,16 +226,26 @@ def main():
     finally:
         conn.close()
 
-    print(f"Generating {len(films)} thumbnails...")
-    for i, film in enumerate(films, 1):
-        generate_thumbnail(
-            film["film_id"], film["title"], film["rating"],
-            film["release_year"], film.get("category", ""),
-        )
-        if i % 100 == 0:
-            print(f"  {i}/{len(films)} done")
+    previous = {} if args.force else read_manifest(THUMB_DIR)
+    manifest = {}
+    jobs = []
+    for film in films:
+        key = str(film["film_id"])
+        inputs = (film["title"], film["rating"], film["release_year"], film.get("category", ""))
+        if is_current(previous.get(key), thumbnail_hash(*inputs, formats), THUMB_DIR):
+            manifest[key] = previous[key]
+        else:
+            jobs.append((film["film_id"], *inputs, formats))
+
+    print(f"Generating {len(jobs)} of {len(films)} thumbnails "
+          f"(PNG + {', '.join(formats) or 'no variants'}, {args.workers} workers)...")
+    for job, entry in render_all(generate_thumbnail, jobs, args.workers, "thumbnails"):
+        film_id, title, rating, release_year, category, _ = job
+        entry["hash"] = thumbnail_hash(title, rating, release_year, category, formats)
+        manifest[str(film_id)] = entry
+    write_manifest(THUMB_DIR, manifest)
 
-    print(f"Done! {len(films)} thumbnails saved to {THUMB_DIR}")
+    print(f"Done! {len(jobs)} thumbnails rendered, {len(films) - len(jobs)} unchanged, in {THUMB_DIR}")
 
 
 if __name__ == "__main__":
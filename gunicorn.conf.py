@@ -0,0 +1,62 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+Reads "server" from config.json; environment variables override it (WEB_CONCURRENCY,
+GUNICORN_THREADS, GUNICORN_BIND). The app is preloaded in the master, so workers fork
+warm and share its memory, then start their own bcrypt pool; workers are recycled
+after max_requests (± jitter).
+
+    kill -HUP <master pid>     # graceful restart of all workers (same preloaded code)
+    kill -USR2 <master pid>    # start a new master with new code, then -TERM the old one
+"""
+import gc
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+with open("config.json") as f:
+    _server = json.load(f).get("server", {})
+    f.seek(0)
+    _metrics = json.load(f).get("metrics", {})
+
+bind = os.environ.get("GUNICORN_BIND", _server.get("bind", "0.0.0.0:8080"))
+workers = int(os.environ.get("WEB_CONCURRENCY", _server.get("workers", multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.environ.get("GUNICORN_THREADS", _server.get("threads", 4)))
+worker_class = "gthread" if threads > 1 else "sync"
+max_requests = int(_server.get("max_requests", 5000))
+max_requests_jitter = int(_server.get("max_requests_jitter", max_requests // 10))
+timeout = int(_server.get("timeout", 60))
+graceful_timeout = int(_server.get("graceful_timeout", 30))
+keepalive = int(_server.get("keepalive", 5))
+preload_app = True
+accesslog = _server.get("accesslog", "-")
+
+# Every worker's /metrics must see all workers: default to a fresh shared directory
+if not (_metrics.get("multiprocess_dir") or os.environ.get("METRICS_MULTIPROC_DIR")):
+    os.environ["METRICS_MULTIPROC_DIR"] = os.path.join(tempfile.gettempdir(), f"blockbusters-metrics-{os.getpid()}")
+_metrics_dir = _metrics.get("multiprocess_dir") or os.environ["METRICS_MULTIPROC_DIR"]
+
+
+def on_starting(server):
+    # Once per master start: this file is re-read on every HUP, and removing the live
+    # workers' files (and the archive) then would make every counter go backwards.
+    # A master started by USR2 (GUNICORN_PID set) carries on from the old one's files.
+    if "GUNICORN_PID" in os.environ:
+        return
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)  # the preloaded app created it before this hook
+
+
+def pre_fork(server, worker):
+    # Keep the preloaded heap out of the collector so it stays shared copy-on-write
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import metrics
+    metrics.reset()
+    # Each worker needs its own bcrypt pool (spawned processes can't be inherited across
+    # the fork); start it now so the worker's first login doesn't pay for it
+    import passwords
+    passwords.warm()
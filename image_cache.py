@@ -0,0 +1,136 @@
+"""Size-bounded on-disk LRU cache for images rendered on demand."""
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from metrics import cache_event
+
+try:
+    import fcntl
+except ImportError:  # Windows: per-process locking only
+    fcntl = None
+
+
+class DiskCache:
+    """Files keyed by name in one directory, evicted least-recently-used past max_bytes.
+
+    Recency is the file mtime, bumped on every hit, so it survives restarts and is
+    shared by every worker process using the same directory.
+    """
+
+    def __init__(self, directory, max_bytes, name="disk"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self._size = None
+        self._size_lock = threading.Lock()
+        self._key_locks = weakref.WeakValueDictionary()
+        self._key_locks_guard = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Path of a cached file (marking it recently used), or None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get_or_create(self, key, render):
+        """Return the cached path for key, calling render(tmp_dir) -> file path on a miss.
+
+        Concurrent misses for the same key (threads or worker processes) render once;
+        the others wait for the lock and then find the finished file.
+        """
+        path = self.get(key)
+        if path:
+            cache_event(self.name, "hit")
+            return path
+        with self._key_lock(key), self._file_lock(key):
+            path = self.get(key)
+            if path:
+                cache_event(self.name, "hit")
+                return path
+            cache_event(self.name, "miss")
+            tmp_dir = tempfile.mkdtemp(prefix=".render-", dir=self.directory)
+            try:
+                rendered = render(tmp_dir)
+                size = os.path.getsize(rendered)
+                os.replace(rendered, self.path(key))
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._add(key, size)
+        return self.path(key)
+
+    def _key_lock(self, key):
+        with self._key_locks_guard:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._key_locks[key] = lock
+        return lock
+
+    def _file_lock(self, key):
+        return _FileLock(os.path.join(self.directory, f".{key}.lock"))
+
+    def _entries(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                yield entry
+
+    def _add(self, key, size):
+        with self._size_lock:
+            if self._size is None:
+                self._size = sum(e.stat().st_size for e in self._entries())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict(keep=key)
+
+    def _evict(self, keep):
+        """Delete least-recently-used files (never `keep`) until the cache is at 90% of its bound."""
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if total <= target:
+                break
+            if entry.name == keep:
+                continue
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+                cache_event(self.name, "eviction")
+            except OSError:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, f".{entry.name}.lock"))
+            except OSError:
+                pass
+        self._size = total
+
+
+class _FileLock:
+    """Exclusive flock on a sidecar file so worker processes render a key only once."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,185 @@
+"""Responsive image variants: resized WebP/AVIF copies plus a manifest per image directory."""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, features
+from markupsafe import Markup, escape
+from metrics import cache_event
+
+try:
+    import pillow_avif  # noqa: F401 -- registers the AVIF plugin on Pillow < 11.2
+except ImportError:
+    pass
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+MANIFEST_NAME = "manifest.json"
+
+# Display widths (CSS px, plus 2x for high-DPI screens) actually used by the templates
+AVATAR_WIDTHS = [36, 56, 72, 100, 112, 200]
+THUMBNAIL_WIDTHS = [100, 150, 200]
+
+SAVE_OPTIONS = {
+    "webp": {"quality": 80, "method": 6},
+    "avif": {"quality": 55},
+}
+
+# Preferred order inside <picture>: the browser takes the first <source> it supports
+FORMAT_ORDER = ["avif", "webp"]
+
+_manifest_cache = {}
+
+
+def available_formats(avif=True):
+    """Modern formats this Pillow build can encode."""
+    Image.init()
+    formats = []
+    if features.check("webp"):
+        formats.append("webp")
+    if avif and "AVIF" in Image.SAVE:
+        formats.append("avif")
+    return formats
+
+
+def save_variants(img, out_dir, stem, widths, formats):
+    """Write `stem-<w>.<fmt>` for every width no larger than the source image.
+
+    Returns the manifest entry for this image, e.g.
+    {"png": "1.png", "width": 200, "height": 300, "webp": {"100": "1-100.webp", ...}}.
+    """
+    entry = {"png": f"{stem}.png", "width": img.width, "height": img.height}
+    for fmt in formats:
+        entry[fmt] = {}
+        for w in widths:
+            if w > img.width:
+                continue
+            if w == img.width:
+                resized = img
+            else:
+                resized = img.resize((w, round(img.height * w / img.width)), Image.LANCZOS)
+            name = f"{stem}-{w}.{fmt}"
+            resized.save(os.path.join(out_dir, name), fmt.upper(), **SAVE_OPTIONS[fmt])
+            entry[fmt][str(w)] = name
+    return entry
+
+
+def write_manifest(out_dir, images):
+    """Write the manifest mapping image id -> sizes/formats for one directory."""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"images": images}, f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp, path)
+    return path
+
+
+def read_manifest(out_dir):
+    """Raw manifest images dict for a directory (empty if missing or unreadable)."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+            return json.load(f).get("images", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def inputs_hash(*values):
+    """Content hash of everything that affects how an image is rendered."""
+    return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()[:16]
+
+
+def is_current(entry, digest, out_dir):
+    """True when the manifest entry was rendered from the same inputs and its files exist."""
+    if not entry or entry.get("hash") != digest:
+        return False
+    # The PNG plus every WebP/AVIF variant the entry lists, since picture() links them all
+    names = [entry["png"]] + [name for value in entry.values() if isinstance(value, dict) for name in value.values()]
+    return all(os.path.exists(os.path.join(out_dir, name)) for name in names)
+
+
+def render_all(func, jobs, workers=1, label="images"):
+    """Run func(*job) for every job, in a process pool when workers > 1.
+
+    Yields (job, result) in input order and prints progress every 100 images.
+    """
+    total = len(jobs)
+    if workers > 1 and total > 1:
+        chunksize = max(1, min(32, total // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_call, [(func, job) for job in jobs], chunksize=chunksize)
+            for i, (job, result) in enumerate(zip(jobs, results), 1):
+                if i % 100 == 0:
+                    print(f"  {i}/{total} {label} done")
+                yield job, result
+    else:
+        for i, job in enumerate(jobs, 1):
+            yield job, func(*job)
+            if i % 100 == 0:
+                print(f"  {i}/{total} {label} done")
+
+
+def _call(func_and_job):
+    func, job = func_and_job
+    return func(*job)
+
+
+def load_manifest(kind):
+    """Manifest for static/<kind>/, reloaded only when the file changes on disk."""
+    path = os.path.join(STATIC_DIR, kind, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _manifest_cache.get(kind)
+    if cached and cached[0] == mtime:
+        cache_event("manifest", "hit")
+        return cached[1]
+    cache_event("manifest", "miss")
+    try:
+        with open(path) as f:
+            images = json.load(f).get("images", {})
+    except (OSError, ValueError):
+        images = {}
+    _manifest_cache[kind] = (mtime, images)
+    return images
+
+
+def picture(kind, image_id, sizes, alt="", **attrs):
+    """Render a <picture> with AVIF/WebP srcsets and the PNG as fallback <img>.
+
+    `sizes` is the rendered width in CSS px or a full `sizes` attribute string.
+    Extra keyword arguments become <img> attributes (`class_` -> `class`).
+    Images missing from static/ point at the on-demand media route instead.
+    """
+    from flask import url_for
+
+    if isinstance(sizes, int):
+        sizes = f"{sizes}px"
+    entry = load_manifest(kind).get(str(image_id))
+    png = entry["png"] if entry else f"{image_id}.png"
+
+    parts = ["<picture>"]
+    if entry:
+        for fmt in FORMAT_ORDER:
+            variants = entry.get(fmt)
+            if not variants:
+                continue
+            srcset = ", ".join(
+                f"{url_for('static', filename=f'{kind}/{name}')} {w}w"
+                for w, name in sorted(variants.items(), key=lambda kv: int(kv[0]))
+            )
+            parts.append(
+                f'<source type="image/{fmt}" srcset="{escape(srcset)}" sizes="{escape(sizes)}">'
+            )
+
+    img_attrs = "".join(
+        f' {escape(key.rstrip("_").replace("_", "-"))}="{escape(value)}"'
+        for key, value in attrs.items()
+    )
+    if entry or os.path.isfile(os.path.join(STATIC_DIR, kind, png)):
+        src = url_for("static", filename=f"{kind}/{png}")
+    else:
+        # Not generated yet (e.g. a customer added since the last batch run): render on demand
+        src = url_for(f"media.{kind}", image_id=image_id)
+    parts.append(f'<img src="{escape(src)}" alt="{escape(alt)}"{img_attrs}>')
+    parts.append("</picture>")
+    return Markup("".join(parts))
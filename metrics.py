@@ -0,0 +1,355 @@
+"""In-process metrics exposed at /metrics in the Prometheus text format.
+
+Counters, gauges and histograms live in plain dicts keyed by label values, so
+recording one costs a lock and a dict update. With several worker processes, set
+"metrics": {"multiprocess_dir": "..."} in config.json (one directory shared by the
+workers, emptied before the server starts): each worker writes its values there at
+every flush_seconds, and whichever worker serves /metrics adds them all up.
+Gauges of workers that have exited are dropped; their counters and histograms are
+folded into an archive file so totals never go backwards.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process archive lock
+    fcntl = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ARCHIVE = "metrics-archive.json"
+
+_lock = threading.Lock()
+_registry = {}
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+        _registry[name] = self
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with _lock:
+            self.values[labels] = value
+
+
+class Histogram(_Metric):
+    """Per label set: a count per bucket (plus +Inf), then the sum and the count."""
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            row = self.values.get(labels)
+            if row is None:
+                row = self.values[labels] = [0] * (len(self.buckets) + 3)
+            row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by endpoint and status.",
+                            ("endpoint", "method", "status"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled right now.")
+DB_LATENCY = Histogram("db_query_duration_seconds", "Database statement latency by db.py helper.", ("operation",))
+DB_CONNECTIONS = Counter("db_connections_opened_total", "Database connections opened.")
+TEMPLATE_LATENCY = Histogram("template_render_seconds", "Jinja template render time.", ("template",))
+CACHE_EVENTS = Counter("cache_events_total", "Cache hits, misses and evictions reported by the app's caches.",
+                       ("cache", "event"))
+
+
+def cache_event(cache, event, amount=1):
+    """Report a cache "hit", "miss" or "eviction"; any cache in the app can call this."""
+    CACHE_EVENTS.inc(cache, event, amount=amount)
+
+
+def reset():
+    """Zero every metric, e.g. in a freshly forked worker so the master's values aren't counted twice."""
+    with _lock:
+        for metric in _registry.values():
+            metric.values.clear()
+
+
+# --- Exposition --------------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot=None):
+    """Prometheus text format for a snapshot (default: this process)."""
+    snapshot = snapshot if snapshot is not None else _snapshot()
+    lines = []
+    for name, metric in _registry.items():
+        values = snapshot.get(name, {})
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for labels, value in sorted(values.items()):
+            if metric.kind != "histogram":
+                lines.append(f"{name}{_labels(metric.labels, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ("+Inf",), value):
+                cumulative += count
+                le = 'le="%s"' % (bound if bound == "+Inf" else repr(float(bound)))
+                lines.append(f"{name}_bucket{_labels(metric.labels, labels, [le])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric.labels, labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(metric.labels, labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def _snapshot():
+    with _lock:
+        return {name: {k: list(v) if isinstance(v, list) else v for k, v in m.values.items()}
+                for name, m in _registry.items()}
+
+
+# --- Multiple worker processes -------------------------------------------------------
+
+_directory = None
+_flush_seconds = 1.0
+
+
+def configure(directory=None, flush_seconds=1.0):
+    global _directory, _flush_seconds
+    _directory, _flush_seconds = directory, flush_seconds
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(flush)
+
+
+def _encode(snapshot):
+    return {name: [[list(k), v] for k, v in values.items()] for name, values in snapshot.items()}
+
+
+def _decode(data):
+    return {name: {tuple(k): v for k, v in rows} for name, rows in data.items()}
+
+
+def _write_json(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def flush():
+    """Write this process's values to the shared directory."""
+    if _directory:
+        _write_json(os.path.join(_directory, f"metrics-{os.getpid()}.json"),
+                    {"pid": os.getpid(), "metrics": _encode(_snapshot())})
+
+
+_flusher_pid = None
+
+
+def ensure_flusher():
+    """Flush every flush_seconds from a background thread (started again in each forked worker)."""
+    global _flusher_pid
+    if _directory and _flusher_pid != os.getpid():
+        _flusher_pid = os.getpid()
+
+        def loop():
+            while True:
+                time.sleep(_flush_seconds)
+                flush()
+
+        threading.Thread(target=loop, daemon=True, name="metrics-flush").start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(total, snapshot, gauges=True):
+    for name, values in snapshot.items():
+        metric = _registry.get(name)
+        if metric is None or (metric.kind == "gauge" and not gauges):
+            continue
+        into = total.setdefault(name, {})
+        for labels, value in values.items():
+            if metric.kind == "histogram":
+                row = into.setdefault(labels, [0] * len(value))
+                for i, v in enumerate(value):
+                    row[i] += v
+            else:
+                into[labels] = into.get(labels, 0) + value
+
+
+def collect():
+    """All workers' values summed (just this process's without a shared directory)."""
+    if not _directory:
+        return _snapshot()
+    flush()
+    with _ArchiveLock(os.path.join(_directory, ".archive.lock")):
+        archive_path = os.path.join(_directory, ARCHIVE)
+        archived = _decode(_read_json(archive_path) or {})
+        total, dead = {}, []
+        for entry in os.scandir(_directory):
+            if not (entry.name.startswith("metrics-") and entry.name.endswith(".json")) or entry.name == ARCHIVE:
+                continue
+            data = _read_json(entry.path)
+            if not data:
+                continue
+            if _alive(data["pid"]):
+                _merge(total, _decode(data["metrics"]))
+            else:
+                dead.append((entry.path, _decode(data["metrics"])))
+        if dead:
+            for _, snapshot in dead:
+                _merge(archived, snapshot, gauges=False)
+            _write_json(archive_path, _encode(archived))
+            for path, _ in dead:
+                os.remove(path)
+        _merge(total, archived, gauges=False)
+    return total
+
+
+class _ArchiveLock:
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+# --- Flask wiring ------------------------------------------------------------------
+
+def init_app(app, config=None):
+    """Time every request and template, and serve /metrics."""
+    from flask import Response, abort, g, request, template_rendered, before_render_template
+
+    config = config or {}
+    configure(config.get("multiprocess_dir") or os.environ.get("METRICS_MULTIPROC_DIR"),
+              float(config.get("flush_seconds", 1.0)))
+    token = config.get("token")
+    render_starts = threading.local()
+
+    # Scrapes are timed but not counted in flight: a worker flushes its values while
+    # serving /metrics, and would otherwise always report itself busy
+    def counts_in_flight():
+        return request.endpoint != "metrics"
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        if counts_in_flight():
+            IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, request.endpoint or "unmatched",
+                                    request.method, str(response.status_code))
+            if counts_in_flight():
+                IN_FLIGHT.dec()
+        ensure_flusher()
+        return response
+
+    @app.teardown_request
+    def record_failure(exc):
+        # after_request is skipped when a view raises
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, request.endpoint or "unmatched",
+                                    request.method, "500")
+            if counts_in_flight():
+                IN_FLIGHT.dec()
+
+    def before_render(sender, template, context, **extra):
+        render_starts.__dict__.setdefault("stack", []).append(time.perf_counter())
+
+    def after_render(sender, template, context, **extra):
+        stack = getattr(render_starts, "stack", None)
+        if stack:
+            TEMPLATE_LATENCY.observe(time.perf_counter() - stack.pop(), template.name or "string")
+
+    before_render_template.connect(before_render, app, weak=False)
+    template_rendered.connect(after_render, app, weak=False)
+
+    import db
+    db.statement_hooks.append(lambda operation, seconds: DB_LATENCY.observe(seconds, operation))
+    db.connection_hooks.append(DB_CONNECTIONS.inc)
+
+    def local_scrape():
+        # Loopback and not forwarded: a proxy on the same host would also appear as loopback
+        return request.remote_addr in ("127.0.0.1", "::1") and "X-Forwarded-For" not in request.headers
+
+    def signed_in_admin():
+        from routes.auth import get_current_user
+        user = get_current_user()
+        return bool(user) and user["role"] == "admin"
+
+    @app.route("/metrics")
+    def metrics():
+        # With a token, scrapers must send it; without one, only local scrapes and admins
+        if token:
+            if request.headers.get("Authorization") != f"Bearer {token}":
+                abort(401)
+        elif not (local_scrape() or signed_in_admin()):
+            abort(403)
+        return Response(render(collect()), content_type=CONTENT_TYPE)
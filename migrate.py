@@ -0,0 +1,126 @@
+"""Versioned schema migrations.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py status     # show applied and pending migrations
+
+Migrations are the numbered files in migrations/ (0001_name.py, ...), each with an
+up(cur) function, applied in order and recorded in the schema_version table. MySQL
+commits DDL immediately, so every migration is written to be safe to re-run if it
+fails halfway. A named lock stops two deploys from migrating at the same time.
+create_app only compares schema_version with the newest file here.
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import re
+import pymysql
+from db import get_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+FILE_RE = re.compile(r"^(\d{4})_(\w+)\.py$")
+LOCK_NAME = "blockbusters_migrate"
+
+log = logging.getLogger(__name__)
+
+
+def available():
+    """[(version, name, path)] for every migration file, oldest first."""
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        m = FILE_RE.match(filename)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(found)
+
+
+def latest_version():
+    migrations = available()
+    return migrations[-1][0] if migrations else 0
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+    cur.execute("SELECT version, name, applied_at FROM schema_version ORDER BY version")
+    return {r["version"]: r for r in cur.fetchall()}
+
+
+def _load(path):
+    spec = importlib.util.spec_from_file_location(f"migrations.{os.path.basename(path)[:-3]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def migrate():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT GET_LOCK(%s, 60) AS got", (LOCK_NAME,))
+            if not cur.fetchone()["got"]:
+                raise SystemExit("Another migration is running.")
+            try:
+                done = applied_versions(cur)
+                pending = [m for m in available() if m[0] not in done]
+                if not pending:
+                    print(f"Schema is up to date (version {max(done, default=0)}).")
+                for version, name, path in pending:
+                    print(f"Applying {version:04d}_{name}...")
+                    _load(path).up(cur)
+                    cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+                    conn.commit()
+            finally:
+                cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    finally:
+        conn.close()
+
+
+def status():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            done = applied_versions(cur)
+    finally:
+        conn.close()
+    for version, name, _ in available():
+        row = done.get(version)
+        print(f"{version:04d}_{name:<30} {'applied ' + str(row['applied_at']) if row else 'pending'}")
+
+
+def check_version():
+    """Warn when the database is behind the migrations shipped with this code (one cheap query)."""
+    try:
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT MAX(version) AS version FROM schema_version")
+                current = cur.fetchone()["version"] or 0
+        finally:
+            conn.close()
+    except pymysql.MySQLError as e:  # table missing or database unreachable: report, don't block startup
+        log.warning("Could not read schema_version (%s); run `python migrate.py`.", e)
+        return None
+    if current < latest_version():
+        log.warning("Database schema is at version %s, code expects %s; run `python migrate.py`.",
+                    current, latest_version())
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up")
+    args = parser.parse_args()
+    if args.command == "status":
+        status()
+    else:
+        migrate()
+
+
+if __name__ == "__main__":
+    main()
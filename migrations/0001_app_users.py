@@ -0,0 +1,17 @@
+"""Application logins for admins, staff and customers."""
+
+
+def up(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS app_users (
+            user_id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(100) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            role ENUM('admin','staff','customer') NOT NULL DEFAULT 'customer',
+            staff_id SMALLINT UNSIGNED NULL,
+            customer_id SMALLINT UNSIGNED NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (staff_id) REFERENCES staff(staff_id) ON DELETE SET NULL,
+            FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON DELETE SET NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
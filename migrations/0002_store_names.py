@@ -0,0 +1,29 @@
+"""Display names for stores, assigned in store_id order from setup_db.STORE_NAMES."""
+from setup_db import STORE_NAMES
+
+
+def up(cur):
+    cur.execute("""
+        SELECT COUNT(*) AS cnt FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'store' AND COLUMN_NAME = 'name'
+    """)
+    if not cur.fetchone()["cnt"]:
+        cur.execute("ALTER TABLE store ADD COLUMN name VARCHAR(100) NULL")
+
+    # One UPDATE: number the stores, join the numbered names. The rank is a self-join
+    # count rather than ROW_NUMBER() so this runs on MySQL 5.7; the GROUP BY also makes
+    # MySQL materialise the derived table, as it must to update store from it
+    names = " UNION ALL ".join(["SELECT %s AS n, %s AS name"] * len(STORE_NAMES))
+    args = [v for i, name in enumerate(STORE_NAMES, 1) for v in (i, name)]
+    cur.execute(
+        f"""UPDATE store s
+            JOIN (SELECT a.store_id, COUNT(*) AS n
+                  FROM store a JOIN store b ON b.store_id <= a.store_id
+                  GROUP BY a.store_id) ranked
+              ON ranked.store_id = s.store_id
+            JOIN ({names}) names ON names.n = ranked.n
+            SET s.name = names.name
+            WHERE s.name IS NULL OR s.name = ''""",
+        args,
+    )
+    print(f"  named {cur.rowcount} stores")
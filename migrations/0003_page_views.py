@@ -0,0 +1,11 @@
+"""Page view counter shown in the footer."""
+
+
+def up(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS page_views (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            view_count BIGINT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB
+    """)
+    cur.execute("INSERT IGNORE INTO page_views (id, view_count) VALUES (1, 0)")
@@ -0,0 +1,25 @@
+"""Default admin login plus one login per staff member (username = email prefix, password Staff@1234)."""
+import hashlib
+from db import load_config
+
+
+def up(cur):
+    cfg = load_config()
+    admin_user = cfg.get("admin_username", "admin")
+    admin_pass = cfg.get("admin_password", "Admin@1234")
+    cur.execute(
+        "INSERT IGNORE INTO app_users (username, password_hash, role) VALUES (%s, %s, 'admin')",
+        (admin_user, hashlib.sha256(admin_pass.encode()).hexdigest()),
+    )
+    print(f"  admin account {admin_user}: {'created' if cur.rowcount else 'already exists'}")
+
+    # All staff without a login in one INSERT ... SELECT
+    cur.execute(
+        """INSERT IGNORE INTO app_users (username, password_hash, role, staff_id)
+           SELECT LOWER(SUBSTRING_INDEX(s.email, '@', 1)), %s, 'staff', s.staff_id
+           FROM staff s
+           LEFT JOIN app_users u ON u.staff_id = s.staff_id
+           WHERE u.user_id IS NULL AND s.email IS NOT NULL""",
+        (hashlib.sha256("Staff@1234".encode()).hexdigest(),),
+    )
+    print(f"  created {cur.rowcount} staff accounts (password: Staff@1234)")
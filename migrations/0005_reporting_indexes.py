@@ -0,0 +1,18 @@
+"""Indexes for the dashboard's open-rental counts and the date-bounded payment queries."""
+
+INDEXES = [
+    ("rental", "idx_rental_returned_date", "returned_date"),
+    ("payment", "idx_payment_payment_date", "payment_date"),
+]
+
+
+def up(cur):
+    for table, name, columns in INDEXES:
+        cur.execute(
+            """SELECT COUNT(*) AS cnt FROM information_schema.STATISTICS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s""",
+            (table, name),
+        )
+        if not cur.fetchone()["cnt"]:
+            cur.execute(f"ALTER TABLE {table} ADD INDEX {name} ({columns})")
+            print(f"  added {table}.{name}")
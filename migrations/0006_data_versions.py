@@ -0,0 +1,10 @@
+"""Per-table data version counters, bumped by db.execute(), behind the conditional-GET ETags."""
+
+
+def up(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name VARCHAR(64) PRIMARY KEY,
+            version BIGINT UNSIGNED NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB
+    """)
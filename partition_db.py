@@ -0,0 +1,226 @@
+"""Optional monthly RANGE partitioning and archival for the rental and payment tables.
+
+    python partition_db.py migrate                      # one-off: partition by month
+    python partition_db.py roll                         # add upcoming months (run monthly from cron)
+    python partition_db.py roll --archive-before 2020   # also move years < 2020 to *_archive
+    python partition_db.py check                        # EXPLAIN the date-bounded app queries
+    python partition_db.py synthesize --years 5         # test data: copy history forward N years
+
+MySQL does not allow foreign keys on (or pointing at) partitioned tables, and every
+unique key must contain the partitioning column, so `migrate` drops the foreign keys
+touching rental/payment and widens their primary keys to (id, date). Run it on a
+copy of the database first.
+"""
+import argparse
+from datetime import date
+from db import bump_versions, get_connection
+
+# table -> (primary key column, partitioning date column)
+PARTITIONED = {
+    "rental": ("rental_id", "rental_date"),
+    "payment": ("payment_id", "payment_date"),
+}
+FUTURE_MONTHS = 3
+
+
+def _month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d):
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def _months(first, last):
+    """First day of every month from first to last inclusive."""
+    d = _month_start(first)
+    while d <= last:
+        yield d
+        d = _next_month(d)
+
+
+def _partition_sql(month):
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_next_month(month):%Y-%m-%d}')"
+
+
+def _horizon():
+    d = _month_start(date.today())
+    for _ in range(FUTURE_MONTHS):
+        d = _next_month(d)
+    return d
+
+
+def _partitions(cur, table):
+    cur.execute(
+        """SELECT PARTITION_NAME AS name
+           FROM information_schema.PARTITIONS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+           ORDER BY PARTITION_ORDINAL_POSITION""",
+        (table,),
+    )
+    return [r["name"] for r in cur.fetchall()]
+
+
+def migrate(cur):
+    cur.execute(
+        """SELECT TABLE_NAME AS tbl, CONSTRAINT_NAME AS name
+           FROM information_schema.REFERENTIAL_CONSTRAINTS
+           WHERE CONSTRAINT_SCHEMA = DATABASE()
+             AND (TABLE_NAME IN ('rental', 'payment') OR REFERENCED_TABLE_NAME IN ('rental', 'payment'))"""
+    )
+    for fk in cur.fetchall():
+        cur.execute(f"ALTER TABLE `{fk['tbl']}` DROP FOREIGN KEY `{fk['name']}`")
+        print(f"Dropped foreign key {fk['tbl']}.{fk['name']}")
+
+    for table, (pk, col) in PARTITIONED.items():
+        if _partitions(cur, table):
+            print(f"{table} is already partitioned.")
+            continue
+        cur.execute(f"SELECT MIN({col}) AS first FROM {table}")
+        first = cur.fetchone()["first"] or date.today()
+        months = list(_months(first.date() if hasattr(first, "date") else first, _horizon()))
+        parts = ",\n".join([_partition_sql(m) for m in months] + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"])
+        cur.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY ({pk}, {col})")
+        cur.execute(f"ALTER TABLE {table} PARTITION BY RANGE COLUMNS({col}) (\n{parts}\n)")
+        print(f"Partitioned {table} into {len(months)} monthly partitions.")
+
+
+def roll(cur, archive_before=None):
+    for table in PARTITIONED:
+        existing = set(_partitions(cur, table))
+        if not existing:
+            print(f"{table} is not partitioned; run `migrate` first.")
+            continue
+        missing = [m for m in _months(date.today(), _horizon()) if f"p{m:%Y%m}" not in existing]
+        if missing:
+            parts = ",\n".join([_partition_sql(m) for m in missing] + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"])
+            cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO (\n{parts}\n)")
+            print(f"Added {len(missing)} partitions to {table}.")
+
+    if archive_before:
+        # Payments first so no archived payment is left pointing at a live rental's month
+        for table in ("payment", "rental"):
+            _archive(cur, table, archive_before)
+
+
+def _archive(cur, table, before_year):
+    archive = f"{table}_archive"
+    cur.execute("SHOW TABLES LIKE %s", (archive,))
+    if not cur.fetchone():
+        cur.execute(f"CREATE TABLE {archive} LIKE {table}")
+        cur.execute(f"ALTER TABLE {archive} REMOVE PARTITIONING")
+        print(f"Created {archive}.")
+
+    for name in _partitions(cur, table):
+        if name == "pmax" or int(name[1:5]) >= before_year:
+            continue
+        if table == "rental":
+            cur.execute(f"SELECT COUNT(*) AS cnt FROM rental PARTITION ({name}) WHERE returned_date IS NULL")
+            open_rentals = cur.fetchone()["cnt"]
+            if open_rentals:
+                print(f"Skipping rental {name}: {open_rentals} rentals not yet returned.")
+                continue
+        cur.execute(f"INSERT INTO {archive} SELECT * FROM {table} PARTITION ({name})")
+        moved = cur.rowcount
+        cur.connection.commit()
+        cur.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+        print(f"Archived {table} {name}: {moved} rows.")
+
+
+CHECK_QUERIES = [
+    ("today's rentals",
+     "SELECT COUNT(*) FROM rental WHERE rental_date >= CURDATE() AND rental_date < CURDATE() + INTERVAL 1 DAY"),
+    ("payments, last month",
+     "SELECT COUNT(*), SUM(amount) FROM payment "
+     "WHERE payment_date >= CURDATE() - INTERVAL 1 MONTH AND payment_date < CURDATE() + INTERVAL 1 DAY"),
+    ("revenue trend, 1 year",
+     "SELECT DATE_FORMAT(payment_date, '%Y-%m') AS label, SUM(amount) FROM payment "
+     "WHERE payment_date >= NOW() - INTERVAL 1 YEAR GROUP BY label"),
+]
+
+
+def check(cur):
+    for label, sql in CHECK_QUERIES:
+        cur.execute("EXPLAIN " + sql)
+        for row in cur.fetchall():
+            print(f"{label:<24} {row['table']:<10} partitions={row.get('partitions')} rows={row['rows']}")
+
+
+def insert_triggers(cur, tables=("rental", "payment")):
+    """Names of INSERT triggers on tables (Sakila's reset rental_date/payment_date to NOW())."""
+    cur.execute(
+        """SELECT TRIGGER_NAME AS name FROM information_schema.TRIGGERS
+           WHERE TRIGGER_SCHEMA = DATABASE() AND EVENT_MANIPULATION = 'INSERT'
+             AND EVENT_OBJECT_TABLE IN ({})""".format(", ".join(["%s"] * len(tables))),
+        tuple(tables),
+    )
+    return [r["name"] for r in cur.fetchall()]
+
+
+def synthesize(cur, years):
+    """Copy the existing rental/payment history forward 1..years years (skipping the future)."""
+    triggers = insert_triggers(cur)
+    if triggers:
+        print(f"INSERT triggers {', '.join(triggers)} would overwrite the copied dates; "
+              "drop them on the test database first.")
+        return
+
+    cur.execute("SELECT MIN(rental_date) AS first, MAX(rental_date) AS last FROM rental")
+    span = cur.fetchone()
+    first, last = span["first"], span["last"]
+    for k in range(1, years + 1):
+        cur.execute(
+            """INSERT INTO rental (rental_date, inventory_id, customer_id, returned_date, staff_id)
+               SELECT rental_date + INTERVAL %s YEAR, inventory_id, customer_id,
+                      returned_date + INTERVAL %s YEAR, staff_id
+               FROM rental
+               WHERE rental_date BETWEEN %s AND %s AND rental_date + INTERVAL %s YEAR < NOW()""",
+            (k, k, first, last, k),
+        )
+        rentals = cur.rowcount
+        cur.execute(
+            """INSERT INTO payment (customer_id, staff_id, rental_id, amount, payment_date)
+               SELECT p.customer_id, p.staff_id, r2.rental_id, p.amount, p.payment_date + INTERVAL %s YEAR
+               FROM payment p
+               JOIN rental r ON p.rental_id = r.rental_id
+               JOIN rental r2 ON r2.rental_date = r.rental_date + INTERVAL %s YEAR
+                             AND r2.inventory_id = r.inventory_id
+                             AND r2.customer_id = r.customer_id
+               WHERE r.rental_date BETWEEN %s AND %s""",
+            (k, k, first, last),
+        )
+        payments = cur.rowcount
+        bump_versions(cur, ("rental", "payment"))
+        cur.connection.commit()
+        print(f"+{k} year(s): {rentals} rentals, {payments} payments.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate")
+    roll_p = sub.add_parser("roll")
+    roll_p.add_argument("--archive-before", type=int, metavar="YEAR")
+    sub.add_parser("check")
+    synth_p = sub.add_parser("synthesize")
+    synth_p.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            if args.command == "migrate":
+                migrate(cur)
+            elif args.command == "roll":
+                roll(cur, args.archive_before)
+            elif args.command == "check":
+                check(cur)
+            else:
+                synthesize(cur, args.years)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Password hashing and verification on a dedicated, bounded process pool.
+
+Accounts hold either a bcrypt hash (accounts created since bcrypt was introduced)
+or an unsalted SHA-256 hex digest (older accounts and the migration defaults).
+verify() accepts both and reports when the stored hash should be replaced, so
+login can upgrade SHA-256 and low-cost bcrypt hashes as users sign in.
+
+bcrypt costs tens of milliseconds of CPU per call, so it runs in a small pool of
+processes instead of on the request threads; at most max_pending calls may be
+queued or running at once, and further calls raise Busy straight away.
+Settings come from "passwords" in config.json.
+"""
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+import bcrypt
+
+DEFAULTS = {"rounds": 12, "pool_workers": 2, "max_pending": 32, "timeout_seconds": 10}
+
+_settings = dict(DEFAULTS)
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(DEFAULTS["max_pending"])
+_dummy = {}  # rounds -> bcrypt hash of a random password, for unknown usernames
+
+
+class Busy(Exception):
+    """Too many hashing calls are already queued."""
+
+
+def configure(config=None):
+    global _pending
+    _settings.update({k: v for k, v in (config or {}).items() if k in DEFAULTS})
+    _pending = threading.BoundedSemaphore(_settings["max_pending"])
+
+
+def is_bcrypt(stored):
+    return stored.startswith(("$2a$", "$2b$", "$2y$"))
+
+
+# --- Run in the pool processes --------------------------------------------------------
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _verify(password, stored, rounds):
+    """(matches, needs rehash) for a bcrypt or SHA-256 hex stored hash."""
+    if is_bcrypt(stored):
+        ok = bcrypt.checkpw(password.encode(), stored.encode())
+        return ok, ok and int(stored.split("$")[2]) < rounds
+    ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    return ok, ok
+
+
+# --- Called from request threads ------------------------------------------------------
+
+def _executor():
+    global _pool, _pool_pid
+    with _pool_lock:
+        # Pool processes belong to the process that started them; forked workers start their own
+        if _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=_settings["pool_workers"],
+                                        mp_context=multiprocessing.get_context("spawn"))
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def _run(func, *args):
+    if not _pending.acquire(blocking=False):
+        raise Busy()
+    try:
+        return _executor().submit(func, *args).result(timeout=_settings["timeout_seconds"])
+    except FutureTimeout:
+        raise Busy() from None
+    finally:
+        _pending.release()
+
+
+def hash_password(password):
+    """A new bcrypt hash at the configured cost."""
+    return _run(_hash, password, _settings["rounds"])
+
+
+def _dummy_check(password):
+    """A bcrypt check at the configured cost against a hash nothing matches."""
+    rounds = _settings["rounds"]
+    if rounds not in _dummy:
+        _dummy[rounds] = _run(_hash, os.urandom(16).hex(), rounds)
+    _run(_verify, password, _dummy[rounds], rounds)
+
+
+def verify(password, stored):
+    """(matches, needs rehash); every call costs one bcrypt check, whatever is stored.
+
+    SHA-256 digests are compared inline, plus a dummy bcrypt check, so response
+    time doesn't tell legacy accounts from current ones.
+    """
+    if not stored or not is_bcrypt(stored):
+        _dummy_check(password)
+        return _verify(password, stored, _settings["rounds"]) if stored else (False, False)
+    return _run(_verify, password, stored, _settings["rounds"])
+
+
+def verify_unknown(password):
+    """(False, False) at the cost of a real check, for usernames that don't exist."""
+    _dummy_check(password)
+    return False, False
+
+
+def warm():
+    """Start the pool processes now rather than on the first login."""
+    for future in [_executor().submit(_hash, "", 4) for _ in range(_settings["pool_workers"])]:
+        future.result()
@@ -0,0 +1,271 @@
+"""Sampling profiler for a fraction of requests, or for chosen endpoints, written as speedscope files.
+
+A profiled request gets a background thread that records the request thread's stack
+every interval_ms (sys._current_frames), so the request itself runs unmodified. Async
+views run on an event loop thread and their queries on db.run_sync's pool, so those
+threads are sampled too while they serve the request, each as its own profile.
+Captures are written to one directory as
+    <time>_<endpoint>_<latency>ms_<queries>q.speedscope.json
+(open them at https://www.speedscope.app), keeping only the newest `keep`.
+
+Defaults come from "profiler" in config.json; admins change them at /admin/profiles,
+which stores them in settings.json in the same directory so every worker picks them up.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULTS = {"sample_rate": 0.0, "endpoints": [], "interval_ms": 5, "min_ms": 0, "keep": 50, "dir": None}
+SETTINGS_FILE = "settings.json"
+SUFFIX = ".speedscope.json"
+NAME_RE = re.compile(r"^(\d{8}-\d{6}-\d{6})_(.+)_(\d+)ms_(\d+)q" + re.escape(SUFFIX) + "$")
+
+_config = dict(DEFAULTS)
+_settings = {"mtime": -1, "checked": 0.0, "values": dict(DEFAULTS)}
+# (sampler, [queries]) of the request being profiled; copied into the event loop and
+# pool threads along with the rest of the request's context
+_active = contextvars.ContextVar("profile", default=None)
+
+
+def profile_dir():
+    return _config["dir"]
+
+
+def settings():
+    """Config defaults overlaid with the admin's settings.json (re-read at most once a second)."""
+    now = time.monotonic()
+    if now - _settings["checked"] >= 1:
+        _settings["checked"] = now
+        path = os.path.join(profile_dir(), SETTINGS_FILE)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        if mtime != _settings["mtime"]:
+            values = dict(_config)
+            if mtime is not None:
+                try:
+                    with open(path) as f:
+                        values.update(json.load(f))
+                except (OSError, ValueError):
+                    pass
+            _settings["mtime"], _settings["values"] = mtime, values
+    return _settings["values"]
+
+
+def save_settings(sample_rate, endpoints, min_ms):
+    path = os.path.join(profile_dir(), SETTINGS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"sample_rate": sample_rate, "endpoints": endpoints, "min_ms": min_ms}, f)
+    os.replace(path + ".tmp", path)
+    _settings["checked"] = 0.0
+
+
+class Sampler:
+    """Collects the stacks of the threads serving a request from a background thread until stop().
+
+    The request thread is sampled throughout; other threads only between track() and
+    its exit.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.interval = interval
+        self.samples = {}  # label -> [(timestamp, tick, ((name, file, line), ...) root first)]
+        self._threads = {thread_id: "request"}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profiler-sampler")
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    @contextmanager
+    def track(self, label):
+        """Sample the calling thread, as its own profile named label, for the duration of the block."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = label
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads.pop(ident, None)
+
+    def _run(self):
+        tick = 0
+        while not self._stop.wait(self.interval):
+            tick += 1
+            with self._lock:
+                threads = list(self._threads.items())
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for ident, label in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if stack:
+                    self.samples.setdefault(label, []).append((now, tick, tuple(reversed(stack))))
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+        return self.samples
+
+
+def speedscope(sampler, name):
+    """Speedscope 'sampled' profiles, one per thread sampled.
+
+    Each sample is weighted by the time since that thread's previous sample, or by
+    the interval if the thread wasn't being sampled in between (e.g. a pool thread
+    picking up the request's next query).
+    """
+    frames, index = [], {}
+    profiles = []
+    for label, samples in sampler.samples.items():
+        stacks, weights = [], []
+        previous, last_tick = sampler.started, 0
+        for ts, tick, stack in samples:
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                ids.append(index[frame])
+            stacks.append(ids)
+            elapsed = ts - previous if tick == last_tick + 1 else sampler.interval
+            weights.append(round(elapsed * 1000, 3))
+            previous, last_tick = ts, tick
+        profiles.append({
+            "type": "sampled", "name": f"{name} [{label}]" if profiles else name, "unit": "milliseconds",
+            "startValue": 0, "endValue": round((sampler.stopped - sampler.started) * 1000, 3),
+            "samples": stacks, "weights": weights,
+        })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "blockbusters profiler",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+def write_capture(endpoint, latency_ms, queries, doc):
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    safe = re.sub(r"[^A-Za-z0-9_.:-]+", "-", endpoint)
+    name = f"{stamp}_{safe}_{latency_ms:.0f}ms_{queries}q{SUFFIX}"
+    path = os.path.join(profile_dir(), name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(doc, f)
+    os.replace(path + ".tmp", path)
+    _trim(settings()["keep"])
+    return name
+
+
+def _trim(keep):
+    """Ring buffer: delete all but the newest `keep` captures."""
+    for name in [c["file"] for c in captures()][keep:]:
+        try:
+            os.remove(os.path.join(profile_dir(), name))
+        except OSError:
+            pass
+
+
+def captures():
+    """Captures on disk, newest first, with the metadata encoded in their names."""
+    rows = []
+    for name in os.listdir(profile_dir()):
+        m = NAME_RE.match(name)
+        if m:
+            rows.append({
+                "file": name, "time": datetime.strptime(m.group(1), "%Y%m%d-%H%M%S-%f"),
+                "endpoint": m.group(2), "latency_ms": int(m.group(3)), "queries": int(m.group(4)),
+            })
+    return sorted(rows, key=lambda r: r["file"], reverse=True)
+
+
+def _count_statement(operation, seconds):
+    profile = _active.get()
+    if profile is not None:
+        profile[1][0] += 1
+
+
+@contextmanager
+def _track_pool_thread():
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    with profile[0].track(threading.current_thread().name):
+        yield
+
+
+def _tracking_async_to_sync(async_to_sync):
+    """Wrap Flask's async_to_sync so an async view's event loop thread is sampled too."""
+    def wrapper(func):
+        if not inspect.iscoroutinefunction(func):
+            return async_to_sync(func)
+
+        @functools.wraps(func)
+        async def tracked(*args, **kwargs):
+            profile = _active.get()
+            if profile is None:
+                return await func(*args, **kwargs)
+            with profile[0].track("event loop"):
+                return await func(*args, **kwargs)
+        return async_to_sync(tracked)
+    return wrapper
+
+
+def init_app(app, config=None):
+    """Profile sampled requests; see settings() for what gets sampled."""
+    from flask import request
+
+    _config.update({k: v for k, v in (config or {}).items() if k in DEFAULTS})
+    _config["dir"] = _config["dir"] or os.path.join(app.instance_path, "profiles")
+    os.makedirs(_config["dir"], exist_ok=True)
+    _settings.update(mtime=-1, checked=0.0)
+
+    import db
+    db.statement_hooks.append(_count_statement)
+    db.pool_hooks.append(_track_pool_thread)
+    app.async_to_sync = _tracking_async_to_sync(app.async_to_sync)
+
+    @app.before_request
+    def start_profile():
+        values = settings()
+        chosen = request.endpoint in values["endpoints"]
+        if not chosen and not (values["sample_rate"] and random.random() < values["sample_rate"]):
+            return
+        if request.endpoint and request.endpoint.startswith(("static", "admin.profile")):
+            return
+        _active.set((Sampler(threading.get_ident(), values["interval_ms"] / 1000).start(), [0]))
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = _active.get()
+        if profile is None:
+            return
+        _active.set(None)
+        sampler, (queries,) = profile
+        samples = sampler.stop()
+        latency_ms = (sampler.stopped - sampler.started) * 1000
+        if latency_ms < settings()["min_ms"] or not samples:
+            return
+        endpoint = request.endpoint or "unmatched"
+        name = f"{request.method} {request.full_path.rstrip('?')} ({endpoint}, {latency_ms:.0f} ms, {queries} queries)"
+        write_capture(endpoint, latency_ms, queries, speedscope(sampler, name))
@@ -0,0 +1,46 @@
+"""Token-bucket rate limits kept in shared memory, so every worker process sees the same buckets.
+
+The buckets live in a fixed table of slots allocated with multiprocessing.RawArray.
+When the app is preloaded (gunicorn's preload_app, see wsgi.py) the table is created
+once in the master and inherited by every forked worker, including ones started
+after a recycle; otherwise each process has its own. A key is hashed to a slot; a
+slot taken by a different key is reset, which can only make the limit more lenient.
+"""
+import hashlib
+import multiprocessing
+import struct
+import time
+
+# Per slot: key hash, tokens, last refill time
+_FIELDS = 3
+
+
+class TokenBuckets:
+    def __init__(self, capacity, per_second, slots=16384):
+        self.capacity = float(capacity)
+        self.per_second = float(per_second)
+        self.slots = slots
+        self._table = multiprocessing.RawArray("d", slots * _FIELDS)
+        self._lock = multiprocessing.Lock()
+
+    @staticmethod
+    def _key_hash(key):
+        # A double holds 53 bits exactly; 6 bytes of the digest fit
+        return float(struct.unpack(">Q", b"\0\0" + hashlib.blake2b(key.encode(), digest_size=6).digest())[0])
+
+    def take(self, key, now=None):
+        """Take one token for key; returns 0 if allowed, else seconds until a token is available."""
+        now = time.time() if now is None else now
+        key_hash = self._key_hash(key)
+        i = (int(key_hash) % self.slots) * _FIELDS
+        table = self._table
+        with self._lock:
+            if table[i] != key_hash:
+                table[i], table[i + 1], table[i + 2] = key_hash, self.capacity, now
+            tokens = min(self.capacity, table[i + 1] + (now - table[i + 2]) * self.per_second)
+            table[i + 2] = now
+            if tokens >= 1:
+                table[i + 1] = tokens - 1
+                return 0
+            table[i + 1] = tokens
+            return (1 - tokens) / self.per_second if self.per_second else float("inf")
@@ -0,0 +1,37 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, abort
+from routes.auth import role_required
+from db import query_stats, trace_settings
+import profiler
+
+admin_bp = Blueprint("admin", __name__)
+
+
+@admin_bp.route("/admin/sql")
+@role_required("admin")
+def sql():
+    return render_template("admin_sql.html", stats=query_stats(), settings=trace_settings())
+
+
+@admin_bp.route("/admin/profiles", methods=["GET", "POST"])
+@role_required("admin")
+def profiles():
+    if request.method == "POST":
+        try:
+            rate = float(request.form.get("sample_percent") or 0) / 100
+            min_ms = int(request.form.get("min_ms") or 0)
+        except ValueError:
+            flash("Sample rate and minimum latency must be numbers.", "danger")
+            return redirect(url_for("admin.profiles"))
+        endpoints = [e.strip() for e in request.form.get("endpoints", "").split(",") if e.strip()]
+        profiler.save_settings(min(max(rate, 0.0), 1.0), endpoints, max(min_ms, 0))
+        flash("Profiler settings saved.", "success")
+        return redirect(url_for("admin.profiles"))
+    return render_template("admin_profiles.html", captures=profiler.captures(), settings=profiler.settings())
+
+
+@admin_bp.route("/admin/profiles/<name>")
+@role_required("admin")
+def profile_file(name):
+    if not profiler.NAME_RE.match(name):
+        abort(404)
+    return send_from_directory(profiler.profile_dir(), name, as_attachment=True, mimetype="application/json")
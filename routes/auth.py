@@ -1,10 +1,44 @@
+import math
 import re
-import hashlib
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from db import query, execute
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+import pymysql
+from db import query, execute, transaction
+import passwords
+from ratelimit import TokenBuckets
 
 auth_bp = Blueprint("auth", __name__)
 
+# Identity columns read straight from app_users: primary-key lookups by id and the
+# unique index on username, instead of going through the v_users view
+USER_COLUMNS = "user_id AS id, username, role, staff_id, customer_id"
+
+LOGIN_LIMITS = {
+    "enabled": True,
+    "per_ip": {"capacity": 20, "per_second": 0.5},
+    "per_username": {"capacity": 5, "per_second": 0.1},
+    "slots": 16384,
+}
+_login_limits = {}
+
+
+def configure_login(config):
+    """Password pool settings and the login rate limits; call before workers fork so they share the buckets."""
+    passwords.configure(config.get("passwords"))
+    limits = {**LOGIN_LIMITS, **config.get("login_rate_limit", {})}
+    _login_limits.clear()
+    if not limits["enabled"]:  # e.g. for benchmarks/load_test.py, where every user shares one IP
+        return
+    _login_limits["ip"] = TokenBuckets(**limits["per_ip"], slots=limits["slots"])
+    _login_limits["username"] = TokenBuckets(**limits["per_username"], slots=limits["slots"])
+
+
+def _login_wait(username):
+    """Seconds until this IP and username may try again (0 = now)."""
+    if not _login_limits:
+        return 0
+    wait = _login_limits["ip"].take(request.remote_addr or "")
+    return wait or _login_limits["username"].take(username.lower())
+
 
 def validate_password(pw):
     errors = []
@@ -29,7 +63,7 @@ def get_current_user():
     uid = session.get("user_id")
     if not uid:
         return None
-    return query("SELECT * FROM v_users WHERE id = %s", (uid,), one=True)
+    return query(f"SELECT {USER_COLUMNS} FROM app_users WHERE user_id = %s", (uid,), one=True)
 
 
 def role_required(*roles):
@@ -45,7 +79,8 @@ def role_required(*roles):
             if user["role"] not in roles:
                 flash("You do not have permission to access this page.", "danger")
                 return redirect(url_for("dashboard.index"))
-            return f(*args, **kwargs)
+            # ensure_sync: the view may be an async def
+            return current_app.ensure_sync(f)(*args, **kwargs)
         return wrapped
     return decorator
 
@@ -58,7 +93,7 @@ def login_required(f):
         if not get_current_user():
             flash("Please log in.", "warning")
             return redirect(url_for("auth.login"))
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     return wrapped
 
 
@@ -67,8 +102,29 @@ def login():
     if request.method == "POST":
         username = request.form["username"].strip()
         password = request.form["password"]
-        user = query("SELECT * FROM v_users WHERE username = %s", (username,), one=True)
-        if user and hashlib.sha256(password.encode()).hexdigest() == user["password_hash"]:
+        wait = _login_wait(username)
+        if wait:
+            flash(f"Too many login attempts. Try again in {math.ceil(wait)} seconds.", "danger")
+            return render_template("login.html"), 429, {"Retry-After": str(math.ceil(wait))}
+
+        user = query(f"SELECT {USER_COLUMNS}, password_hash FROM app_users WHERE username = %s",
+                     (username,), one=True)
+        try:
+            if user:
+                ok, rehash = passwords.verify(password, user["password_hash"])
+            else:
+                ok, rehash = passwords.verify_unknown(password)
+        except passwords.Busy:
+            flash("Too many logins right now, please try again in a moment.", "warning")
+            return render_template("login.html"), 503, {"Retry-After": "1"}
+        if ok:
+            if rehash:
+                # Legacy SHA-256 (or lower-cost bcrypt) hash: store a current one
+                try:
+                    execute("UPDATE app_users SET password_hash = %s WHERE user_id = %s",
+                            (passwords.hash_password(password), user["id"]))
+                except passwords.Busy:
+                    pass  # upgraded on a later login
             session["user_id"] = user["id"]
             session["role"] = user["role"]
             session["username"] = user["username"]
@@ -96,32 +152,35 @@ def register():
         if password != confirm:
             errors.append("Passwords do not match.")
         errors.extend(validate_password(password))
-        if query("SELECT user_id FROM v_users WHERE username = %s", (username,), one=True):
-            errors.append("Username already taken.")
 
         if errors:
             for e in errors:
                 flash(e, "danger")
             return render_template("register.html")
-
-        # Create customer record
-        address_id = query("SELECT address_id FROM address LIMIT 1", one=True)["address_id"]
-        store_id = query("SELECT store_id FROM store LIMIT 1", one=True)["store_id"]
-        execute(
-            """INSERT INTO customer (store_id, first_name, last_name, email, address_id, active)
-               VALUES (%s, %s, %s, %s, %s, 1)""",
-            (store_id, first_name, last_name, email, address_id),
-        )
-        customer_id = query(
-            "SELECT customer_id FROM customer WHERE email = %s ORDER BY customer_id DESC LIMIT 1",
-            (email,), one=True
-        )["customer_id"]
-
-        pw_hash = hashlib.sha256(password.encode()).hexdigest()
-        execute(
-            "INSERT INTO app_users (username, password_hash, role, customer_id) VALUES (%s, %s, 'customer', %s)",
-            (username, pw_hash, customer_id),
-        )
+        try:
+            pw_hash = passwords.hash_password(password)
+        except passwords.Busy:
+            flash("Too many requests right now, please try again in a moment.", "warning")
+            return render_template("register.html"), 503, {"Retry-After": "1"}
+
+        # Customer and login in one transaction; the unique index on username rejects
+        # a taken name and rolls back the customer with it
+        address_id = query("SELECT address_id FROM address LIMIT 1", one=True, cache=True)["address_id"]
+        store_id = query("SELECT store_id FROM store LIMIT 1", one=True, cache=True)["store_id"]
+        try:
+            with transaction() as tx:
+                customer_id = tx.execute(
+                    """INSERT INTO customer (store_id, first_name, last_name, email, address_id, active)
+                       VALUES (%s, %s, %s, %s, %s, 1)""",
+                    (store_id, first_name, last_name, email, address_id),
+                )
+                tx.execute(
+                    "INSERT INTO app_users (username, password_hash, role, customer_id) VALUES (%s, %s, 'customer', %s)",
+                    (username, pw_hash, customer_id),
+                )
+        except pymysql.err.IntegrityError:
+            flash("Username already taken.", "danger")
+            return render_template("register.html")
         flash("Registration successful! Please log in.", "success")
         return redirect(url_for("auth.login"))
 
@@ -1,7 +1,9 @@
-import bcrypt
+import asyncio
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from routes.auth import role_required, validate_email, validate_password
-from db import query, execute
+import pymysql
+from db import aquery, query, execute, transaction
+import passwords
 
 customers_bp = Blueprint("customers", __name__)
 
@@ -21,14 +23,14 @@ def index():
         sql += " WHERE (c.first_name LIKE %s OR c.last_name LIKE %s OR c.email LIKE %s)"
         args.extend([f"%{search}%"] * 3)
     sql += " ORDER BY c.last_name, c.first_name"
-    customers = query(sql, args)
+    customers = query(sql, args, compact=True)
     return render_template("customers.html", customers=customers, search=search)
 
 
 @customers_bp.route("/customers/<int:cid>")
 @role_required("admin", "staff")
-def detail(cid):
-    customer = query(
+async def detail(cid):
+    customer = await aquery(
         """SELECT c.*, s.name AS store_name,
                   a.address, ci.city
            FROM customer c
@@ -41,51 +43,53 @@ def detail(cid):
     if not customer:
         return "Customer not found", 404
 
-    total_rentals = query(
-        "SELECT COUNT(*) AS cnt FROM rental WHERE customer_id = %s",
-        (cid,), one=True,
-    )
-    active_rentals = query(
-        "SELECT COUNT(*) AS cnt FROM rental WHERE customer_id = %s AND returned_date IS NULL",
-        (cid,), one=True,
-    )
-    total_spent = query(
-        "SELECT COALESCE(SUM(amount), 0) AS total FROM payment WHERE customer_id = %s",
-        (cid,), one=True,
-    )
-    favorite_category = query(
-        """SELECT c.name AS category, COUNT(*) AS cnt
-           FROM rental r
-           JOIN inventory i ON r.inventory_id = i.inventory_id
-           JOIN film_category fc ON i.film_id = fc.film_id
-           JOIN category c ON fc.category_id = c.category_id
-           WHERE r.customer_id = %s
-           GROUP BY c.category_id, c.name
-           ORDER BY cnt DESC LIMIT 1""",
-        (cid,), one=True,
-    )
-    rentals = query(
-        """SELECT r.rental_id, r.rental_date, r.returned_date,
-                  f.title, f.film_id,
-                  COALESCE(p.amount, 0) AS amount
-           FROM rental r
-           JOIN inventory i ON r.inventory_id = i.inventory_id
-           JOIN film f ON i.film_id = f.film_id
-           LEFT JOIN payment p ON p.rental_id = r.rental_id
-           WHERE r.customer_id = %s
-           ORDER BY r.rental_date DESC LIMIT 50""",
-        (cid,),
-    )
-    top_categories = query(
-        """SELECT c.name AS category, COUNT(*) AS cnt
-           FROM rental r
-           JOIN inventory i ON r.inventory_id = i.inventory_id
-           JOIN film_category fc ON i.film_id = fc.film_id
-           JOIN category c ON fc.category_id = c.category_id
-           WHERE r.customer_id = %s
-           GROUP BY c.category_id, c.name
-           ORDER BY cnt DESC LIMIT 5""",
-        (cid,),
+    total_rentals, active_rentals, total_spent, favorite_category, rentals, top_categories = await asyncio.gather(
+        aquery(
+            "SELECT COUNT(*) AS cnt FROM rental WHERE customer_id = %s",
+            (cid,), one=True,
+        ),
+        aquery(
+            "SELECT COUNT(*) AS cnt FROM rental WHERE customer_id = %s AND returned_date IS NULL",
+            (cid,), one=True,
+        ),
+        aquery(
+            "SELECT COALESCE(SUM(amount), 0) AS total FROM payment WHERE customer_id = %s",
+            (cid,), one=True,
+        ),
+        aquery(
+            """SELECT c.name AS category, COUNT(*) AS cnt
+               FROM rental r
+               JOIN inventory i ON r.inventory_id = i.inventory_id
+               JOIN film_category fc ON i.film_id = fc.film_id
+               JOIN category c ON fc.category_id = c.category_id
+               WHERE r.customer_id = %s
+               GROUP BY c.category_id, c.name
+               ORDER BY cnt DESC LIMIT 1""",
+            (cid,), one=True,
+        ),
+        aquery(
+            """SELECT r.rental_id, r.rental_date, r.returned_date,
+                      f.title, f.film_id,
+                      COALESCE(p.amount, 0) AS amount
+               FROM rental r
+               JOIN inventory i ON r.inventory_id = i.inventory_id
+               JOIN film f ON i.film_id = f.film_id
+               LEFT JOIN payment p ON p.rental_id = r.rental_id
+               WHERE r.customer_id = %s
+               ORDER BY r.rental_date DESC LIMIT 50""",
+            (cid,),
+        ),
+        aquery(
+            """SELECT c.name AS category, COUNT(*) AS cnt
+               FROM rental r
+               JOIN inventory i ON r.inventory_id = i.inventory_id
+               JOIN film_category fc ON i.film_id = fc.film_id
+               JOIN category c ON fc.category_id = c.category_id
+               WHERE r.customer_id = %s
+               GROUP BY c.category_id, c.name
+               ORDER BY cnt DESC LIMIT 5""",
+            (cid,),
+        ),
     )
 
     return render_template(
@@ -102,7 +106,7 @@ def detail(cid):
 @customers_bp.route("/customers/add", methods=["GET", "POST"])
 @role_required("admin", "staff")
 def add():
-    stores = query("SELECT store_id FROM store ORDER BY store_id")
+    stores = query("SELECT store_id FROM store ORDER BY store_id", cache=True)
     if request.method == "POST":
         first = request.form["first_name"].strip()
         last = request.form["last_name"].strip()
@@ -125,17 +129,28 @@ def add():
                 flash(e, "danger")
             return render_template("customer_form.html", stores=stores, editing=False)
 
-        address_id = query("SELECT address_id FROM address LIMIT 1", one=True)["address_id"]
-        cust_id = execute(
-            """INSERT INTO customer (store_id, first_name, last_name, email, address_id, active)
-               VALUES (%s, %s, %s, %s, %s, 1)""",
-            (store_id, first, last, email, address_id),
-        )
-        pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-        execute(
-            "INSERT INTO app_users (username, password_hash, role, customer_id) VALUES (%s, %s, 'customer', %s)",
-            (username, pw_hash, cust_id),
-        )
+        try:
+            pw_hash = passwords.hash_password(password)
+        except passwords.Busy:
+            flash("Too many requests right now, please try again in a moment.", "warning")
+            return render_template("customer_form.html", stores=stores, editing=False), 503, {"Retry-After": "1"}
+
+        # Customer and login together, so a failure never leaves a customer without a login
+        address_id = query("SELECT address_id FROM address LIMIT 1", one=True, cache=True)["address_id"]
+        try:
+            with transaction() as tx:
+                cust_id = tx.execute(
+                    """INSERT INTO customer (store_id, first_name, last_name, email, address_id, active)
+                       VALUES (%s, %s, %s, %s, %s, 1)""",
+                    (store_id, first, last, email, address_id),
+                )
+                tx.execute(
+                    "INSERT INTO app_users (username, password_hash, role, customer_id) VALUES (%s, %s, 'customer', %s)",
+                    (username, pw_hash, cust_id),
+                )
+        except pymysql.err.IntegrityError:
+            flash("Username already taken.", "danger")
+            return render_template("customer_form.html", stores=stores, editing=False)
         flash("Customer added successfully.", "success")
         return redirect(url_for("customers.index"))
 
@@ -148,7 +163,7 @@ def edit(cid):
     customer = query("SELECT * FROM customer WHERE customer_id = %s", (cid,), one=True)
     if not customer:
         return "Customer not found", 404
-    stores = query("SELECT store_id FROM store ORDER BY store_id")
+    stores = query("SELECT store_id FROM store ORDER BY store_id", cache=True)
 
     if request.method == "POST":
         first = request.form["first_name"].strip()
@@ -1,10 +1,28 @@
-from flask import Blueprint, render_template, jsonify, session
-from routes.auth import login_required, get_current_user
-from db import query
+import asyncio
+from flask import Blueprint, render_template, jsonify, session, request
+from routes.auth import login_required, get_current_user, role_required
+from db import aquery, query, load_config, run_sync
+from conditional import conditional
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
 
+def _today(col):
+    """Sargable "is today" predicate: a bare-column range, not DATE(col) = CURDATE(),
+    so the index and monthly partition pruning apply."""
+    return f"{col} >= CURDATE() AND {col} < CURDATE() + INTERVAL 1 DAY"
+
+
+# period -> (lookback interval, DATE_FORMAT bucket)
+REVENUE_PERIODS = {
+    "1m": ("1 MONTH", "%Y-%m-%d"),
+    "6m": ("6 MONTH", "%x-W%v"),
+    "1y": ("1 YEAR", "%Y-%m"),
+    "5y": ("5 YEAR", "%Y-%m"),
+    "10y": ("10 YEAR", "%Y"),
+}
+
+
 @dashboard_bp.route("/")
 @dashboard_bp.route("/dashboard")
 @login_required
@@ -41,80 +59,110 @@ def _customer_dashboard(user):
 
 @dashboard_bp.route("/api/dashboard/stats")
 @login_required
-def stats():
+# "Today" and "overdue" move with the clock, so the tag also changes every minute
+@conditional("rental", "payment", "customer", "film", "inventory", "film_category", "category", "store",
+             ttl=60)
+async def stats():
     user = get_current_user()
     if user["role"] == "customer":
         return jsonify({}), 403
 
-    today_rentals = query("SELECT COUNT(*) AS cnt FROM rental WHERE DATE(rental_date) = CURDATE()", one=True)
-    today_revenue = query("SELECT COALESCE(SUM(amount),0) AS total FROM payment WHERE DATE(payment_date) = CURDATE()",one=True)
-    
-    total_rentals = query("SELECT COUNT(*) AS cnt FROM rental", one=True)
-    total_revenue = query("SELECT COALESCE(SUM(amount),0) AS total FROM payment", one=True)
-    
-    active_rentals = query("SELECT COUNT(*) AS cnt FROM rental WHERE returned_date IS NULL", one=True)
-    overdue = query(
-        """SELECT COUNT(*) AS cnt FROM rental r
-           JOIN inventory i ON r.inventory_id = i.inventory_id
-           JOIN film f ON i.film_id = f.film_id
-           WHERE r.returned_date IS NULL
-             AND DATE_ADD(r.rental_date, INTERVAL f.rental_duration DAY) < NOW()""",
-        one=True,
-    )
-    total_customers = query("SELECT COUNT(*) AS cnt FROM customer WHERE active = 1", one=True)
-    total_films = query("SELECT COUNT(*) AS cnt FROM film", one=True)
-    total_inventory = query("SELECT COUNT(*) AS cnt FROM inventory", one=True)
+    if _snapshot_source():
+        from analytics import dashboard_stats
+        live, report = await asyncio.gather(_live_stats(), run_sync(dashboard_stats))
+        return jsonify({**live, **report, "source": "snapshot"})
+    live, report = await asyncio.gather(_live_stats(), _report_stats())
+    return jsonify({**live, **report, "source": "mysql"})
 
-    # Top 10 films
-    top_films = query(
-        """SELECT f.title, COUNT(r.rental_id) AS rentals
-           FROM rental r
-           JOIN inventory i ON r.inventory_id = i.inventory_id
-           JOIN film f ON i.film_id = f.film_id
-           GROUP BY f.film_id, f.title
-           ORDER BY rentals DESC LIMIT 10"""
-    )
 
-    # Rentals by category
-    by_category = query(
-        """SELECT c.name AS category, COUNT(r.rental_id) AS rentals
-           FROM rental r
-           JOIN inventory i ON r.inventory_id = i.inventory_id
-           JOIN film_category fc ON i.film_id = fc.film_id
-           JOIN category c ON fc.category_id = c.category_id
-           GROUP BY c.category_id, c.name
-           ORDER BY rentals DESC""")
-
-    # Revenue last 7 days (or months if no recent data)
-    revenue_trend = query(
-        """SELECT DATE(payment_date) AS day, SUM(amount) AS total
-           FROM payment
-           GROUP BY DATE(payment_date)
-           ORDER BY day DESC LIMIT 30""")
-
-    # Rentals by store
-    by_store = query(
-        """SELECT s.store_id, COUNT(r.rental_id) AS rentals
-           FROM rental r
-           JOIN inventory i ON r.inventory_id = i.inventory_id
-           JOIN store s ON i.store_id = s.store_id
-           GROUP BY s.store_id ORDER BY s.store_id""")
+def _snapshot_source():
+    """True when config.json selects the Parquet snapshot and one has been written."""
+    if load_config().get("dashboard_source") != "snapshot":
+        return False
+    from analytics import available
+    return available()
 
-    # Inventory by rating
-    by_rating = query(
-        """SELECT f.rating, COUNT(i.inventory_id) AS count
-           FROM inventory i
-           JOIN film f ON i.film_id = f.film_id
-           GROUP BY f.rating ORDER BY count DESC""")
 
-    return jsonify({
+async def _live_stats():
+    """Counters that must reflect the current state of the live tables."""
+    today_rentals, today_revenue, active_rentals, overdue, total_customers = await asyncio.gather(
+        aquery(f"SELECT COUNT(*) AS cnt FROM rental WHERE {_today('rental_date')}", one=True),
+        aquery(f"SELECT COALESCE(SUM(amount),0) AS total FROM payment WHERE {_today('payment_date')}", one=True),
+        aquery("SELECT COUNT(*) AS cnt FROM rental WHERE returned_date IS NULL", one=True),
+        aquery(
+            """SELECT COUNT(*) AS cnt FROM rental r
+               JOIN inventory i ON r.inventory_id = i.inventory_id
+               JOIN film f ON i.film_id = f.film_id
+               WHERE r.returned_date IS NULL
+                 AND DATE_ADD(r.rental_date, INTERVAL f.rental_duration DAY) < NOW()""",
+            one=True,
+        ),
+        aquery("SELECT COUNT(*) AS cnt FROM customer WHERE active = 1", one=True),
+    )
+
+    return {
         "today_rentals": today_rentals["cnt"] if today_rentals else 0,
         "today_revenue": float(today_revenue["total"]) if today_revenue else 0,
-        "total_rentals": total_rentals["cnt"] if total_rentals else 0,
-        "total_revenue": float(total_revenue["total"]) if total_revenue else 0,
         "active_rentals": active_rentals["cnt"] if active_rentals else 0,
         "overdue_rentals": overdue["cnt"] if overdue else 0,
         "total_customers": total_customers["cnt"] if total_customers else 0,
+    }
+
+
+async def _report_stats():
+    """Whole-history aggregates; analytics.compute() answers the same from the snapshot."""
+    (total_rentals, total_revenue, total_films, total_inventory,
+     top_films, by_category, revenue_trend, by_store, by_rating) = await asyncio.gather(
+        aquery("SELECT COUNT(*) AS cnt FROM rental", one=True),
+        aquery("SELECT COALESCE(SUM(amount),0) AS total FROM payment", one=True),
+        aquery("SELECT COUNT(*) AS cnt FROM film", one=True),
+        aquery("SELECT COUNT(*) AS cnt FROM inventory", one=True),
+
+        # Top 10 films
+        aquery(
+            """SELECT f.title, COUNT(r.rental_id) AS rentals
+               FROM rental r
+               JOIN inventory i ON r.inventory_id = i.inventory_id
+               JOIN film f ON i.film_id = f.film_id
+               GROUP BY f.film_id, f.title
+               ORDER BY rentals DESC LIMIT 10"""),
+
+        # Rentals by category
+        aquery(
+            """SELECT c.name AS category, COUNT(r.rental_id) AS rentals
+               FROM rental r
+               JOIN inventory i ON r.inventory_id = i.inventory_id
+               JOIN film_category fc ON i.film_id = fc.film_id
+               JOIN category c ON fc.category_id = c.category_id
+               GROUP BY c.category_id, c.name
+               ORDER BY rentals DESC"""),
+
+        # Revenue last 7 days (or months if no recent data)
+        aquery(
+            """SELECT DATE(payment_date) AS day, SUM(amount) AS total
+               FROM payment
+               GROUP BY DATE(payment_date)
+               ORDER BY day DESC LIMIT 30"""),
+
+        # Rentals by store
+        aquery(
+            """SELECT s.store_id, COUNT(r.rental_id) AS rentals
+               FROM rental r
+               JOIN inventory i ON r.inventory_id = i.inventory_id
+               JOIN store s ON i.store_id = s.store_id
+               GROUP BY s.store_id ORDER BY s.store_id"""),
+
+        # Inventory by rating
+        aquery(
+            """SELECT f.rating, COUNT(i.inventory_id) AS count
+               FROM inventory i
+               JOIN film f ON i.film_id = f.film_id
+               GROUP BY f.rating ORDER BY count DESC"""),
+    )
+
+    return {
+        "total_rentals": total_rentals["cnt"] if total_rentals else 0,
+        "total_revenue": float(total_revenue["total"]) if total_revenue else 0,
         "total_films": total_films["cnt"] if total_films else 0,
         "total_inventory": total_inventory["cnt"] if total_inventory else 0,
         "top_films": top_films or [],
@@ -122,4 +170,83 @@ def stats():
         "revenue_trend": [{"day": str(r["day"]), "total": float(r["total"])} for r in (revenue_trend or [])],
         "by_store": by_store or [],
         "by_rating": by_rating or [],
-    })
+    }
+
+
+@dashboard_bp.route("/api/dashboard/revenue_trend")
+@login_required
+def revenue_trend():
+    user = get_current_user()
+    if user["role"] == "customer":
+        return jsonify([]), 403
+    interval, bucket = REVENUE_PERIODS.get(request.args.get("period", "1y"), REVENUE_PERIODS["1y"])
+    # Lower-bounded on the bare column so only the partitions in the window are read
+    rows = query(
+        f"""SELECT DATE_FORMAT(payment_date, %s) AS label, SUM(amount) AS total
+            FROM payment
+            WHERE payment_date >= NOW() - INTERVAL {interval}
+            GROUP BY label
+            ORDER BY label DESC""",
+        (bucket,),
+    )
+    return jsonify([{"label": r["label"], "total": float(r["total"])} for r in (rows or [])])
+
+
+RENTAL_DETAIL_SQL = """
+    SELECT r.rental_id, r.rental_date, r.returned_date,
+           f.film_id, f.title, i.store_id,
+           CONCAT(c.first_name, ' ', c.last_name) AS customer_name,
+           DATE_ADD(r.rental_date, INTERVAL f.rental_duration DAY) AS due_date,
+           DATEDIFF(NOW(), DATE_ADD(r.rental_date, INTERVAL f.rental_duration DAY)) AS days_overdue
+    FROM rental r
+    JOIN inventory i ON r.inventory_id = i.inventory_id
+    JOIN film f ON i.film_id = f.film_id
+    JOIN customer c ON r.customer_id = c.customer_id
+"""
+
+
+@dashboard_bp.route("/dashboard/today_rentals")
+@role_required("admin", "staff")
+def today_rentals():
+    rows = query(RENTAL_DETAIL_SQL + f" WHERE {_today('r.rental_date')} ORDER BY r.rental_date DESC")
+    return render_template("dashboard_detail.html", view="today", title="Today's Rentals", icon="📅", rows=rows)
+
+
+@dashboard_bp.route("/dashboard/today_revenue")
+@role_required("admin", "staff")
+def today_revenue():
+    rows = query(
+        f"""SELECT p.payment_id, p.amount, p.payment_date, f.film_id, f.title,
+                   CONCAT(c.first_name, ' ', c.last_name) AS customer_name
+            FROM payment p
+            JOIN customer c ON p.customer_id = c.customer_id
+            JOIN rental r ON p.rental_id = r.rental_id
+            JOIN inventory i ON r.inventory_id = i.inventory_id
+            JOIN film f ON i.film_id = f.film_id
+            WHERE {_today('p.payment_date')}
+            ORDER BY p.payment_date DESC"""
+    )
+    total = sum(float(r["amount"]) for r in rows) if rows else 0
+    return render_template(
+        "dashboard_detail.html", view="today_revenue", title="Today's Revenue", icon="💰",
+        rows=rows, total=total,
+    )
+
+
+@dashboard_bp.route("/dashboard/active_rentals")
+@role_required("admin", "staff")
+def active_rentals():
+    rows = query(RENTAL_DETAIL_SQL + " WHERE r.returned_date IS NULL ORDER BY r.rental_date DESC LIMIT 500")
+    return render_template("dashboard_detail.html", view="active", title="Active Rentals", icon="🔄", rows=rows)
+
+
+@dashboard_bp.route("/dashboard/overdue_rentals")
+@role_required("admin", "staff")
+def overdue_rentals():
+    rows = query(
+        RENTAL_DETAIL_SQL
+        + """ WHERE r.returned_date IS NULL
+                AND DATE_ADD(r.rental_date, INTERVAL f.rental_duration DAY) < NOW()
+              ORDER BY r.rental_date LIMIT 500"""
+    )
+    return render_template("dashboard_detail.html", view="overdue", title="Overdue Rentals", icon="⚠️", rows=rows)
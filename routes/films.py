@@ -1,12 +1,15 @@
+import asyncio
 from flask import Blueprint, render_template, request
 from routes.auth import login_required
-from db import query
+from db import aquery, query
+from conditional import conditional
 
 films_bp = Blueprint("films", __name__)
 
 
 @films_bp.route("/films")
 @login_required
+@conditional("film", "film_category", "category")
 def index():
     search = request.args.get("search", "").strip()
     category = request.args.get("category", "")
@@ -37,11 +40,11 @@ def index():
         args.append(year)
 
     sql += " ORDER BY f.title"
-    films = query(sql, args)
+    films = query(sql, args, compact=True)
 
-    categories = query("SELECT name FROM category ORDER BY name")
-    ratings = query("SELECT DISTINCT rating FROM film ORDER BY rating")
-    years = query("SELECT DISTINCT release_year FROM film ORDER BY release_year DESC")
+    categories = query("SELECT name FROM category ORDER BY name", cache=True)
+    ratings = query("SELECT DISTINCT rating FROM film ORDER BY rating", cache=True)
+    years = query("SELECT DISTINCT release_year FROM film ORDER BY release_year DESC", cache=True)
 
     return render_template(
         "films.html", films=films, categories=categories, ratings=ratings,
@@ -51,56 +54,59 @@ def index():
 
 @films_bp.route("/films/<int:film_id>")
 @login_required
-def detail(film_id):
-    film = query(
+@conditional("film", "film_category", "category", "language", "actor", "film_actor",
+             "inventory", "rental", "store", "address", "city")
+async def detail(film_id):
+    # Cached, and it decides the 404 before the heavier queries start
+    film = await aquery(
         """SELECT f.*, c.name AS category, l.name AS language
            FROM film f
            LEFT JOIN film_category fc ON f.film_id = fc.film_id
            LEFT JOIN category c ON fc.category_id = c.category_id
            LEFT JOIN language l ON f.language_id = l.language_id
            WHERE f.film_id = %s""",
-        (film_id,), one=True,
+        (film_id,), one=True, cache=True,
     )
     if not film:
         return "Film not found", 404
 
-    actors = query(
-        """SELECT a.first_name, a.last_name
-           FROM actor a
-           JOIN film_actor fa ON a.actor_id = fa.actor_id
-           WHERE fa.film_id = %s ORDER BY a.last_name""",
-        (film_id,),
-    )
-
-    inventory = query(
-        """SELECT s.store_id,
-                  a.address AS store_address,
-                  ci.name,
-                  COUNT(i.inventory_id) AS total_copies,
-                  SUM(CASE WHEN r.rental_id IS NULL OR r.returned_date IS NOT NULL THEN 1 ELSE 0 END) AS available
-           FROM inventory i
-           JOIN store s ON i.store_id = s.store_id
-           JOIN address a ON s.address_id = a.address_id
-           JOIN city ci ON a.city_id = ci.city_id
-           LEFT JOIN rental r ON i.inventory_id = r.inventory_id
-               AND r.returned_date IS NULL
-           WHERE i.film_id = %s
-           GROUP BY s.store_id, a.address, ci.name""",
-        (film_id,),
-    )
-
-    recommendations = query(
-        """SELECT f2.film_id, f2.title, COUNT(*) AS overlap
-           FROM rental r1
-           JOIN inventory i1 ON r1.inventory_id = i1.inventory_id
-           JOIN rental r2 ON r1.customer_id = r2.customer_id
-           JOIN inventory i2 ON r2.inventory_id = i2.inventory_id
-           JOIN film f2 ON i2.film_id = f2.film_id
-           WHERE i1.film_id = %s AND f2.film_id != %s
-           GROUP BY f2.film_id, f2.title
-           ORDER BY overlap DESC
-           LIMIT 6""",
-        (film_id, film_id),
+    actors, inventory, recommendations = await asyncio.gather(
+        aquery(
+            """SELECT a.first_name, a.last_name
+               FROM actor a
+               JOIN film_actor fa ON a.actor_id = fa.actor_id
+               WHERE fa.film_id = %s ORDER BY a.last_name""",
+            (film_id,), cache=True,
+        ),
+        aquery(
+            """SELECT s.store_id,
+                      a.address AS store_address,
+                      ci.name,
+                      COUNT(i.inventory_id) AS total_copies,
+                      SUM(CASE WHEN r.rental_id IS NULL OR r.returned_date IS NOT NULL THEN 1 ELSE 0 END) AS available
+               FROM inventory i
+               JOIN store s ON i.store_id = s.store_id
+               JOIN address a ON s.address_id = a.address_id
+               JOIN city ci ON a.city_id = ci.city_id
+               LEFT JOIN rental r ON i.inventory_id = r.inventory_id
+                   AND r.returned_date IS NULL
+               WHERE i.film_id = %s
+               GROUP BY s.store_id, a.address, ci.name""",
+            (film_id,),
+        ),
+        aquery(
+            """SELECT f2.film_id, f2.title, COUNT(*) AS overlap
+               FROM rental r1
+               JOIN inventory i1 ON r1.inventory_id = i1.inventory_id
+               JOIN rental r2 ON r1.customer_id = r2.customer_id
+               JOIN inventory i2 ON r2.inventory_id = i2.inventory_id
+               JOIN film f2 ON i2.film_id = f2.film_id
+               WHERE i1.film_id = %s AND f2.film_id != %s
+               GROUP BY f2.film_id, f2.title
+               ORDER BY overlap DESC
+               LIMIT 6""",
+            (film_id, film_id),
+        ),
     )
 
     return render_template(
@@ -0,0 +1,73 @@
+import os
+import threading
+from flask import Blueprint, abort, current_app, send_file
+from db import query, load_config
+from image_cache import DiskCache
+
+media_bp = Blueprint("media", __name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            cfg = load_config().get("image_cache", {})
+            directory = cfg.get("dir") or os.path.join(current_app.instance_path, "image_cache")
+            _cache = DiskCache(directory, int(float(cfg.get("max_mb", 256)) * 1024 * 1024), name="images")
+    return _cache
+
+
+def _send(path, digest):
+    # The URL stays the same when a customer or film is renamed, so caches must
+    # revalidate every time; the ETag is the inputs hash, so an unchanged image is a 304
+    response = send_file(path, mimetype="image/png", etag=digest, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@media_bp.route("/media/avatars/<int:image_id>.png")
+def avatars(image_id):
+    from generate_avatars import avatar_hash, generate_avatar
+
+    customer = query(
+        "SELECT customer_id, first_name, last_name FROM customer WHERE customer_id = %s",
+        (image_id,), one=True,
+    )
+    if not customer or not customer["first_name"] or not customer["last_name"]:
+        abort(404)
+    digest = avatar_hash(customer["first_name"], customer["last_name"], ())
+
+    def render(tmp_dir):
+        generate_avatar(image_id, customer["first_name"], customer["last_name"], out_dir=tmp_dir)
+        return os.path.join(tmp_dir, f"{image_id}.png")
+
+    return _send(get_cache().get_or_create(f"avatar-{image_id}-{digest}.png", render), digest)
+
+
+@media_bp.route("/media/thumbnails/<int:image_id>.png")
+def thumbnails(image_id):
+    from generate_thumbnails import generate_thumbnail, thumbnail_hash
+
+    film = query(
+        """SELECT f.film_id, f.title, f.rating, f.release_year, c.name AS category
+           FROM film f
+           LEFT JOIN film_category fc ON f.film_id = fc.film_id
+           LEFT JOIN category c ON fc.category_id = c.category_id
+           WHERE f.film_id = %s
+           LIMIT 1""",
+        (image_id,), one=True,
+    )
+    if not film:
+        abort(404)
+    inputs = (film["title"], film["rating"], film["release_year"], film["category"])
+    digest = thumbnail_hash(*inputs, ())
+
+    def render(tmp_dir):
+        generate_thumbnail(image_id, *inputs, out_dir=tmp_dir)
+        return os.path.join(tmp_dir, f"{image_id}.png")
+
+    return _send(get_cache().get_or_create(f"thumbnail-{image_id}-{digest}.png", render), digest)
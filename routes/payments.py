@@ -1,23 +1,42 @@
-from flask import Blueprint, render_template, request
+import csv
+import importlib.util
+import io
+from datetime import date
+from flask import Blueprint, render_template, request, Response, stream_with_context, abort, flash
 from routes.auth import role_required
-from db import query
+from db import query, stream
 
 payments_bp = Blueprint("payments", __name__)
 
+PAYMENT_COLUMNS = [
+    "payment_id", "amount", "payment_date", "customer_id", "customer_name",
+    "film_id", "title", "store_id", "store_name",
+]
+EXPORT_CHUNK_ROWS = 5000
 
-@payments_bp.route("/payments")
-@role_required("admin", "staff")
-def index():
+
+def _date_arg(name, label):
+    """A YYYY-MM-DD query argument as a date; None if absent or invalid (with a flash)."""
+    value = request.args.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        flash(f"Ignored the {label} date: use YYYY-MM-DD.", "warning")
+        return None
+
+
+def _filters():
+    """FROM/WHERE clause and args for the search and date filters in the query string.
+
+    The dates come back as date objects (or None), already validated.
+    """
     search = request.args.get("search", "").strip()
-    date_from = request.args.get("date_from", "").strip()
-    date_to = request.args.get("date_to", "").strip()
+    date_from = _date_arg("date_from", "from")
+    date_to = _date_arg("date_to", "to")
 
     sql = """
-        SELECT p.payment_id, p.amount, p.payment_date,
-               CONCAT(c.first_name, ' ', c.last_name) AS customer_name,
-               c.customer_id,
-               f.title, f.film_id,
-               i.store_id, st.name AS store_name
         FROM payment p
         JOIN customer c ON p.customer_id = c.customer_id
         JOIN rental r ON p.rental_id = r.rental_id
@@ -31,19 +50,129 @@ def index():
     if search:
         sql += " AND (c.first_name LIKE %s OR c.last_name LIKE %s OR f.title LIKE %s)"
         args.extend([f"%{search}%"] * 3)
+    # Compare the bare column (not DATE(p.payment_date)) so the date index and
+    # monthly partition pruning apply; date_to is inclusive of the whole day.
     if date_from:
-        sql += " AND DATE(p.payment_date) >= %s"
+        sql += " AND p.payment_date >= %s"
         args.append(date_from)
     if date_to:
-        sql += " AND DATE(p.payment_date) <= %s"
+        sql += " AND p.payment_date < CAST(%s AS DATE) + INTERVAL 1 DAY"
         args.append(date_to)
 
-    sql += " ORDER BY p.payment_date DESC LIMIT 500"
-    payments = query(sql, args)
+    return sql, args, search, date_from, date_to
+
 
-    total = sum(float(p["amount"]) for p in payments) if payments else 0
+SELECT_COLUMNS = """
+    SELECT p.payment_id, p.amount, p.payment_date,
+           CONCAT(c.first_name, ' ', c.last_name) AS customer_name,
+           c.customer_id,
+           f.title, f.film_id,
+           i.store_id, st.name AS store_name
+"""
+
+
+@payments_bp.route("/payments")
+@role_required("admin", "staff")
+def index():
+    from_where, args, search, date_from, date_to = _filters()
+
+    payments = query(SELECT_COLUMNS + from_where + " ORDER BY p.payment_date DESC LIMIT 500", args, compact=True)
+
+    # Totals cover every matching payment, not just the 500 rows displayed
+    summary = query(
+        "SELECT COUNT(*) AS cnt, COALESCE(SUM(p.amount), 0) AS total" + from_where,
+        args, one=True,
+    )
 
     return render_template(
         "payments.html", payments=payments, search=search,
-        date_from=date_from, date_to=date_to, total=total,
+        date_from=date_from.isoformat() if date_from else "",
+        date_to=date_to.isoformat() if date_to else "",
+        total=float(summary["total"]) if summary else 0,
+        match_count=summary["cnt"] if summary else 0,
     )
+
+
+@payments_bp.route("/payments/export.<fmt>")
+@role_required("admin", "staff")
+def export(fmt):
+    if fmt not in ("csv", "parquet"):
+        abort(404)
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        abort(501, "Parquet export requires pyarrow (pip install pyarrow).")
+    from_where, args, _, date_from, date_to = _filters()
+    sql = SELECT_COLUMNS + from_where + " ORDER BY p.payment_date, p.payment_id"
+    chunks = stream(sql, args, EXPORT_CHUNK_ROWS)
+
+    # Only the parsed dates go into the header, never the raw query string
+    filename = "payments"
+    if date_from or date_to:
+        filename += f"_{date_from.isoformat() if date_from else 'start'}_{date_to.isoformat() if date_to else 'end'}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+
+    if fmt == "csv":
+        body, mimetype = _csv_chunks(chunks), "text/csv"
+    else:
+        body, mimetype = _parquet_chunks(chunks), "application/vnd.apache.parquet"
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
+def _csv_chunks(chunks):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=PAYMENT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _parquet_chunks(chunks):
+    """Write one Parquet row group per chunk, yielding the bytes as they are produced."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("payment_id", pa.int64()),
+        ("amount", pa.decimal128(5, 2)),
+        ("payment_date", pa.timestamp("s")),
+        ("customer_id", pa.int32()),
+        ("customer_name", pa.string()),
+        ("film_id", pa.int32()),
+        ("title", pa.string()),
+        ("store_id", pa.int32()),
+        ("store_name", pa.string()),
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that buffers bytes until the response generator drains them."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
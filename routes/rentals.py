@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from routes.auth import login_required, get_current_user, role_required
 from db import query, execute
+from conditional import conditional
 
 rentals_bp = Blueprint("rentals", __name__)
 
@@ -22,7 +23,7 @@ def index():
             WHERE r.customer_id = %s
             ORDER BY r.rental_date DESC
         """
-        rentals = query(sql, (user["customer_id"],))
+        rentals = query(sql, (user["customer_id"],), compact=True)
     else:
         search = request.args.get("search", "").strip()
         sql = """
@@ -43,7 +44,7 @@ def index():
             sql += " WHERE (f.title LIKE %s OR c.first_name LIKE %s OR c.last_name LIKE %s)"
             args.extend([f"%{search}%"] * 3)
         sql += " ORDER BY r.rental_date DESC LIMIT 500"
-        rentals = query(sql, args)
+        rentals = query(sql, args, compact=True)
         return render_template("rentals.html", rentals=rentals, search=search)
 
     return render_template("rentals.html", rentals=rentals, search="")
@@ -83,8 +84,8 @@ def new_rental():
         return redirect(url_for("rentals.index"))
 
     customers = query("SELECT customer_id, first_name, last_name, email FROM customer WHERE active = 1 ORDER BY last_name")
-    films = query("SELECT film_id, title FROM film ORDER BY title")
-    stores = query("SELECT store_id FROM store ORDER BY store_id")
+    films = query("SELECT film_id, title FROM film ORDER BY title", cache=True)
+    stores = query("SELECT store_id FROM store ORDER BY store_id", cache=True)
     return render_template("rental_form.html", customers=customers, films=films, stores=stores)
 
 
@@ -135,6 +136,7 @@ def return_rental(rid):
 
 @rentals_bp.route("/api/inventory/<int:film_id>/<int:store_id>")
 @login_required
+@conditional("inventory", "rental")
 def check_inventory(film_id, store_id):
     row = query(
         """SELECT COUNT(*) AS available
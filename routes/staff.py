@@ -1,7 +1,8 @@
-import bcrypt
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from routes.auth import role_required, validate_email, validate_password
-from db import query, execute
+import pymysql
+from db import query, execute, transaction
+import passwords
 
 staff_bp = Blueprint("staff", __name__)
 
@@ -22,7 +23,7 @@ def index():
 @staff_bp.route("/staff/add", methods=["GET", "POST"])
 @role_required("admin")
 def add():
-    stores = query("SELECT store_id FROM store ORDER BY store_id")
+    stores = query("SELECT store_id FROM store ORDER BY store_id", cache=True)
     if request.method == "POST":
         first = request.form["first_name"].strip()
         last = request.form["last_name"].strip()
@@ -45,17 +46,28 @@ def add():
                 flash(e, "danger")
             return render_template("staff_form.html", stores=stores, editing=False)
 
-        address_id = query("SELECT address_id FROM address LIMIT 1", one=True)["address_id"]
-        sid = execute(
-            """INSERT INTO staff (first_name, last_name, email, store_id, address_id, active, username)
-               VALUES (%s, %s, %s, %s, %s, 1, %s)""",
-            (first, last, email, store_id, address_id, username),
-        )
-        pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-        execute(
-            "INSERT INTO app_users (username, password_hash, role, staff_id) VALUES (%s, %s, 'staff', %s)",
-            (username, pw_hash, sid),
-        )
+        try:
+            pw_hash = passwords.hash_password(password)
+        except passwords.Busy:
+            flash("Too many requests right now, please try again in a moment.", "warning")
+            return render_template("staff_form.html", stores=stores, editing=False), 503, {"Retry-After": "1"}
+
+        # Staff record and login together, so a failure never leaves staff without a login
+        address_id = query("SELECT address_id FROM address LIMIT 1", one=True, cache=True)["address_id"]
+        try:
+            with transaction() as tx:
+                sid = tx.execute(
+                    """INSERT INTO staff (first_name, last_name, email, store_id, address_id, active, username)
+                       VALUES (%s, %s, %s, %s, %s, 1, %s)""",
+                    (first, last, email, store_id, address_id, username),
+                )
+                tx.execute(
+                    "INSERT INTO app_users (username, password_hash, role, staff_id) VALUES (%s, %s, 'staff', %s)",
+                    (username, pw_hash, sid),
+                )
+        except pymysql.err.IntegrityError:
+            flash("Username already taken.", "danger")
+            return render_template("staff_form.html", stores=stores, editing=False)
         flash("Staff member added.", "success")
         return redirect(url_for("staff.index"))
 
@@ -68,7 +80,7 @@ def edit(sid):
     member = query("SELECT * FROM staff WHERE staff_id = %s", (sid,), one=True)
     if not member:
         return "Staff not found", 404
-    stores = query("SELECT store_id FROM store ORDER BY store_id")
+    stores = query("SELECT store_id FROM store ORDER BY store_id", cache=True)
 
     if request.method == "POST":
         first = request.form["first_name"].strip()
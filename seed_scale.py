@@ -0,0 +1,355 @@
+"""Scale the Sakila data up to a realistic, reproducible size for load and scale testing.
+
+    python seed_scale.py --preset medium                  # 100 stores, 100k customers, 5M rentals
+    python seed_scale.py --preset large                   # 500 stores, 1M customers, 50M rentals
+    python seed_scale.py --stores 50 --customers 20000 --rentals 500000 --seed 7
+    python seed_scale.py --preset large --dry-run         # generate only, report rows/sec
+
+Rows are appended after the existing ones and generated with NumPy from --seed and
+--end-date alone, so two runs against the same base database produce identical data.
+Film popularity is Zipf-skewed, store traffic log-normal, a few customers rent far
+more than the rest, and rentals follow seasonal, weekly and evening peaks. Returns
+and payments follow the app's own rule (rental_rate plus $1.00 per day late).
+
+Loading uses LOAD DATA LOCAL INFILE (needs pyarrow and local_infile enabled on the
+server) or falls back to chunked executemany. Run it on a test database only.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, datetime
+import numpy as np
+import pymysql
+import pymysql.cursors
+from db import bump_versions, load_config
+from partition_db import insert_triggers
+from setup_db import STORE_NAMES
+
+PRESETS = {
+    "small": {"stores": 25, "customers": 10000, "rentals": 250000},
+    "medium": {"stores": 100, "customers": 100000, "rentals": 5000000},
+    "large": {"stores": 500, "customers": 1000000, "rentals": 50000000},
+}
+STAFF_PER_STORE = 2
+CHUNK_ROWS = 200000
+
+# Relative rental volume by month (Jan..Dec): winter holidays and summer peaks
+MONTH_WEIGHTS = np.array([1.15, 0.95, 0.9, 0.9, 0.95, 1.05, 1.15, 1.1, 0.9, 0.95, 1.05, 1.25])
+# Relative volume by weekday (Mon..Sun) and hour of day
+WEEKDAY_WEIGHTS = np.array([0.7, 0.7, 0.75, 0.85, 1.2, 1.35, 1.0])
+HOUR_WEIGHTS = np.array([
+    0.2, 0.1, 0.05, 0.02, 0.02, 0.05, 0.1, 0.2, 0.4, 0.6, 0.8, 0.9,
+    1.0, 1.0, 0.9, 0.9, 1.0, 1.3, 1.7, 2.0, 2.1, 1.8, 1.2, 0.6,
+])
+
+
+# Sakila sizes these for a 2-store, 599-customer shop (TINYINT store/staff ids,
+# SMALLINT customer/payment ids); widened to INT before seeding past those limits
+ID_COLUMNS = {
+    "store": ["store_id", "manager_staff_id"],
+    "staff": ["staff_id", "store_id"],
+    "customer": ["customer_id", "store_id"],
+    "inventory": ["inventory_id", "store_id"],
+    "rental": ["inventory_id", "customer_id", "staff_id"],
+    "payment": ["payment_id", "customer_id", "staff_id"],
+    # The app's logins reference staff and customers too (foreign keys need matching types)
+    "app_users": ["staff_id", "customer_id"],
+}
+
+
+def _connect():
+    cfg = load_config()["db"]
+    return pymysql.connect(
+        host=cfg["host"], port=cfg["port"], user=cfg["user"],
+        password=cfg["password"], database=cfg["database"],
+        cursorclass=pymysql.cursors.DictCursor, local_infile=True,
+    )
+
+
+def widen_ids(cur):
+    """Widen the narrow Sakila id columns to INT UNSIGNED (foreign key checks must be off)."""
+    for table, columns in ID_COLUMNS.items():
+        cur.execute(
+            """SELECT COLUMN_NAME AS name, DATA_TYPE AS type, IS_NULLABLE AS nullable, EXTRA AS extra
+               FROM information_schema.COLUMNS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s""",
+            (table,),
+        )
+        changes = [
+            f"MODIFY {c['name']} INT UNSIGNED"
+            + (" NOT NULL" if c["nullable"] == "NO" else "")
+            + (" AUTO_INCREMENT" if "auto_increment" in c["extra"] else "")
+            for c in cur.fetchall()
+            if c["name"] in columns and c["type"] in ("tinyint", "smallint", "mediumint")
+        ]
+        if changes:
+            cur.execute(f"ALTER TABLE {table} {', '.join(changes)}")
+            print(f"Widened {table}: {', '.join(c.split()[1] for c in changes)}")
+
+
+def _max_id(cur, table, col):
+    cur.execute(f"SELECT COALESCE(MAX({col}), 0) AS m FROM {table}")
+    return cur.fetchone()["m"]
+
+
+class Loader:
+    """Appends column arrays to a table via LOAD DATA LOCAL INFILE or executemany."""
+
+    def __init__(self, conn, method, dry_run=False):
+        self.conn = conn
+        self.method = method
+        self.dry_run = dry_run
+        self.counts = {}
+
+    def load(self, table, columns):
+        n = len(next(iter(columns.values())))
+        self.counts[table] = self.counts.get(table, 0) + n
+        if self.dry_run or n == 0:
+            return
+        for start in range(0, n, CHUNK_ROWS):
+            chunk = {k: v[start:start + CHUNK_ROWS] for k, v in columns.items()}
+            if self.method == "infile":
+                self._load_infile(table, chunk)
+            else:
+                self._load_executemany(table, chunk)
+        self.conn.commit()
+
+    def _load_infile(self, table, chunk):
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+
+        names = list(chunk)
+        tbl = pa.table({k: pa.array(v, from_pandas=True) for k, v in chunk.items()})
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        try:
+            pacsv.write_csv(tbl, path)
+            # Empty fields are NULLs (pyarrow writes nulls as empty strings)
+            targets = ", ".join(f"@{c}" for c in names)
+            sets = ", ".join(f"{c} = NULLIF(@{c}, '')" for c in names)
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    f"""LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+                        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+                        LINES TERMINATED BY '\\n' IGNORE 1 LINES
+                        ({targets}) SET {sets}""",
+                    (path,),
+                )
+        finally:
+            os.remove(path)
+
+    def _load_executemany(self, table, chunk):
+        names = list(chunk)
+        cols = [v.astype(object) if v.dtype.kind == "M" else v.tolist() for v in chunk.values()]
+        rows = list(zip(*cols))
+        sql = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join(['%s'] * len(names))})"
+        with self.conn.cursor() as cur:
+            for start in range(0, len(rows), 5000):
+                cur.executemany(sql, rows[start:start + 5000])
+
+
+def _pick(rng, pool, n):
+    return np.asarray(pool, dtype=object)[rng.integers(0, len(pool), n)]
+
+
+def seed(conn, args):
+    rng = np.random.default_rng(args.seed)
+    loader = Loader(conn, args.method, args.dry_run)
+    end = np.datetime64(args.end_date, "s") + np.timedelta64(1, "D")
+    start = end - np.timedelta64(int(args.years * 365.25), "D")
+    timings = {}
+
+    with conn.cursor() as cur:
+        if not args.dry_run:
+            triggers = insert_triggers(cur, ("rental", "payment", "customer"))
+            if triggers:
+                raise SystemExit(f"INSERT triggers {', '.join(triggers)} would overwrite generated dates; "
+                                 "drop them on the test database first.")
+        cur.execute("SELECT film_id, rental_rate, rental_duration FROM film ORDER BY film_id")
+        films = cur.fetchall()
+        cur.execute("SELECT address_id FROM address ORDER BY address_id")
+        addresses = [r["address_id"] for r in cur.fetchall()]
+        cur.execute("SELECT DISTINCT first_name FROM customer ORDER BY first_name")
+        first_names = [r["first_name"] for r in cur.fetchall()]
+        cur.execute("SELECT DISTINCT last_name FROM customer ORDER BY last_name")
+        last_names = [r["last_name"] for r in cur.fetchall()]
+        store0 = _max_id(cur, "store", "store_id") + 1
+        staff0 = _max_id(cur, "staff", "staff_id") + 1
+        customer0 = _max_id(cur, "customer", "customer_id") + 1
+        inventory0 = _max_id(cur, "inventory", "inventory_id") + 1
+        rental0 = _max_id(cur, "rental", "rental_id") + 1
+        if not args.dry_run:
+            cur.execute("SET FOREIGN_KEY_CHECKS = 0")
+            widen_ids(cur)
+
+    film_ids = np.array([f["film_id"] for f in films])
+    film_rate = np.array([float(f["rental_rate"]) for f in films])
+    film_duration = np.array([int(f["rental_duration"]) for f in films])
+
+    # Stores and staff (each store managed by its first staff member)
+    t = time.perf_counter()
+    n_stores = args.stores
+    store_ids = np.arange(store0, store0 + n_stores)
+    staff_ids = np.arange(staff0, staff0 + n_stores * STAFF_PER_STORE)
+    staff_store = np.repeat(store_ids, STAFF_PER_STORE)
+    names = np.array([
+        STORE_NAMES[i % len(STORE_NAMES)] + ("" if i < len(STORE_NAMES) else f" {i // len(STORE_NAMES) + 1}")
+        for i in range(store0 - 1, store0 - 1 + n_stores)
+    ], dtype=object)
+    staff_first = _pick(rng, first_names, len(staff_ids))
+    staff_last = _pick(rng, last_names, len(staff_ids))
+    staff_user = np.array([f"staff{i}" for i in staff_ids], dtype=object)
+    loader.load("staff", {
+        "staff_id": staff_ids, "first_name": staff_first, "last_name": staff_last,
+        "address_id": _pick(rng, addresses, len(staff_ids)),
+        "email": np.array([f"{u}@blockbusters.example" for u in staff_user], dtype=object),
+        "store_id": staff_store, "active": np.ones(len(staff_ids), dtype=np.int8), "username": staff_user,
+    })
+    loader.load("store", {
+        "store_id": store_ids, "manager_staff_id": staff_ids[::STAFF_PER_STORE],
+        "address_id": _pick(rng, addresses, n_stores), "name": names,
+    })
+    timings["stores/staff"] = time.perf_counter() - t
+
+    # Customers: home store proportional to store traffic
+    t = time.perf_counter()
+    store_weight = rng.lognormal(0, 0.6, n_stores)
+    store_weight /= store_weight.sum()
+    cust_store_idx = np.sort(rng.choice(n_stores, args.customers, p=store_weight))
+    customer_ids = np.arange(customer0, customer0 + args.customers)
+    cust_first = _pick(rng, first_names, args.customers)
+    cust_last = _pick(rng, last_names, args.customers)
+    created = start - np.timedelta64(30, "D") + rng.integers(0, 86400 * 365, args.customers).astype("timedelta64[s]")
+    loader.load("customer", {
+        "customer_id": customer_ids, "store_id": store_ids[cust_store_idx],
+        "first_name": cust_first, "last_name": cust_last,
+        "email": np.array([f"{f}.{l}.{i}@customer.example".lower()
+                           for f, l, i in zip(cust_first, cust_last, customer_ids)], dtype=object),
+        "address_id": _pick(rng, addresses, args.customers),
+        "active": (rng.random(args.customers) > 0.03).astype(np.int8),
+        "create_date": created,
+    })
+    cust_start = np.searchsorted(cust_store_idx, np.arange(n_stores))
+    cust_count = np.bincount(cust_store_idx, minlength=n_stores)
+    timings["customers"] = time.perf_counter() - t
+
+    # Inventory: every store stocks the popular end of the catalogue, more copies of hits
+    t = time.perf_counter()
+    film_pop = 1.0 / np.arange(1, len(film_ids) + 1) ** 1.1
+    film_pop = film_pop[rng.permutation(len(film_ids))]
+    film_pop /= film_pop.sum()
+    copies = np.clip(np.round(film_pop / film_pop.max() * 6 + rng.random((n_stores, len(film_ids))) * 1.5), 0, 8)
+    copies = copies.astype(np.int64)
+    inv_store_idx = np.repeat(np.repeat(np.arange(n_stores), len(film_ids)), copies.ravel())
+    inv_film_idx = np.repeat(np.tile(np.arange(len(film_ids)), n_stores), copies.ravel())
+    inventory_ids = np.arange(inventory0, inventory0 + len(inv_film_idx))
+    loader.load("inventory", {
+        "inventory_id": inventory_ids, "film_id": film_ids[inv_film_idx], "store_id": store_ids[inv_store_idx],
+    })
+    timings["inventory"] = time.perf_counter() - t
+
+    # Rentals and payments, one calendar month at a time
+    t = time.perf_counter()
+    item_weight = film_pop[inv_film_idx] * store_weight[inv_store_idx]
+    item_weight /= item_weight.sum()
+    months = np.arange(start.astype("datetime64[M]"), (end - 1).astype("datetime64[M]") + 1)
+    month_w = MONTH_WEIGHTS[months.astype(int) % 12] * np.linspace(0.8, 1.2, len(months))  # slow growth
+    month_n = np.floor(month_w / month_w.sum() * args.rentals).astype(np.int64)
+    hour_p = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+    next_rental = rental0
+    for month, n in zip(months, month_n):
+        lo = max(month.astype("datetime64[s]"), start)
+        hi = min((month + 1).astype("datetime64[s]"), end)
+        if n == 0 or hi <= lo:
+            continue
+        # Day within the month, thinned by weekday weight; then an evening-heavy hour
+        days = (hi - lo) // np.timedelta64(1, "D") or 1
+        day = rng.integers(0, days, int(n * 1.6))
+        weekday = ((lo.astype("datetime64[D]") + day).astype(np.int64) + 3) % 7
+        day = day[rng.random(len(day)) < WEEKDAY_WEIGHTS[weekday] / WEEKDAY_WEIGHTS.max()][:n]
+        seconds = (day * 86400 + rng.choice(24, len(day), p=hour_p) * 3600
+                   + rng.integers(0, 3600, len(day)))
+        rented = lo + seconds.astype("timedelta64[s]")
+        item = rng.choice(len(inventory_ids), len(rented), p=item_weight)
+
+        # The same copy cannot be rented twice in the same second
+        key = rented.astype(np.int64) * len(inventory_ids) + item
+        _, keep = np.unique(key, return_index=True)
+        keep.sort()
+        rented, item = rented[keep], item[keep]
+        n = len(rented)
+
+        store_idx = inv_store_idx[item]
+        film_idx = inv_film_idx[item]
+        # Heavy renters: bias towards the first customers of each store
+        offset = np.floor(rng.random(n) ** 2.5 * cust_count[store_idx]).astype(np.int64)
+        customer = customer_ids[cust_start[store_idx] + offset]
+        staff = staff_ids[store_idx * STAFF_PER_STORE + rng.integers(0, STAFF_PER_STORE, n)]
+
+        kept_days = rng.gamma(2.0, film_duration[film_idx] / 1.6)
+        returned = rented + (kept_days * 86400).astype("timedelta64[s]")
+        out = returned >= end
+        returned[out] = np.datetime64("NaT")
+
+        rental_ids = np.arange(next_rental, next_rental + n)
+        next_rental += n
+        loader.load("rental", {
+            "rental_id": rental_ids, "rental_date": rented, "inventory_id": inventory_ids[item],
+            "customer_id": customer, "returned_date": returned, "staff_id": staff,
+        })
+
+        paid = ~out
+        late_days = np.maximum(0, np.floor(kept_days[paid]) - film_duration[film_idx[paid]])
+        loader.load("payment", {
+            "customer_id": customer[paid], "staff_id": staff[paid], "rental_id": rental_ids[paid],
+            "amount": np.round(film_rate[film_idx[paid]] + late_days * 1.00, 2),
+            "payment_date": returned[paid],
+        })
+    timings["rentals/payments"] = time.perf_counter() - t
+
+    if not args.dry_run:
+        with conn.cursor() as cur:
+            cur.execute("SET FOREIGN_KEY_CHECKS = 1")
+            bump_versions(cur, [table for table, n in loader.counts.items() if n])
+        conn.commit()
+    return loader.counts, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    parser.add_argument("--stores", type=int)
+    parser.add_argument("--customers", type=int)
+    parser.add_argument("--rentals", type=int)
+    parser.add_argument("--years", type=float, default=3, help="history length ending at --end-date")
+    parser.add_argument("--end-date", default="2025-12-31", type=date.fromisoformat)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--method", choices=["infile", "executemany"], default="infile")
+    parser.add_argument("--dry-run", action="store_true", help="generate without writing to the database")
+    args = parser.parse_args()
+    for key, value in PRESETS[args.preset].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+    args.end_date = args.end_date.isoformat()
+
+    print(f"Seeding {args.stores} stores, {args.customers:,} customers, ~{args.rentals:,} rentals "
+          f"over {args.years} years to {args.end_date} (seed {args.seed}, {args.method})")
+    conn = _connect()
+    try:
+        start = time.perf_counter()
+        counts, timings = seed(conn, args)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    for step, seconds in timings.items():
+        print(f"  {step:<18} {seconds:8.1f}s")
+    total = sum(counts.values())
+    for table, n in counts.items():
+        print(f"  {table:<18} {n:>12,} rows")
+    print(f"Done: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/sec) at {datetime.now():%H:%M:%S}")
+
+
+if __name__ == "__main__":
+    main()
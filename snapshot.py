@@ -0,0 +1,161 @@
+"""Incrementally export the reporting tables to Parquet for off-database analytics.
+
+    python snapshot.py            # append new rentals/payments, refresh dimension tables
+    python snapshot.py --full     # rebuild the snapshot from scratch
+
+rental and payment are append-only for reporting purposes, so each run exports only
+rows above the last exported id, partitioned by month (rental/month=2005-05/...).
+The small dimension tables (inventory, film, film_category, category) are rewritten
+in full. The dashboard reads the result through analytics.py when config.json has
+"dashboard_source": "snapshot".
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from db import load_config, query, stream
+
+STATE_FILE = "_state.json"
+CHUNK_ROWS = 50000
+
+# table -> (id column, date column, SELECT, schema)
+FACT_TABLES = {
+    "rental": (
+        "rental_id", "rental_date",
+        "SELECT rental_id, rental_date, inventory_id, customer_id, staff_id FROM rental",
+        pa.schema([
+            ("rental_id", pa.int64()), ("rental_date", pa.timestamp("s")),
+            ("inventory_id", pa.int64()), ("customer_id", pa.int64()), ("staff_id", pa.int64()),
+        ]),
+    ),
+    "payment": (
+        "payment_id", "payment_date",
+        "SELECT payment_id, payment_date, amount, customer_id, rental_id FROM payment",
+        pa.schema([
+            ("payment_id", pa.int64()), ("payment_date", pa.timestamp("s")),
+            ("amount", pa.decimal128(10, 2)), ("customer_id", pa.int64()), ("rental_id", pa.int64()),
+        ]),
+    ),
+}
+
+DIMENSION_TABLES = {
+    "inventory": (
+        "SELECT inventory_id, film_id, store_id FROM inventory",
+        pa.schema([("inventory_id", pa.int64()), ("film_id", pa.int64()), ("store_id", pa.int64())]),
+    ),
+    "film": (
+        "SELECT film_id, title, rating FROM film",
+        pa.schema([("film_id", pa.int64()), ("title", pa.string()), ("rating", pa.string())]),
+    ),
+    "film_category": (
+        "SELECT film_id, category_id FROM film_category",
+        pa.schema([("film_id", pa.int64()), ("category_id", pa.int64())]),
+    ),
+    "category": (
+        "SELECT category_id, name FROM category",
+        pa.schema([("category_id", pa.int64()), ("name", pa.string())]),
+    ),
+}
+
+
+def snapshot_dir():
+    cfg = load_config()
+    return cfg.get("snapshot_dir") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot")
+
+
+def read_state(root):
+    try:
+        with open(os.path.join(root, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(root, state):
+    path = os.path.join(root, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _export_fact(table, staging, since_id, run_id):
+    id_col, date_col, select, schema = FACT_TABLES[table]
+    sql = f"{select} WHERE {id_col} > %s ORDER BY {id_col}"
+    max_id, exported = since_id, 0
+    for i, rows in enumerate(stream(sql, (since_id,), CHUNK_ROWS)):
+        batch = pa.Table.from_pylist(rows, schema=schema)
+        month = pc.strftime(batch[date_col], format="%Y-%m")
+        ds.write_dataset(
+            batch.append_column("month", month),
+            os.path.join(staging, table),
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive"),
+            basename_template=f"part-{run_id}-{i:05d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        max_id = rows[-1][id_col]
+        exported += len(rows)
+    return max_id, exported
+
+
+def _move_tree(src, dst):
+    """Move every file under src into the same relative path under dst."""
+    for dirpath, _, files in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(dirpath, src))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(dirpath, name), os.path.join(target, name))
+
+
+def run(full=False):
+    root = snapshot_dir()
+    if full and os.path.isdir(root):
+        shutil.rmtree(root)
+    os.makedirs(root, exist_ok=True)
+    for leftover in os.listdir(root):
+        if leftover.startswith(".staging-"):
+            shutil.rmtree(os.path.join(root, leftover), ignore_errors=True)
+
+    state = read_state(root)
+    run_id = time.strftime("%Y%m%d%H%M%S")
+    staging = os.path.join(root, f".staging-{run_id}")
+    os.makedirs(staging)
+    try:
+        for table in FACT_TABLES:
+            since = state.get(table, 0)
+            max_id, exported = _export_fact(table, staging, since, run_id)
+            state[table] = max_id
+            print(f"{table}: {exported} new rows (ids {since + 1}..{max_id})" if exported else f"{table}: up to date")
+
+        for table, (select, schema) in DIMENSION_TABLES.items():
+            tbl = pa.Table.from_pylist(query(select), schema=schema)
+            pq.write_table(tbl, os.path.join(staging, f"{table}.parquet"))
+            print(f"{table}: {tbl.num_rows} rows")
+
+        # Publish: new fact files first, then dimensions, then the watermark
+        for table in FACT_TABLES:
+            if os.path.isdir(os.path.join(staging, table)):
+                _move_tree(os.path.join(staging, table), os.path.join(root, table))
+        for table in DIMENSION_TABLES:
+            os.replace(os.path.join(staging, f"{table}.parquet"), os.path.join(root, f"{table}.parquet"))
+        state["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        _write_state(root, state)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    print(f"Snapshot written to {root}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="discard the snapshot and export everything")
+    args = parser.parse_args()
+    run(full=args.full)
+
+
+if __name__ == "__main__":
+    main()
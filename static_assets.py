@@ -0,0 +1,312 @@
+"""Fingerprinted, precompressed static files with immutable caching.
+
+    python static_assets.py                # vendor CDN assets, then build
+    python static_assets.py --offline      # build from what is already in static/
+
+The build copies every file under static/ to static/build/ with a content hash in
+its name (css/app.css -> build/css/app.3f2a9c41d0be.css), rewrites url() references
+inside stylesheets to the hashed names, writes .gz/.br siblings for text assets and
+records the mapping in static/build/manifest.json. Once the manifest exists,
+url_for('static', filename=...) returns the hashed URL, served with a one-year
+immutable Cache-Control; files not in the manifest are served as before.
+
+Before fingerprinting, each SPRITES folder of SVG icons is merged into one sprite
+sheet of <symbol>s (static/store_icons/*.svg -> static/sprites/store_icons.svg, one
+symbol per file, id = file name without .svg), which pages reference with
+<svg><use href="sprite.svg#id">, so all the icons on a page cost one request.
+
+Run it after generate_avatars.py / generate_thumbnails.py and on every deploy. Files
+of the previous build are kept so pages rendered just before a deploy still load.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import time
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BUILD = "build"
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".map", ".txt", ".html"}
+# Sprite sheet under static/ -> folder of SVG icons it is built from
+SPRITES = {"sprites/store_icons.svg": "store_icons"}
+SVG_RE = re.compile(r"<svg\b([^>]*)>(.*)</svg>", re.S)
+VIEWBOX_RE = re.compile(r'\bviewBox="([^"]*)"')
+
+# Local path under static/vendor/ -> CDN URL it is downloaded from (versions as used by the templates)
+VENDOR = {
+    "bootstrap/bootstrap.min.css": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css",
+    "bootstrap/bootstrap.bundle.min.js": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js",
+    "bootstrap-icons/bootstrap-icons.css": "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.css",
+    "bootstrap-icons/fonts/bootstrap-icons.woff2":
+        "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/fonts/bootstrap-icons.woff2",
+    "bootstrap-icons/fonts/bootstrap-icons.woff":
+        "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/fonts/bootstrap-icons.woff",
+    "chart.js/chart.umd.min.js": "https://cdn.jsdelivr.net/npm/chart.js@4.4.7/dist/chart.umd.min.js",
+}
+
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+# --- Build ---------------------------------------------------------------------------
+
+def vendor(refresh=False):
+    """Download the VENDOR assets into static/vendor/ (skipping ones already there)."""
+    for name, url in VENDOR.items():
+        path = os.path.join(STATIC_DIR, "vendor", name)
+        if os.path.exists(path) and not refresh:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        print(f"Vendored {name} ({len(data) / 1024:.0f} KB)")
+
+
+def sprites():
+    """Merge each SPRITES folder into its sprite sheet; rewritten only when the content changes."""
+    for sheet, folder in SPRITES.items():
+        symbols = []
+        for name in sorted(os.listdir(os.path.join(STATIC_DIR, folder))):
+            if not name.endswith(".svg"):
+                continue
+            with open(os.path.join(STATIC_DIR, folder, name), encoding="utf-8") as f:
+                m = SVG_RE.search(f.read())
+            if not m:
+                raise ValueError(f"{folder}/{name}: no <svg> element")
+            viewbox = VIEWBOX_RE.search(m.group(1))
+            attrs = f' viewBox="{viewbox.group(1)}"' if viewbox else ""
+            symbols.append(f'<symbol id="{name[:-4]}"{attrs}>{m.group(2).strip()}</symbol>')
+        data = ('<svg xmlns="http://www.w3.org/2000/svg">\n' + "\n".join(symbols) + "\n</svg>\n").encode("utf-8")
+        path = os.path.join(STATIC_DIR, sheet)
+        try:
+            with open(path, "rb") as f:
+                unchanged = f.read() == data
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            _write(path, data)
+            print(f"Sprite {sheet}: {len(symbols)} symbols")
+
+
+def _sources():
+    """Paths under static/ relative to it, stylesheets last so their url()s can be rewritten."""
+    found = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        if root == STATIC_DIR:
+            dirs[:] = [d for d in dirs if d != BUILD]
+        for name in files:
+            if name.startswith(".") or name.endswith((".tmp", ".gz", ".br")):
+                continue
+            found.append(os.path.relpath(os.path.join(root, name), STATIC_DIR).replace(os.sep, "/"))
+    return sorted(found, key=lambda p: (p.endswith(".css"), p))
+
+
+def _hashed(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def _rewrite_css(name, data, manifest):
+    """Point url(...) references at the hashed files (same directory layout, so relative paths still work)."""
+    base = posixpath.dirname(name)
+
+    def replace(m):
+        quote, url = m.group(1), m.group(2)
+        if url.startswith(("data:", "http:", "https:", "//", "#")):
+            return m.group(0)
+        # The cache-busting query strings some CSS carries are redundant once the name is hashed
+        path, _, fragment = url.partition("#")
+        path = path.split("?")[0]
+        target = posixpath.normpath(posixpath.join(base, path))
+        if target not in manifest:
+            return m.group(0)
+        rewritten = posixpath.join(posixpath.dirname(path), posixpath.basename(manifest[target]))
+        return f"url({quote}{rewritten}{'#' + fragment if fragment else ''}{quote})"
+
+    return CSS_URL_RE.sub(replace, data.decode("utf-8")).encode("utf-8")
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def _precompress(path, data):
+    """Write .gz (and .br) next to a text asset when they save at least 10%."""
+    written = []
+    variants = [(".gz", lambda d: gzip.compress(d, 9, mtime=0))]
+    if brotli:
+        variants.append((".br", lambda d: brotli.compress(d, quality=11)))
+    for ext, compress in variants:
+        if os.path.exists(path + ext):
+            continue
+        packed = compress(data)
+        if len(packed) < len(data) * 0.9:
+            _write(path + ext, packed)
+            written.append(ext)
+    return written
+
+
+def build():
+    """Build the sprites, then fingerprint and precompress everything under static/; returns the new manifest."""
+    sprites()
+    build_dir = os.path.join(STATIC_DIR, BUILD)
+    previous = read_manifest()
+    manifest = {}
+    copied = compressed = 0
+    for name in _sources():
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            data = f.read()
+        if name.endswith(".css"):
+            data = _rewrite_css(name, data, manifest)
+        hashed = _hashed(name, data)
+        manifest[name] = hashed
+        path = os.path.join(build_dir, hashed)
+        if not os.path.exists(path):  # hashed names never change content, so existing files are done
+            _write(path, data)
+            copied += 1
+        if os.path.splitext(name)[1] in COMPRESSIBLE:
+            compressed += len(_precompress(path, data))
+
+    _prune(build_dir, set(manifest.values()) | set(previous.values()))
+    _write(os.path.join(build_dir, MANIFEST_NAME), json.dumps(manifest, sort_keys=True, indent=0).encode())
+    print(f"{len(manifest)} files, {copied} new, {compressed} compressed variants written.")
+    return manifest
+
+
+def _prune(build_dir, keep):
+    """Delete hashed files that belong to neither the new nor the previous build."""
+    for root, _, files in os.walk(build_dir):
+        for name in files:
+            rel = os.path.relpath(os.path.join(root, name), build_dir).replace(os.sep, "/")
+            if rel == MANIFEST_NAME or re.sub(r"\.(gz|br)$", "", rel) in keep:
+                continue
+            os.remove(os.path.join(root, name))
+
+
+# --- Serving ---------------------------------------------------------------------------
+
+_manifest = {"mtime": -1, "checked": 0.0, "files": {}}
+
+
+def read_manifest():
+    try:
+        with open(os.path.join(STATIC_DIR, BUILD, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def manifest():
+    """The current build's manifest, re-read at most once a second when the file changes."""
+    now = time.monotonic()
+    if now - _manifest["checked"] >= 1:
+        _manifest["checked"] = now
+        try:
+            mtime = os.path.getmtime(os.path.join(STATIC_DIR, BUILD, MANIFEST_NAME))
+        except OSError:
+            mtime = None
+        if mtime != _manifest["mtime"]:
+            _manifest["mtime"], _manifest["files"] = mtime, read_manifest() if mtime else {}
+    return _manifest["files"]
+
+
+def version():
+    """Changes with every build, for caches of pages that embed asset URLs (conditional.py)."""
+    manifest()
+    return str(_manifest["mtime"])
+
+
+def vendor_url(name):
+    """Local URL of a VENDOR asset, or its CDN URL until static_assets.py has vendored it."""
+    from flask import url_for
+
+    if os.path.exists(os.path.join(STATIC_DIR, "vendor", name)):
+        return url_for("static", filename=f"vendor/{name}")
+    return VENDOR[name]
+
+
+def init_app(app, config=None):
+    """Fingerprinted url_for('static') and immutable, precompressed or offloaded static responses.
+
+    config: {"x_accel_prefix": "/_static/"} hands files to nginx through X-Accel-Redirect
+    (an internal location aliased to static/); {"x_sendfile": true} uses X-Sendfile instead.
+    """
+    from flask import abort, request, send_from_directory
+    from werkzeug.security import safe_join
+
+    config = config or {}
+    x_accel = config.get("x_accel_prefix")
+    app.config["USE_X_SENDFILE"] = bool(config.get("x_sendfile"))
+    _manifest.update(mtime=-1, checked=0.0)
+
+    @app.url_defaults
+    def fingerprint(endpoint, values):
+        if endpoint == "static":
+            hashed = manifest().get(values.get("filename"))
+            if hashed:
+                values["filename"] = f"{BUILD}/{hashed}"
+
+    def static(filename):
+        immutable = filename.startswith(BUILD + "/")
+        path = safe_join(app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        max_age = IMMUTABLE_MAX_AGE if immutable else None
+        if x_accel:
+            # nginx serves the file (and its .gz/.br siblings via gzip_static/brotli_static)
+            response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+            response.headers["X-Accel-Redirect"] = x_accel.rstrip("/") + "/" + filename
+        else:
+            encoding = None
+            if immutable:
+                for name, ext in (("br", ".br"), ("gzip", ".gz")):
+                    if name in request.accept_encodings and os.path.isfile(path + ext):
+                        encoding = name
+                        break
+            if encoding:
+                response = send_from_directory(app.static_folder, filename + (".br" if encoding == "br" else ".gz"),
+                                               mimetype=mimetypes.guess_type(filename)[0], max_age=max_age)
+                response.headers["Content-Encoding"] = encoding
+            else:
+                response = send_from_directory(app.static_folder, filename, max_age=max_age)
+            if immutable:
+                response.vary.add("Accept-Encoding")
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            response.cache_control.immutable = True
+        return response
+
+    app.view_functions["static"] = static
+    app.add_template_global(vendor_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offline", action="store_true", help="don't download the vendored CDN assets")
+    parser.add_argument("--refresh", action="store_true", help="download vendored assets again")
+    args = parser.parse_args()
+    if not args.offline:
+        vendor(args.refresh)
+    build()
+
+
+if __name__ == "__main__":
+    main()
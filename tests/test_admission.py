@@ -0,0 +1,41 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+import admission
+
+
+def _gate(threads):
+    app = Flask(__name__)
+    admission.init_app(app, {}, threads)
+    return app.extensions["admission"]
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_lower_class_skips_a_queue_it_would_not_wait_behind():
+    gate = _gate(threads=8)
+    assert gate.classes["browsing"]["queue"] == 0
+    assert gate.acquire("analytics", "dashboard.stats") == "admitted"
+    assert gate.acquire("analytics", "dashboard.stats") == "admitted"
+    outcomes = []
+    queued = threading.Thread(target=lambda: outcomes.append(gate.acquire("analytics", "dashboard.stats")))
+    queued.start()
+    _wait_for(lambda: gate.queued["analytics"] == 1)
+
+    # Analytics is full and its waiter can't run, so browsing has free slots and threads
+    assert gate.acquire("browsing", "films.index") == "admitted"
+
+    gate.release("analytics", "dashboard.stats")
+    queued.join()
+    assert outcomes == ["admitted"]
+
@@ -0,0 +1,20 @@
+"""WSGI entry point for production servers: gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module builds the app and warms everything workers would otherwise
+load on their first requests: compiled Jinja templates and the lazily imported image
+renderers. With gunicorn's preload_app the master does this once and every forked
+worker shares the result copy-on-write.
+"""
+from app import create_app
+
+app = create_app()
+
+
+def warm(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    import generate_avatars  # noqa: F401 -- used on demand by routes/media.py
+    import generate_thumbnails  # noqa: F401
+
+
+warm(app)